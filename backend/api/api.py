@@ -1,37 +1,87 @@
-from flask import jsonify
+from typing import (
+    List,
+    Optional,
+    Tuple,
+)
+
+from flask import Response
 from flask_restful import (
     Api,
     Resource,
 )
 from sqlalchemy.sql.expression import func
 
+from . import random_pool, sampling
 from .models import (
-    to_dict,
+    db,
     Tweet as TweetModel,
+    TWEET_SERIALIZER,
 )
 
 
 api = Api()
 
+# Number of tweets returned by /random
+RANDOM_SAMPLE_SIZE = 200
+
 
 class Tweet(Resource):
     '''
     Fetches all tweets.
     '''
     def get(self):
-        return jsonify([to_dict(tweet) for tweet in TweetModel.query.all()])
+        return json_response(TWEET_SERIALIZER.dumps(TWEET_SERIALIZER.query().all()))
+
+
+def json_response(body: str) -> Response:
+    return Response(body, mimetype='application/json')
+
+
+def sample_tweets(count: int) -> List[Tuple]:
+    '''
+    Samples tweets uniformly at random, as rows of the columns TWEET_SERIALIZER encodes.
+
+    Picking random ids between the smallest and largest id only touches the primary key index, so this stays fast
+    as the table grows, unlike ORDER BY RAND(). See sampling.sample_by_id() for how gaps from deleted rows are
+    handled.
+    '''
+    min_id, max_id = db.session.query(func.min(TweetModel.id), func.max(TweetModel.id)).one()
+    tweets = sampling.sample_by_id(
+        lambda ids: TWEET_SERIALIZER.query().filter(TweetModel.id.in_(ids)).all(),
+        min_id,
+        max_id,
+        count,
+        fetch_range=lambda low, high: TWEET_SERIALIZER.query().filter(TweetModel.id.between(low, high)).all(),
+    )
+
+    # Ids are too sparse to sample, e.g. after most rows were deleted
+    if tweets is None:
+        tweets = TWEET_SERIALIZER.query().order_by(func.random()).limit(count).all()
+    return tweets
+
+
+def latest_tweet_id() -> Optional[int]:
+    return db.session.query(func.max(TweetModel.id)).scalar()
 
 
 class RandomTweets(Resource):
     def get(self):
         '''
-        The performance of this method will degrade once db becomes large because it
-        requires a full db scan. May need to change how it's done.
-        Another method would be to add a random number column to the db and sort by
-        some offset of that column.
+        Returns 200 random tweets, taken from the in-memory pool when it is running and filled.
         '''
-        tweets = TweetModel.query.order_by(func.random()).limit(200).all()
-        return jsonify([to_dict(tweet) for tweet in tweets])
+        if random_pool.POOL is not None:
+            body = random_pool.POOL.take(RANDOM_SAMPLE_SIZE)
+            if body is not None:
+                return json_response(body)
+        return json_response(TWEET_SERIALIZER.dumps(sample_tweets(RANDOM_SAMPLE_SIZE)))
+
+
+class Metrics(Resource):
+    '''
+    Serves the backend metrics in the Prometheus text format.
+    '''
+    def get(self):
+        return Response(random_pool.REGISTRY.render(), mimetype='text/plain; version=0.0.4')
 
 
 class PermalinkTweet(Resource):
@@ -39,22 +89,11 @@ class PermalinkTweet(Resource):
     Fetches on the tweet that has a permalink slug matching the URL input.
     '''
     def get(self, permalink_slug):
-        tweets = TweetModel.query.filter_by(permalink_slug=permalink_slug).all()
-        return jsonify([to_dict(tweet) for tweet in tweets])
-
-
-# class OptimizedRandomTweets(Resource):
-#     def get(self):
-#         tweets = TweetModel.query.options(load_only('id')).offset(
-#             func.floor(
-#                 func.random() *
-#                 db.session.query(func.count(TweetModel.id))
-#             )
-#         ).limit(1).all()
-#         return jsonify([to_dict(tweet) for tweet in tweets])
+        tweets = TWEET_SERIALIZER.query().filter(TweetModel.permalink_slug == permalink_slug).all()
+        return json_response(TWEET_SERIALIZER.dumps(tweets))
 
 
 # api.add_resource(Tweet, '/')
 api.add_resource(RandomTweets, '/random')
 api.add_resource(PermalinkTweet, '/tweet/<string:permalink_slug>')
-# api.add_resource(OptimizedRandomTweets, '/optimized_random')
+api.add_resource(Metrics, '/metrics')
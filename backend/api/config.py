@@ -1,20 +1,17 @@
 import os
-from dotenv import load_dotenv
 
-load_dotenv()
-
-
-def myenv(value):
-    return os.environ.get(value)
+from question_seeker import db
 
 
 class Config(object):
     DEBUG = True
     TESTING = True
-    SQLALCHEMY_DATABASE_URI = (
-        f'mysql+pymysql://{myenv("MYSQL_DB_USER")}:{myenv("MYSQL_DB_PASS")}'
-        f'@{myenv("MYSQL_DB_HOST")}/{myenv("MYSQL_DB_NAME")}?charset=utf8mb4'
-    )
+    # Same settings as the scripts, see question_seeker.db
+    SQLALCHEMY_DATABASE_URI = db.sqlalchemy_uri()
+    SQLALCHEMY_ENGINE_OPTIONS = db.engine_options()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     MYSQL_DATABASE_CHARSET = 'utf8mb4'
-
+    # In-memory pool of random tweets served by /random. A size of 0 turns it off.
+    RANDOM_POOL_SIZE = int(os.environ.get('QS_RANDOM_POOL_SIZE', 5000))
+    RANDOM_POOL_REFRESH_INTERVAL = float(os.environ.get('QS_RANDOM_POOL_REFRESH_INTERVAL', 300))
+    RANDOM_POOL_CHECK_INTERVAL = float(os.environ.get('QS_RANDOM_POOL_CHECK_INTERVAL', 10))
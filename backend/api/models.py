@@ -1,9 +1,17 @@
 import datetime
 import json
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Sequence,
+)
 
 from flask_sqlalchemy import SQLAlchemy
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
+from question_seeker import codec
+
 
 db = SQLAlchemy()
 
@@ -37,3 +45,44 @@ def to_dict(obj):
                 pass
         # a json-encodable dict
         return fields
+
+
+# Column types whose values to_dict() keeps, because json.dumps can encode them
+JSON_TYPES = (bool, int, float, str)
+
+
+class ColumnSerializer:
+    def __init__(self, model):
+        '''
+        Serializer built once from a model's table columns, giving the same dictionaries as to_dict() without
+        inspecting every row. Columns whose values json.dumps can't encode, like created_date, are left out, and
+        so are None values. Keys are in alphabetical order, as dir() gives them.
+
+        Rows come from column-only queries as plain tuples, so no model objects are built.
+
+        Args:
+            model: SQLAlchemy model class
+        '''
+        self.model = model
+        self.names = sorted(
+            column.name for column in model.__table__.columns if column.type.python_type in JSON_TYPES
+        )
+        self.columns = [getattr(model, name) for name in self.names]
+
+    def query(self):
+        '''
+        Starts a query for the serialized columns. Its rows are tuples that also have the columns as attributes.
+        '''
+        return db.session.query(*self.columns)
+
+    def to_dict(self, row: Sequence[Any]) -> Dict[str, Any]:
+        return {name: value for name, value in zip(self.names, row) if value is not None}
+
+    def dumps(self, rows: Iterable[Sequence[Any]]) -> str:
+        '''
+        Encodes rows as a JSON array in one pass.
+        '''
+        return codec.dumps([self.to_dict(row) for row in rows])
+
+
+TWEET_SERIALIZER = ColumnSerializer(Tweet)
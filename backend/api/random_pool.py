@@ -0,0 +1,176 @@
+import random
+import threading
+import time
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+from question_seeker import codec, metrics
+from question_seeker.log import LOGGER as logger
+
+
+# Metrics of the backend, separate from the streamer's
+REGISTRY = metrics.MetricsRegistry()
+
+POOL_HITS = REGISTRY.counter('qs_random_pool_hits_total', 'Requests to /random served from the in-memory pool')
+POOL_MISSES = REGISTRY.counter(
+    'qs_random_pool_misses_total', 'Requests to /random that went to the database because the pool was empty',
+)
+POOL_REFRESHES = REGISTRY.counter(
+    'qs_random_pool_refreshes_total', 'Refreshes of the in-memory pool, by reason (start, interval or new_rows)',
+)
+POOL_REFRESH_ERRORS = REGISTRY.counter('qs_random_pool_refresh_errors_total', 'Refreshes of the pool that failed')
+POOL_REFRESH_SECONDS = REGISTRY.histogram('qs_random_pool_refresh_seconds', 'Time taken to refresh the pool')
+
+
+class RandomPool:
+    def __init__(
+            self,
+            load: Callable[[int], List[dict]],
+            latest_id: Callable[[], Optional[int]],
+            size: int = 5000,
+            refresh_interval: float = 300.0,
+            check_interval: float = 10.0,
+            rng: random.Random = random,
+    ):
+        '''
+        Holds a uniform random sample of tweets in memory, shuffled and already encoded as JSON, so a request for
+        random tweets is a slice of a list rather than a database query.
+
+        A background thread replaces the pool every `refresh_interval` seconds. Every `check_interval` seconds it
+        also looks up the newest tweet id, and refreshes early when new rows have been inserted.
+
+        Args:
+            load: function returning up to the given number of tweets sampled uniformly at random, as dictionaries
+            latest_id: function returning the largest tweet id in the database
+            size: number of tweets to hold
+            refresh_interval: seconds between scheduled refreshes
+            check_interval: seconds between checks for new rows
+            rng: random number generator
+        '''
+        self.load = load
+        self.latest_id = latest_id
+        self.size = size
+        self.refresh_interval = refresh_interval
+        self.check_interval = check_interval
+        self.rng = rng
+
+        # Replaced whole on refresh, never changed in place, so readers need no lock
+        self.items: List[str] = []
+        self.seen_id: Optional[int] = None
+        self.last_refresh = 0.0
+
+        self.stop_event = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+
+        REGISTRY.gauge('qs_random_pool_size', 'Tweets held in the in-memory pool', lambda: len(self.items))
+        REGISTRY.gauge(
+            'qs_random_pool_age_seconds', 'Seconds since the pool was last refreshed',
+            lambda: time.time() - self.last_refresh if self.last_refresh else 0,
+        )
+
+    def refresh(self, reason: str = 'interval'):
+        '''
+        Loads a new sample of tweets and swaps it in.
+
+        Args:
+            reason: why the pool is being refreshed, for the refresh counter
+        '''
+        start = time.perf_counter()
+        seen_id = self.latest_id()
+        items = [codec.dumps(tweet) for tweet in self.load(self.size)]
+        self.rng.shuffle(items)
+
+        self.items = items
+        self.seen_id = seen_id
+        self.last_refresh = time.time()
+        POOL_REFRESH_SECONDS.observe(time.perf_counter() - start)
+        POOL_REFRESHES.inc(reason=reason)
+        logger.info(f'Refreshed the random tweet pool with {len(items)} tweets ({reason})')
+
+    def take(self, count: int) -> Optional[str]:
+        '''
+        Takes a run of `count` tweets from a random place in the pool, wrapping around at the end.
+
+        Args:
+            count: number of tweets wanted
+
+        Returns:
+            JSON array of the tweets, or None if the pool is empty
+        '''
+        items = self.items
+        if not items:
+            POOL_MISSES.inc()
+            return None
+
+        if len(items) > count:
+            start = self.rng.randrange(len(items))
+            items = items[start:start + count] + items[:max(0, start + count - len(items))]
+        POOL_HITS.inc()
+        return '[' + ','.join(items) + ']'
+
+    def run(self):
+        while not self.stop_event.wait(self.check_interval):
+            try:
+                if time.time() - self.last_refresh >= self.refresh_interval:
+                    self.refresh('interval')
+                elif self.latest_id() != self.seen_id:
+                    self.refresh('new_rows')
+            except Exception:
+                POOL_REFRESH_ERRORS.inc()
+                logger.exception('Refreshing the random tweet pool failed')
+
+    def start(self) -> 'RandomPool':
+        '''
+        Fills the pool in the background and keeps it fresh. Requests go to the database until it is filled.
+        '''
+        def fill_and_run():
+            try:
+                self.refresh('start')
+            except Exception:
+                POOL_REFRESH_ERRORS.inc()
+                logger.exception('Filling the random tweet pool failed')
+            self.run()
+
+        self.thread = threading.Thread(target=fill_and_run, name='random-pool', daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __repr__(self):
+        return f'RandomPool holding {len(self.items)} of {self.size} tweets'
+
+
+# Pool used by /random, set up by init_app()
+POOL: Optional[RandomPool] = None
+
+
+def init_app(app, load: Callable[[int], List[dict]], latest_id: Callable[[], Optional[int]]):
+    '''
+    Starts the pool for an app, configured by RANDOM_POOL_SIZE, RANDOM_POOL_REFRESH_INTERVAL and
+    RANDOM_POOL_CHECK_INTERVAL. A size of 0 leaves the pool off. The loaders run inside the app context.
+    '''
+    global POOL
+    size = app.config.get('RANDOM_POOL_SIZE', 5000)
+    if not size:
+        return
+
+    def in_app_context(func):
+        def wrapper(*args):
+            with app.app_context():
+                return func(*args)
+        return wrapper
+
+    POOL = RandomPool(
+        in_app_context(load),
+        in_app_context(latest_id),
+        size=size,
+        refresh_interval=app.config.get('RANDOM_POOL_REFRESH_INTERVAL', 300),
+        check_interval=app.config.get('RANDOM_POOL_CHECK_INTERVAL', 10),
+    ).start()
@@ -0,0 +1,90 @@
+import math
+import random
+from typing import (
+    Any,
+    Callable,
+    List,
+    Optional,
+    Sequence,
+)
+
+# Older SQLite builds allow at most 999 parameters in one statement
+MAX_IDS_PER_FETCH = 999
+
+
+def sample_by_id(
+        fetch: Callable[[List[int]], Sequence[Any]],
+        min_id: Optional[int],
+        max_id: Optional[int],
+        count: int,
+        max_rounds: int = 8,
+        max_candidates: int = 5000,
+        rng: random.Random = random,
+        fetch_range: Optional[Callable[[int, int], Sequence[Any]]] = None,
+        max_ids_per_fetch: int = MAX_IDS_PER_FETCH,
+) -> Optional[List[Any]]:
+    '''
+    Samples rows uniformly at random by their integer primary key, without scanning the table.
+
+    Ids are drawn uniformly from [min_id, max_id] and looked up with `fetch`, an indexed lookup by primary key.
+    Ids that land in a gap left by deleted rows find nothing and are simply drawn again, so every row that exists
+    is equally likely to be picked, however the gaps are spread. Each round draws enough ids to cover what is
+    still missing at the hit rate seen so far. Ids are looked up at most `max_ids_per_fetch` at a time, to stay
+    within the database's limit on bound parameters.
+
+    Args:
+        fetch: function returning the rows whose ids are in a list, in any order. Rows need an `id` attribute.
+        min_id: smallest id in the table, or None if it is empty
+        max_id: largest id in the table
+        count: number of distinct rows wanted
+        max_rounds: number of lookups to try before giving up
+        max_candidates: most ids to look up in one round
+        rng: random number generator
+        fetch_range: function returning the rows whose ids are between two ids, inclusive. Used to read a small
+            table whole. If not given, the ids in the range are looked up with `fetch` instead.
+        max_ids_per_fetch: most ids to pass to one call of `fetch`
+
+    Returns:
+        Up to `count` distinct rows in random order, or None if the ids are so sparse that the sample couldn't be
+        filled in `max_rounds` lookups and the caller should fall back to another method
+    '''
+    if min_id is None or max_id is None:
+        return []
+
+    def fetch_in_chunks(ids: List[int]) -> List[Any]:
+        rows = []
+        for i in range(0, len(ids), max_ids_per_fetch):
+            rows.extend(fetch(ids[i:i + max_ids_per_fetch]))
+        return rows
+
+    # A small table is cheaper to read whole than to sample
+    if max_id - min_id + 1 <= 4 * count:
+        if fetch_range is not None:
+            rows = list(fetch_range(min_id, max_id))
+        else:
+            rows = fetch_in_chunks(list(range(min_id, max_id + 1)))
+        rng.shuffle(rows)
+        return rows[:count]
+
+    found = {}
+    drawn = 0
+    for _ in range(max_rounds):
+        missing = count - len(found)
+        hit_rate = max(len(found) / drawn, 0.01) if drawn else 1.0
+        num_candidates = min(math.ceil(missing / hit_rate * 1.25) + 10, max_candidates)
+
+        candidates = []
+        for _ in range(num_candidates):
+            candidate = rng.randint(min_id, max_id)
+            if candidate not in found:
+                candidates.append(candidate)
+        drawn += len(candidates)
+
+        rows = {row.id: row for row in fetch_in_chunks(candidates)}
+        # Keep rows in the order their ids were drawn, so the sample is in random order
+        for candidate in candidates:
+            if candidate in rows and candidate not in found and len(found) < count:
+                found[candidate] = rows[candidate]
+        if len(found) == count:
+            return list(found.values())
+    return None
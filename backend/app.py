@@ -1,8 +1,16 @@
 from flask import Flask
 from flask_cors import CORS
 
-from backend.api.api import api
-from backend.api.models import db
+from backend.api import random_pool
+from backend.api.api import (
+    api,
+    latest_tweet_id,
+    sample_tweets,
+)
+from backend.api.models import (
+    db,
+    TWEET_SERIALIZER,
+)
 from backend.api.config import Config
 
 
@@ -10,6 +18,11 @@ def register_extensions(app):
     api.init_app(app)
     db.init_app(app)
     db.create_all(app=app)
+    random_pool.init_app(
+        app,
+        lambda count: [TWEET_SERIALIZER.to_dict(tweet) for tweet in sample_tweets(count)],
+        latest_tweet_id,
+    )
 
 
 def create_app(config):
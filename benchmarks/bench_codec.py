@@ -0,0 +1,45 @@
+"""
+Benchmark of the installed JSON backends in question_seeker.codec on a corpus of raw tweets.
+"""
+import timeit
+
+import fire
+
+from question_seeker import codec
+
+
+def bench_codec(
+        corpus_fn: str,
+        limit: int = 100000,
+        repeat: int = 3,
+):
+    """
+    Times decoding and encoding every tweet in the corpus with each installed backend and prints the best run.
+
+    Args:
+        corpus_fn: file with one raw tweet payload per line, like the *_tweets.json files written by the streamer
+        limit: maximum number of tweets to read from the corpus
+        repeat: number of runs to take the best time from
+    """
+    with open(corpus_fn, 'rb') as file:
+        lines = [line for _, line in zip(range(limit), file) if line.strip()]
+    total_mb = sum(len(line) for line in lines) / 1e6
+    print(f'{len(lines):,} tweets, {total_mb:.1f} MB from {corpus_fn}')
+
+    try:
+        for backend in codec.BACKENDS:
+            codec.set_backend(backend)
+            tweets = [codec.loads(line) for line in lines]
+
+            decode_s = min(timeit.repeat(lambda: [codec.loads(line) for line in lines], number=1, repeat=repeat))
+            encode_s = min(timeit.repeat(lambda: [codec.dumps(tweet) for tweet in tweets], number=1, repeat=repeat))
+            print(
+                f'{backend:>8}: decode {len(lines) / decode_s:>10,.0f} tweets/s ({total_mb / decode_s:>7.1f} MB/s), '
+                f'encode {len(lines) / encode_s:>10,.0f} tweets/s'
+            )
+    finally:
+        codec.set_backend()
+
+
+if __name__ == '__main__':
+    fire.Fire(bench_codec)
@@ -0,0 +1,109 @@
+"""
+Micro-benchmark of the compiled QuestionMatcher against the original regex and handler map lookup.
+"""
+import os
+import random
+import re
+import tempfile
+import timeit
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import fire
+
+from question_seeker import processing
+
+
+# The pattern processing.process used before QuestionMatcher. It only finds "must/should" leads.
+LEGACY_PATTERN = r"(\b(why|y|who|what|where|how)\b \b(must|should)\b) .+\?"
+LEGACY_R = re.compile(LEGACY_PATTERN, flags=re.IGNORECASE)
+
+SAMPLE_TEXTS = [
+    'Why should I have to explain this again?',
+    "It's late, why am I still building this?",
+    'Honestly who should even be allowed to vote on this?',
+    "Y can't the bus ever be on time?",
+    'Just finished a 10k run this morning, feeling great',
+    'Does anyone know a good plumber in Boston?',
+    'Can someone tell me what to do?',
+    'new video is up on the channel! link in bio',
+    'what should we have for dinner tonight?',
+    'why is it always raining on the weekend?',
+    'lol',
+    'I wonder how anyone finishes a whole pizza by themselves. Asking for a friend.',
+]
+
+
+def legacy_match(tweet_text: str, tweet_handler_map: Dict[str, processing.TweetHandler]) -> Optional[str]:
+    """
+    Original matching path: search with the hardcoded pattern, then look the lead up in the handler map.
+
+    Args:
+        tweet_text: body of the tweet
+        tweet_handler_map: mapping of question starts to TweetHandler objects
+
+    Returns:
+        Matched question start if it is tracked, None otherwise
+    """
+    match = LEGACY_R.search(tweet_text)
+    if match:
+        q_lead = match.groups()[0].rstrip().lower()
+        if q_lead in tweet_handler_map:
+            return q_lead
+    return None
+
+
+def make_texts(count: int, seed: int = 0) -> List[str]:
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLE_TEXTS) for _ in range(count)]
+
+
+def bench_matcher(
+        q_list_names: str = 'all',
+        count: int = 10000,
+        repeat: int = 5,
+):
+    """
+    Times both matching paths over the same list of tweet texts and prints the best run of each.
+
+    Args:
+        q_list_names: comma separated keys from q_starts to track
+        count: number of tweet texts per run
+        repeat: number of runs to take the best time from
+    """
+    q_list_names = q_list_names.split(',') if isinstance(q_list_names, str) else list(q_list_names)
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # TweetHandler opens its file in the working directory as soon as it is created
+        os.chdir(tmpdir)
+        try:
+            tweet_handler_map = processing.get_tweet_handler_map(q_list_names, batch_size=count, write_to_file=False)
+        finally:
+            os.chdir(cwd)
+    matcher = processing.QuestionMatcher(tweet_handler_map)
+    texts = make_texts(count)
+
+    def run_legacy():
+        for text in texts:
+            legacy_match(text, tweet_handler_map)
+
+    def run_matcher():
+        for text in texts:
+            matcher.match(text)
+
+    legacy_matches = sum(legacy_match(text, tweet_handler_map) is not None for text in texts)
+    matcher_matches = sum(matcher.match(text) is not None for text in texts)
+
+    results = {
+        'legacy regex + lookup': (min(timeit.repeat(run_legacy, number=1, repeat=repeat)), legacy_matches),
+        'QuestionMatcher': (min(timeit.repeat(run_matcher, number=1, repeat=repeat)), matcher_matches),
+    }
+    for name, (seconds, matches) in results.items():
+        print(f'{name:>22}: {count / seconds:>12,.0f} tweets/s, {matches} matches')
+
+
+if __name__ == '__main__':
+    fire.Fire(bench_matcher)
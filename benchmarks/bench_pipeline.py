@@ -0,0 +1,228 @@
+"""
+Benchmark of the processing hot path on synthetic corpora of several sizes, with results saved as JSON.
+"""
+import datetime
+import os
+from pathlib import Path
+import platform
+import subprocess
+import tempfile
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+import fire
+
+from benchmarks.corpus import CorpusGenerator
+from question_seeker import codec, processing
+from scripts import text_extractor
+
+
+def time_best(func: Callable, repeat: int, setup: Optional[Callable] = None) -> float:
+    """
+    Times a function and returns the best of several runs.
+
+    Args:
+        func: function to time
+        repeat: number of runs
+        setup: optional function run before each run and not timed
+
+    Returns:
+        Seconds taken by the fastest run
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_size(
+        generator: CorpusGenerator,
+        size: int,
+        q_list_names: List[str],
+        repeat: int,
+        workdir: Path,
+) -> List[Dict[str, Union[str, int, float]]]:
+    """
+    Times each stage of the pipeline on a corpus of one size.
+
+    Args:
+        generator: generator for the corpus
+        size: number of tweets in the corpus
+        q_list_names: q_starts categories to track
+        repeat: number of runs to take the best time from
+        workdir: directory for the files written by TweetHandler and the text extractor
+
+    Returns:
+        List of results, one per stage
+    """
+    raw_list = generator.generate(size)
+    tweets = [codec.loads(raw) for raw in raw_list]
+
+    handler_map = processing.get_tweet_handler_map(q_list_names, batch_size=50, write_to_file=False)
+    matcher = processing.QuestionMatcher(handler_map)
+
+    def process_each():
+        for tweet, raw in zip(tweets, raw_list):
+            processing.process(tweet, handler_map, matcher=matcher, raw=raw)
+
+    def process_batch():
+        processing.process_tweets(tweets, handler_map, force_write=True, matcher=matcher, raw_list=raw_list)
+
+    # The writes get the matched payloads only, like in the stream
+    matched = [processing.as_line(raw) for tweet, raw in zip(tweets, raw_list) if processing.classify(tweet, matcher)]
+    write_fn = str(workdir / 'bench_tweets.json')
+    write_handler = processing.TweetHandler([], write_fn, batch_size=50, write_to_file=True)
+
+    def remove_written():
+        write_handler.file.close()
+        if os.path.exists(write_fn):
+            os.remove(write_fn)
+
+    def write_matched():
+        for line in matched:
+            write_handler.add_tweet(line)
+        write_handler.write_tweets()
+        write_handler.file.close()
+
+    # The text extractor reads files like the ones TweetHandler writes, so feed it every payload
+    corpus_fn = workdir / 'bench_corpus_tweets.json'
+    with open(corpus_fn, 'w', encoding='utf-8') as file:
+        file.writelines(processing.as_line(raw) + '\n' for raw in raw_list)
+    output_fn = workdir / 'out' / 'bench_corpus_texts.json'
+    output_fn.parent.mkdir(exist_ok=True)
+
+    def extract():
+        text_extractor.extract_tweet_info(str(corpus_fn), str(output_fn), make_copies=True)
+
+    timings = {
+        'process': time_best(process_each, repeat),
+        'process_tweets': time_best(process_batch, repeat),
+        'tweet_handler_write': time_best(write_matched, repeat, setup=remove_written),
+        'extract_tweet_info': time_best(extract, repeat),
+    }
+    remove_written()
+
+    items = {'tweet_handler_write': len(matched)}
+    results = []
+    for stage, seconds in timings.items():
+        count = items.get(stage, size)
+        results.append({
+            'stage': stage,
+            'size': size,
+            'items': count,
+            'seconds': seconds,
+            'items_per_second': count / seconds if seconds else 0.0,
+        })
+        print(f'{stage:>20} @ {size:>8,}: {seconds:8.3f}s, {results[-1]["items_per_second"]:>12,.0f} items/s')
+    return results
+
+
+def bench_pipeline(
+        sizes: Union[List[int], int] = (1000, 10000, 100000),
+        output_fn: str = 'benchmark_results.json',
+        q_list_names: Union[List[str], str] = ('capacity', 'categorizing', 'factual', 'imperative', 'personal'),
+        repeat: int = 3,
+        retweet_ratio: float = 0.5,
+        reply_ratio: float = 0.2,
+        link_ratio: float = 0.15,
+        extended_ratio: float = 0.2,
+        emoji_density: float = 0.5,
+        match_rates: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+        label: Optional[str] = None,
+):
+    """
+    Times processing.process, processing.process_tweets, TweetHandler writes and
+    text_extractor.extract_tweet_info on synthetic corpora, printing the results and appending them to a JSON file.
+
+    The output file holds a list of runs, each with the commit, Python version, JSON backend, corpus settings and
+    the time taken by every stage at every size, so runs from different versions can be compared.
+
+    Args:
+        sizes: corpus sizes to time
+        output_fn: JSON file to append the run to
+        q_list_names: q_starts categories to track
+        repeat: number of runs to take the best time from
+        retweet_ratio: share of payloads that are retweets
+        reply_ratio: share of payloads that are replies
+        link_ratio: share of payloads with a url in their entities
+        extended_ratio: share of payloads with their text in extended_tweet
+        emoji_density: average number of emojis per tweet
+        match_rates: mapping of q_starts category names to the share of payloads asking one of its questions.
+            Defaults to 2% for each tracked category.
+        seed: random seed for the corpus
+        label: optional name for the run
+    """
+    if isinstance(sizes, int):
+        sizes = [sizes]
+    if isinstance(q_list_names, str):
+        q_list_names = [q_list_names]
+    q_list_names = list(q_list_names)
+    if match_rates is None:
+        match_rates = {name: 0.02 for name in q_list_names}
+
+    settings = {
+        'retweet_ratio': retweet_ratio,
+        'reply_ratio': reply_ratio,
+        'link_ratio': link_ratio,
+        'extended_ratio': extended_ratio,
+        'emoji_density': emoji_density,
+        'match_rates': match_rates,
+        'seed': seed,
+        'q_list_names': q_list_names,
+        'repeat': repeat,
+    }
+
+    output_fn = os.path.abspath(output_fn)
+    results = []
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # TweetHandler opens its file in the working directory as soon as it is created
+        os.chdir(tmpdir)
+        try:
+            for size in sizes:
+                generator = CorpusGenerator(
+                    retweet_ratio, reply_ratio, link_ratio, extended_ratio, emoji_density, match_rates, seed,
+                )
+                results.extend(bench_size(generator, size, q_list_names, repeat, Path(tmpdir)))
+        finally:
+            os.chdir(cwd)
+
+    run = {
+        'label': label,
+        'timestamp': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'commit': get_commit(),
+        'python': platform.python_version(),
+        'json_backend': codec.BACKEND,
+        'corpus': settings,
+        'results': results,
+    }
+
+    runs = codec.load(output_fn) if os.path.exists(output_fn) else []
+    runs.append(run)
+    codec.dump(runs, output_fn, indent=True)
+    print(f'Saved results to {output_fn}')
+
+
+if __name__ == '__main__':
+    fire.Fire(bench_pipeline)
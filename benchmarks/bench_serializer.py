@@ -0,0 +1,91 @@
+"""
+Benchmark of serializing tweets from the database for the backend: model objects through to_dict() and json.dumps,
+against column-only queries through TWEET_SERIALIZER.
+"""
+import json
+import random
+import string
+import timeit
+
+from flask import Flask
+import fire
+
+from backend.api.models import (
+    db,
+    to_dict,
+    Tweet,
+    TWEET_SERIALIZER,
+)
+
+
+def bench_serializer(
+        rows: int = 200,
+        table_size: int = 10000,
+        repeat: int = 20,
+        database_uri: str = 'sqlite://',
+):
+    """
+    Times fetching and encoding `rows` tweets both ways and prints the best run of each in rows per second, along
+    with the share of the time spent encoding rather than querying.
+
+    Args:
+        rows: number of tweets in each response, like the 200 returned by /random
+        table_size: number of tweets to fill the table with
+        repeat: number of runs to take the best time from
+        database_uri: SQLAlchemy URI of the database to fill. Defaults to an in-memory SQLite database.
+    """
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = database_uri
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+
+    rng = random.Random(0)
+    with app.app_context():
+        db.create_all()
+        db.session.add_all([
+            Tweet(
+                tweet_text=f'Why am I tweet number {i}? ' + ''.join(rng.choices(string.ascii_lowercase, k=80)),
+                tweet_id=str(1250000000000000000 + i),
+                tweet_timestamp='Tue Apr 14 12:00:00 +0000 2020',
+                loc_name='Boston, MA' if i % 3 else None,
+                country='US' if i % 3 else None,
+                permalink_slug=''.join(rng.choices(string.ascii_uppercase + string.digits, k=7)),
+            )
+            for i in range(table_size)
+        ])
+        db.session.commit()
+
+        ids = rng.sample(range(1, table_size + 1), rows)
+
+        def reflective():
+            tweets = Tweet.query.filter(Tweet.id.in_(ids)).all()
+            return json.dumps([to_dict(tweet) for tweet in tweets])
+
+        def columns():
+            return TWEET_SERIALIZER.dumps(TWEET_SERIALIZER.query().filter(Tweet.id.in_(ids)).all())
+
+        assert json.loads(reflective()) == json.loads(columns())
+
+        tweets = Tweet.query.filter(Tweet.id.in_(ids)).all()
+        tuples = TWEET_SERIALIZER.query().filter(Tweet.id.in_(ids)).all()
+        timings = {
+            'to_dict': (
+                min(timeit.repeat(reflective, number=1, repeat=repeat)),
+                min(timeit.repeat(lambda: json.dumps([to_dict(tweet) for tweet in tweets]), number=1, repeat=repeat)),
+            ),
+            'columns': (
+                min(timeit.repeat(columns, number=1, repeat=repeat)),
+                min(timeit.repeat(lambda: TWEET_SERIALIZER.dumps(tuples), number=1, repeat=repeat)),
+            ),
+        }
+        db.session.remove()
+
+    for name, (total_s, encode_s) in timings.items():
+        print(
+            f'{name:>8}: {rows / total_s:>10,.0f} rows/s with the query, {rows / encode_s:>10,.0f} rows/s encoding '
+            f'only ({encode_s / total_s:.0%} of the time encoding)'
+        )
+
+
+if __name__ == '__main__':
+    fire.Fire(bench_serializer)
@@ -0,0 +1,70 @@
+"""
+Benchmark of the asyncio stream client reading a synthetic corpus from a local fake streaming server.
+"""
+import asyncio
+import os
+import tempfile
+
+import fire
+
+from benchmarks.corpus import CorpusGenerator
+from question_seeker import aio_stream, processing
+from question_seeker import stream as streamer
+from question_seeker.fake_stream import FakeStreamServer
+
+
+def bench_stream(
+        count: int = 100000,
+        streams: int = 1,
+        batch_size: int = 50,
+        executor_workers: int = 1,
+        processes: int = 0,
+        prefilter: bool = False,
+        seed: int = 0,
+):
+    """
+    Streams a synthetic corpus through AsyncStream and the Listener, writing matches to a temporary directory,
+    and prints the sustained throughput of each stream.
+
+    Args:
+        count: number of tweets each server sends
+        streams: number of streams to run side by side on one event loop
+        batch_size: Listener batch size
+        executor_workers: number of threads each stream processes batches in
+        processes: number of classifier processes for each Listener
+        prefilter: whether the Listeners use the raw pre-filter
+        seed: random seed for the corpus
+    """
+    lines = CorpusGenerator(match_rates={'personal': 0.05, 'imperative': 0.05}, seed=seed).generate(count)
+    servers = [FakeStreamServer(lines, lines_per_chunk=20, keep_alive_every=1000).start() for _ in range(streams)]
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        os.chdir(tmpdir)
+        try:
+            listeners = []
+            for _ in servers:
+                tweet_handler_map = processing.get_tweet_handler_map(['personal', 'imperative'], batch_size, True)
+                listeners.append(streamer.Listener(
+                    tweet_handler_map, batch_size=batch_size, processes=processes, prefilter=prefilter,
+                ))
+
+            async def run():
+                return await asyncio.gather(*[
+                    aio_stream.AsyncStream(None, listener, url=server.url, executor_workers=executor_workers).filter()
+                    for server, listener in zip(servers, listeners)
+                ])
+
+            results = asyncio.run(run())
+        finally:
+            os.chdir(cwd)
+            for server in servers:
+                server.stop()
+
+    for i, stats in enumerate(results):
+        print(f'stream {i}: {stats["tweets"]:,} tweets in {stats["seconds"]:.2f}s, '
+              f'{stats["tweets_per_second"]:,.0f} tweets/s')
+
+
+if __name__ == '__main__':
+    fire.Fire(bench_stream)
@@ -0,0 +1,242 @@
+"""
+Generator for synthetic stream payloads shaped like Twitter's v1.1 filter stream, for benchmarks and tests.
+"""
+import datetime
+import random
+from typing import (
+    Dict,
+    List,
+    Optional,
+)
+
+import fire
+
+from question_seeker import codec, q_starts
+
+
+EMOJIS = ['😂', '🤔', '🍕', '🔥', '😭', '🙏', '💀', '✨', '👀', '🥺', '☕', '🎉']
+
+WORDS = (
+    'the a my your this that people everyone anyone someone today tonight tomorrow work school weekend game show '
+    'pizza coffee dinner movie book music phone internet city bus train dog cat friend family team season week'
+).split()
+
+OTHER_QUESTION_LEADS = ['does anyone know', 'has anyone tried', 'is it just me or', 'can someone explain', 'who else']
+
+SOURCES = [
+    '<a href="http://twitter.com/download/iphone" rel="nofollow">Twitter for iPhone</a>',
+    '<a href="http://twitter.com/download/android" rel="nofollow">Twitter for Android</a>',
+    '<a href="https://mobile.twitter.com" rel="nofollow">Twitter Web App</a>',
+]
+
+PLACES = [
+    ('Boston, MA', 'US'),
+    ('Toronto, Ontario', 'CA'),
+    ('London, England', 'GB'),
+    ('Sydney, New South Wales', 'AU'),
+]
+
+
+class CorpusGenerator:
+    def __init__(
+            self,
+            retweet_ratio: float = 0.5,
+            reply_ratio: float = 0.2,
+            link_ratio: float = 0.15,
+            extended_ratio: float = 0.2,
+            emoji_density: float = 0.5,
+            match_rates: Optional[Dict[str, float]] = None,
+            seed: int = 0,
+    ):
+        """
+        Generates raw tweet payloads with controllable proportions of the features processing.process looks at.
+
+        Args:
+            retweet_ratio: share of payloads that are retweets
+            reply_ratio: share of payloads that are replies
+            link_ratio: share of payloads with a url in their entities
+            extended_ratio: share of payloads with their text in extended_tweet
+            emoji_density: average number of emojis per tweet
+            match_rates: mapping of q_starts category names to the share of payloads asking a question with one
+                of its starts. Defaults to 5% imperative questions.
+            seed: random seed, so the same arguments always give the same corpus
+        """
+        self.retweet_ratio = retweet_ratio
+        self.reply_ratio = reply_ratio
+        self.link_ratio = link_ratio
+        self.extended_ratio = extended_ratio
+        self.emoji_density = emoji_density
+        self.match_rates = match_rates if match_rates is not None else {'imperative': 0.05}
+        self.rng = random.Random(seed)
+
+        self.next_id = 1238000000000000000
+        self.timestamp_ms = 1584198000000
+
+    def words(self, count: int) -> str:
+        return ' '.join(self.rng.choice(WORDS) for _ in range(count))
+
+    def make_text(self) -> str:
+        """
+        Makes the body of a tweet. Asks a tracked question at the configured match rates, otherwise either a
+        question without a tracked start or a plain statement.
+        """
+        roll = self.rng.random()
+        for category, rate in self.match_rates.items():
+            if roll < rate:
+                start = self.rng.choice(q_starts.get_q_list(category))
+                start = start.capitalize() if self.rng.random() < 0.5 else start
+                text = f'{self.words(self.rng.randint(0, 4))} {start} {self.words(self.rng.randint(2, 10))}?'
+                break
+            roll -= rate
+        else:
+            if self.rng.random() < 0.3:
+                text = f'{self.rng.choice(OTHER_QUESTION_LEADS)} {self.words(self.rng.randint(2, 10))}?'
+            else:
+                text = f'{self.words(self.rng.randint(3, 15))}.'
+
+        emoji_count = int(self.emoji_density) + (self.rng.random() < self.emoji_density % 1)
+        for _ in range(emoji_count):
+            text += ' ' + self.rng.choice(EMOJIS)
+        return text.strip()
+
+    def make_user(self) -> dict:
+        user_id = self.rng.randint(10 ** 6, 10 ** 12)
+        return {
+            'id': user_id,
+            'id_str': str(user_id),
+            'name': self.words(2).title(),
+            'screen_name': f'user{user_id}',
+            'location': None,
+            'url': None,
+            'description': self.words(self.rng.randint(0, 12)),
+            'protected': False,
+            'verified': False,
+            'followers_count': self.rng.randint(0, 5000),
+            'friends_count': self.rng.randint(0, 2000),
+            'listed_count': 0,
+            'favourites_count': self.rng.randint(0, 50000),
+            'statuses_count': self.rng.randint(1, 100000),
+            'created_at': 'Mon Mar 02 18:02:57 +0000 2015',
+            'lang': None,
+            'profile_image_url_https': f'https://pbs.twimg.com/profile_images/{user_id}/photo_normal.jpg',
+            'default_profile': True,
+        }
+
+    def make_tweet(self, retweet_allowed: bool = True) -> dict:
+        """
+        Makes a single tweet dictionary.
+
+        Args:
+            retweet_allowed: whether this tweet can be a retweet. Retweeted tweets are never retweets themselves.
+        """
+        self.next_id += self.rng.randint(1, 10 ** 6)
+        self.timestamp_ms += self.rng.randint(0, 20)
+        text = self.make_text()
+        created_at = datetime.datetime.fromtimestamp(self.timestamp_ms / 1000, datetime.timezone.utc)
+
+        entities = {'hashtags': [], 'urls': [], 'user_mentions': [], 'symbols': []}
+        if self.rng.random() < self.link_ratio:
+            entities['urls'].append({
+                'url': 'https://t.co/abcdefghij',
+                'expanded_url': 'https://example.com/article',
+                'display_url': 'example.com/article',
+                'indices': [len(text), len(text) + 23],
+            })
+
+        is_reply = self.rng.random() < self.reply_ratio
+        tweet = {
+            'created_at': created_at.strftime('%a %b %d %H:%M:%S +0000 %Y'),
+            'id': self.next_id,
+            'id_str': str(self.next_id),
+            'text': text,
+            'source': self.rng.choice(SOURCES),
+            'truncated': False,
+            'in_reply_to_status_id': self.next_id - 1 if is_reply else None,
+            'in_reply_to_status_id_str': str(self.next_id - 1) if is_reply else None,
+            'in_reply_to_user_id': 12345 if is_reply else None,
+            'in_reply_to_user_id_str': '12345' if is_reply else None,
+            'in_reply_to_screen_name': 'someone' if is_reply else None,
+            'user': self.make_user(),
+            'geo': None,
+            'coordinates': None,
+            'place': None,
+            'contributors': None,
+            'is_quote_status': False,
+            'quote_count': 0,
+            'reply_count': 0,
+            'retweet_count': 0,
+            'favorite_count': 0,
+            'entities': entities,
+            'favorited': False,
+            'retweeted': False,
+            'filter_level': 'low',
+            'lang': 'en',
+            'timestamp_ms': str(self.timestamp_ms),
+        }
+
+        if self.rng.random() < 0.05:
+            full_name, country_code = self.rng.choice(PLACES)
+            tweet['place'] = {'full_name': full_name, 'country_code': country_code, 'place_type': 'city'}
+
+        if self.rng.random() < self.extended_ratio:
+            full_text = f'{text} {self.words(self.rng.randint(20, 35))}'
+            tweet['truncated'] = True
+            tweet['text'] = full_text[:137] + '…'
+            tweet['extended_tweet'] = {'full_text': full_text, 'display_text_range': [0, len(full_text)],
+                                       'entities': entities}
+
+        if retweet_allowed and self.rng.random() < self.retweet_ratio:
+            original = self.make_tweet(retweet_allowed=False)
+            tweet['retweeted_status'] = original
+            tweet['text'] = f'RT @{original["user"]["screen_name"]}: {original["text"]}'[:140]
+
+        return tweet
+
+    def generate(self, count: int) -> List[str]:
+        """
+        Generates raw payloads as compact JSON strings, the way the stream sends them.
+
+        Args:
+            count: number of payloads
+
+        Returns:
+            List of raw payloads
+        """
+        return [codec.dumps(self.make_tweet()) for _ in range(count)]
+
+
+def write_corpus(
+        output_fn: str,
+        count: int = 10000,
+        retweet_ratio: float = 0.5,
+        reply_ratio: float = 0.2,
+        link_ratio: float = 0.15,
+        extended_ratio: float = 0.2,
+        emoji_density: float = 0.5,
+        match_rates: Optional[Dict[str, float]] = None,
+        seed: int = 0,
+):
+    """
+    Writes a synthetic corpus with one raw payload per line, like the files TweetHandler writes.
+
+    Args:
+        output_fn: file to write
+        count: number of payloads
+        retweet_ratio: share of payloads that are retweets
+        reply_ratio: share of payloads that are replies
+        link_ratio: share of payloads with a url in their entities
+        extended_ratio: share of payloads with their text in extended_tweet
+        emoji_density: average number of emojis per tweet
+        match_rates: mapping of q_starts category names to the share of payloads asking one of its questions
+        seed: random seed
+    """
+    generator = CorpusGenerator(
+        retweet_ratio, reply_ratio, link_ratio, extended_ratio, emoji_density, match_rates, seed,
+    )
+    with open(output_fn, 'w', encoding='utf-8') as file:
+        for line in generator.generate(count):
+            file.write(line + '\n')
+
+
+if __name__ == '__main__':
+    fire.Fire(write_corpus)
@@ -0,0 +1,230 @@
+"""
+asyncio client for Twitter's v1.1 filter stream, feeding the same Listener as the tweepy stream.
+"""
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import ssl
+import time
+from typing import (
+    AsyncIterator,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+from urllib.parse import urlencode, urlsplit
+
+from tweepy import OAuthHandler
+
+from question_seeker.log import LOGGER as logger
+
+
+STREAM_URL = 'https://stream.twitter.com/1.1/statuses/filter.json'
+
+
+async def read_chunked_lines(reader: asyncio.StreamReader, chunked: bool = True) -> AsyncIterator[bytes]:
+    """
+    Reads the body of a streaming response and yields it line by line as the lines complete.
+
+    Args:
+        reader: stream positioned at the start of the response body
+        chunked: whether the body uses chunked transfer encoding
+
+    Yields:
+        Lines without their line break, including the empty keep-alive lines
+    """
+    if not chunked:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return
+            yield line.rstrip(b'\r\n')
+
+    pending = b''
+    while True:
+        size_line = await reader.readline()
+        if not size_line:
+            break
+        size = int(size_line.split(b';', 1)[0].strip() or b'0', 16)
+        if size == 0:
+            break
+        pending += await reader.readexactly(size)
+        await reader.readexactly(2)
+
+        *lines, pending = pending.split(b'\n')
+        for line in lines:
+            yield line.rstrip(b'\r')
+
+    if pending:
+        yield pending.rstrip(b'\r')
+
+
+class AsyncStream:
+    def __init__(
+            self,
+            auth: Optional[OAuthHandler],
+            listener,
+            url: str = STREAM_URL,
+            executor_workers: int = 1,
+            max_pending_batches: int = 4,
+            read_timeout: float = 90.0,
+    ):
+        """
+        Reads the filter stream on an asyncio event loop and hands full batches of raw tweets to
+        Listener.process_batch() in a thread pool, so decoding, matching and writing never block reading.
+
+        Follows the Listener's settings: tweets are batched by `listener.batch_size`, the stream is closed once
+        `listener.time_limit` runs out, and everything held is written out by `listener.stop()` at the end. Like the
+        tweepy stream, an HTTP error is passed to `listener.on_error()`, which raises a ConnectionError for
+        stream.connect_stream() to back off and retry on.
+
+        With one executor worker, batches are processed in the order they arrived. If `max_pending_batches` batches
+        are waiting for the executor, reading pauses until one finishes, which pushes back on the server instead
+        of holding an unbounded backlog in memory.
+
+        Several streams, and any other coroutines, can run on the same event loop, e.g. with asyncio.gather().
+
+        Args:
+            auth: OAuth handler to sign the request with. None sends it unsigned, for local test servers.
+            listener: stream.Listener to process the tweets with
+            url: streaming endpoint. http:// URLs are accepted for local test servers.
+            executor_workers: number of threads to process batches in
+            max_pending_batches: number of batches that can wait for the executor before reading pauses
+            read_timeout: seconds without any data, keep-alive lines included, after which the connection is
+                considered stalled. Twitter sends a keep-alive every 30 seconds.
+        """
+        self.auth = auth
+        self.listener = listener
+        self.url = url
+        self.executor = ThreadPoolExecutor(executor_workers, thread_name_prefix='aio-stream')
+        self.max_pending_batches = max_pending_batches
+        self.read_timeout = read_timeout
+
+    def build_request(self, track: List[str]) -> Tuple[str, int, bool, bytes]:
+        """
+        Builds the signed filter request.
+
+        Args:
+            track: phrases to track
+
+        Returns:
+            Host, port, whether to use TLS, and the raw HTTP request
+        """
+        parts = urlsplit(self.url)
+        use_tls = parts.scheme == 'https'
+        port = parts.port or (443 if use_tls else 80)
+        body = urlencode({'track': ','.join(track)})
+
+        headers: Dict[str, str] = {'Content-Type': 'application/x-www-form-urlencoded'}
+        if self.auth is not None:
+            # Same OAuth 1.0a signature tweepy puts on the request
+            _, headers, _ = self.auth.apply_auth().client.sign(self.url, 'POST', body, headers)
+
+        lines = [
+            f'POST {parts.path or "/"} HTTP/1.1',
+            f'Host: {parts.netloc}',
+            'User-Agent: question-seeker',
+            f'Content-Length: {len(body)}',
+        ] + [f'{name}: {value}' for name, value in headers.items()]
+        request = ('\r\n'.join(lines) + '\r\n\r\n' + body).encode('utf-8')
+        return parts.hostname, port, use_tls, request
+
+    async def connect(self, track: List[str]) -> Tuple[asyncio.StreamReader, asyncio.StreamWriter, bool]:
+        """
+        Opens the connection, sends the request and reads the response headers.
+
+        Returns:
+            Reader positioned at the response body, the writer, and whether the body is chunked
+        """
+        host, port, use_tls, request = self.build_request(track)
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=ssl.create_default_context() if use_tls else None, limit=2 ** 20,
+        )
+        writer.write(request)
+        await writer.drain()
+
+        status_line = await reader.readline()
+        status = int(status_line.split()[1]) if len(status_line.split()) > 1 else 0
+        headers = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').lower()
+        if status != 200:
+            writer.close()
+            # Raises a ConnectionError
+            await self.run(self.listener.on_error, status)
+        return reader, writer, 'transfer-encoding: chunked' in headers
+
+    async def run(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+
+    async def filter(self, track: Optional[List[str]] = None, **kwargs) -> Dict[str, float]:
+        """
+        Streams tweets matching `track` until the time limit runs out or the server closes the stream. Named
+        after tweepy's Stream.filter.
+
+        Args:
+            track: phrases to track
+            kwargs: ignored, for compatibility with tweepy's Stream.filter
+
+        Returns:
+            Dictionary with the number of tweets read, seconds taken and tweets per second
+        """
+        listener = self.listener
+        try:
+            reader, writer, chunked = await self.connect(track or [])
+        except BaseException:
+            self.executor.shutdown()
+            raise
+        logger.info(f'Connected to {self.url}')
+
+        pending = set()
+        batch = []
+        count = 0
+        start_time = time.time()
+        lines = read_chunked_lines(reader, chunked)
+        try:
+            while True:
+                timeout = self.read_timeout
+                if listener.time_limit:
+                    remaining = listener.time_limit - (time.time() - start_time)
+                    if remaining <= 0:
+                        logger.info('Stopping tweet collection')
+                        break
+                    timeout = min(timeout, remaining)
+
+                try:
+                    line = await asyncio.wait_for(lines.__anext__(), timeout)
+                except StopAsyncIteration:
+                    break
+                except asyncio.TimeoutError:
+                    if timeout < self.read_timeout:
+                        # Ran into the time limit, which is checked at the top of the loop
+                        continue
+                    logger.warning(f'No data for {self.read_timeout}s. Closing the stream.')
+                    break
+
+                # Keep-alive
+                if not line:
+                    continue
+                count += 1
+                batch.append(line)
+                if len(batch) >= listener.batch_size:
+                    pending.add(asyncio.ensure_future(self.run(listener.process_batch, batch)))
+                    batch = []
+                    if len(pending) >= self.max_pending_batches:
+                        done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+        finally:
+            writer.close()
+            if pending:
+                await asyncio.wait(pending)
+            # Whatever didn't fill a batch is written out with the rest by stop()
+            listener.tweet_list.extend(batch)
+            await self.run(listener.stop)
+            self.executor.shutdown()
+
+        for future in pending:
+            future.result()
+
+        elapsed = time.time() - start_time
+        logger.info(f'Stream closed after {count} tweets in {elapsed:.2f}s')
+        return {'tweets': count, 'seconds': elapsed, 'tweets_per_second': count / elapsed if elapsed else 0.0}
@@ -0,0 +1,145 @@
+"""
+Phrase blocklist that takes commonly seen tweets out of the pending curation copy.
+"""
+import functools
+from pathlib import Path
+import re
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Tuple,
+)
+
+import pandas as pd
+
+
+CURATION_BLOCKLIST = str(Path(__file__).parent / 'curation_blocklist.txt')
+
+
+def read_phrases(filename: str) -> Tuple[List[str], List[str]]:
+    """
+    Reads a blocklist file. Each line is a phrase, or a whole tweet if it starts with "=". Blank lines and lines
+    starting with "#" are skipped. Trailing whitespace is kept, since some phrases end in a space.
+
+    Args:
+        filename: blocklist file
+
+    Returns:
+        Tuple of the phrases and the whole tweets
+    """
+    phrases = []
+    exact = []
+    with open(filename, encoding='utf-8') as file:
+        for line in file:
+            line = line.rstrip('\r\n')
+            if not line.strip() or line.startswith('#'):
+                continue
+            if line.startswith('='):
+                exact.append(line[1:].strip())
+            else:
+                phrases.append(line)
+    return phrases, exact
+
+
+@functools.lru_cache(maxsize=None)
+def load_blocklist(filename: str = CURATION_BLOCKLIST) -> 'PhraseBlocklist':
+    """
+    Loads and compiles a blocklist file once per process.
+    """
+    return PhraseBlocklist.from_file(filename)
+
+
+def trie_pattern(phrases: Iterable[str]) -> str:
+    """
+    Builds a regex matching any of the phrases, with the phrases merged into a trie so shared prefixes are only
+    matched once. A phrase that is a prefix of a longer one is made an optional group, which is greedy, so the
+    longest phrase at a position wins.
+
+    Args:
+        phrases: literal phrases
+
+    Returns:
+        Regex pattern, without a group around it
+    """
+    trie: Dict[str, dict] = {}
+    for phrase in phrases:
+        node = trie
+        for char in phrase:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def build(node: Dict[str, dict]) -> str:
+        branches = [re.escape(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        pattern = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{pattern})?' if '' in node else pattern
+
+    return build(trie)
+
+
+class PhraseBlocklist:
+    def __init__(self, phrases: Iterable[str] = (), exact: Iterable[str] = ()):
+        """
+        Matches tweets against a list of phrases with one regex compiled up front, and runs it over a whole
+        column at once. The phrases are merged into a trie first, see trie_pattern(). Whole tweets are looked up
+        with a set membership test instead of the regex.
+
+        A tweet is reported under the first phrase found in it, and the longest one if several start there.
+
+        Args:
+            phrases: phrases to match anywhere in a tweet, case insensitively
+            exact: tweets to match only when they are the whole tweet, case insensitively
+        """
+        self.phrases = sorted({p.lower() for p in phrases if p})
+        self.exact = sorted({e.lower() for e in exact if e})
+        self.pattern = re.compile('(' + trie_pattern(self.phrases) + ')') if self.phrases else None
+
+    @classmethod
+    def from_file(cls, filename: str = CURATION_BLOCKLIST) -> 'PhraseBlocklist':
+        """
+        Loads a blocklist file. See read_phrases() for the format.
+        """
+        phrases, exact = read_phrases(filename)
+        return cls(phrases, exact)
+
+    def match(self, texts: pd.Series) -> pd.Series:
+        """
+        Finds the phrase that blocks each text.
+
+        Args:
+            texts: tweet texts
+
+        Returns:
+            Series with the same index holding the blocking phrase of each text, or NaN where no phrase matches
+        """
+        matches = pd.Series(float('nan'), index=texts.index, dtype=object)
+        if texts.empty:
+            return matches
+
+        lower = texts.str.lower()
+        if self.pattern is not None:
+            matches = lower.str.extract(self.pattern, expand=False).astype(object)
+        if self.exact:
+            is_exact = lower.isin(self.exact)
+            matches[is_exact] = lower[is_exact]
+        return matches
+
+    def apply(self, df: pd.DataFrame, column: str = 'tweet_text') -> Tuple[pd.DataFrame, pd.Series]:
+        """
+        Removes the rows whose text contains a blocked phrase.
+
+        Args:
+            df: dataframe holding tweets
+            column: column with the text to match
+
+        Returns:
+            Tuple of the kept rows, and a Series holding the phrase that removed each removed row
+        """
+        matches = self.match(df[column])
+        blocked = matches.notna()
+        return df[~blocked], matches[blocked]
+
+    def __repr__(self):
+        return f'PhraseBlocklist with {len(self.phrases)} phrases and {len(self.exact)} whole tweets'
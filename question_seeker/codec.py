@@ -0,0 +1,173 @@
+"""
+JSON encoding and decoding used by the streamer, the text extractor and the scripts.
+
+Uses the fastest parser that is installed (orjson, then ujson) and falls back to the standard library json module.
+Whichever backend is used, the guarantees are the same as utils.encoded_write():
+    - dumps() returns a str with non-ASCII characters such as emojis kept as they are rather than \\u escaped
+    - files are read and written as UTF-8, with lone surrogates written as \\u escapes
+    - anything the accelerated backend refuses, like a lone surrogate from a tweet cut off mid emoji, is retried
+      with the standard library instead of failing
+"""
+import json
+import os
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Optional,
+    Union,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ujson
+except ImportError:
+    ujson = None
+
+
+def _default(obj: Any) -> Any:
+    """
+    Fallback for values the encoders don't know, like pandas timestamps and numpy scalars.
+    """
+    if hasattr(obj, 'isoformat'):
+        return obj.isoformat()
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f'Object of type {type(obj).__name__} is not JSON serializable')
+
+
+def _json_loads(data: Union[str, bytes]) -> Any:
+    return json.loads(data)
+
+
+def _json_dumps(obj: Any) -> str:
+    return json.dumps(obj, ensure_ascii=False, default=_default)
+
+
+def _orjson_loads(data: Union[str, bytes]) -> Any:
+    try:
+        return orjson.loads(data)
+    except orjson.JSONDecodeError:
+        return json.loads(data)
+
+
+def _orjson_dumps(obj: Any) -> str:
+    try:
+        return orjson.dumps(obj, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    except orjson.JSONEncodeError:
+        return _json_dumps(obj)
+
+
+def _ujson_loads(data: Union[str, bytes]) -> Any:
+    try:
+        return ujson.loads(data)
+    except ValueError:
+        return json.loads(data)
+
+
+def _ujson_dumps(obj: Any) -> str:
+    try:
+        return ujson.dumps(obj, ensure_ascii=False, default=_default)
+    except (TypeError, OverflowError, UnicodeEncodeError):
+        return _json_dumps(obj)
+
+
+# Backend name to (loads, dumps), in order of preference
+BACKENDS: Dict[str, Dict[str, Callable]] = {}
+if orjson is not None:
+    BACKENDS['orjson'] = {'loads': _orjson_loads, 'dumps': _orjson_dumps}
+if ujson is not None:
+    BACKENDS['ujson'] = {'loads': _ujson_loads, 'dumps': _ujson_dumps}
+BACKENDS['json'] = {'loads': _json_loads, 'dumps': _json_dumps}
+
+BACKEND = ''
+_loads = _json_loads
+_dumps = _json_dumps
+
+
+def set_backend(name: Optional[str] = None) -> str:
+    """
+    Picks the JSON backend used by every function in this module.
+
+    Args:
+        name: one of the keys of BACKENDS. If None, uses the QSEEK_JSON_BACKEND environment variable if it is set,
+            otherwise the fastest backend installed.
+
+    Returns:
+        Name of the backend in use
+    """
+    global BACKEND, _loads, _dumps
+    name = name or os.environ.get('QSEEK_JSON_BACKEND') or next(iter(BACKENDS))
+    if name not in BACKENDS:
+        raise ValueError(f'JSON backend "{name}" is not installed. Available: {list(BACKENDS)}')
+
+    BACKEND = name
+    _loads = BACKENDS[name]['loads']
+    _dumps = BACKENDS[name]['dumps']
+    return BACKEND
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """
+    Decodes a JSON document.
+
+    Args:
+        data: JSON as a str or UTF-8 bytes
+
+    Returns:
+        Decoded object
+    """
+    return _loads(data)
+
+
+def dumps(obj: Any, indent: bool = False) -> str:
+    """
+    Encodes an object as JSON with non-ASCII characters left as they are.
+
+    Args:
+        obj: object to encode
+        indent: if True, writes with 4 character indent formatting. Always uses the standard library so that
+            human readable files look the same whichever backend is installed.
+
+    Returns:
+        JSON string
+    """
+    if indent:
+        return json.dumps(obj, ensure_ascii=False, indent=4, default=_default)
+    return _dumps(obj)
+
+
+def load(filename: str) -> Any:
+    """
+    Reads and decodes a UTF-8 JSON file.
+
+    Args:
+        filename: name of the file to read
+
+    Returns:
+        Decoded object
+    """
+    with open(filename, 'rb') as file:
+        return loads(file.read())
+
+
+def dump(obj: Any, filename: str, indent: bool = False):
+    """
+    Encodes an object and writes it to a UTF-8 JSON file.
+
+    Args:
+        obj: object to encode
+        filename: name of the file to write
+        indent: if True, writes with 4 character indent formatting
+    """
+    # A lone surrogate can't be encoded as UTF-8, but it can only be inside a JSON string, where writing it as a
+    # backslash escape gives back the same value when decoded
+    with open(filename, 'w', encoding='utf-8', errors='backslashreplace') as file:
+        file.write(dumps(obj, indent))
+
+
+set_backend()
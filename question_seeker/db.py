@@ -0,0 +1,243 @@
+"""
+Database connections shared by the scripts and the Flask app, configured in one place from the environment.
+
+Set QS_SQLITE_DB to the path of a SQLite file to run against it locally. Otherwise the MySQL database named by
+MYSQL_DB_HOST, MYSQL_DB_NAME, MYSQL_DB_USER and MYSQL_DB_PASS is used. QS_DB_POOL_SIZE sets how many connections
+each process keeps open.
+"""
+import contextlib
+import os
+import queue
+import sqlite3
+import threading
+import time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    Optional,
+)
+
+import dotenv
+
+from question_seeker.log import LOGGER as logger
+
+
+def get_config() -> Dict[str, Any]:
+    """
+    Reads the database settings from the environment, including a .env file.
+
+    Returns:
+        Dictionary with the dialect, connection settings and pool size
+    """
+    dotenv.load_dotenv()
+    config = {
+        'pool_size': int(os.environ.get('QS_DB_POOL_SIZE', 2)),
+        'sqlite_filename': os.environ.get('QS_SQLITE_DB'),
+        'host': os.environ.get('MYSQL_DB_HOST'),
+        'db': os.environ.get('MYSQL_DB_NAME'),
+        'user': os.environ.get('MYSQL_DB_USER'),
+        'password': os.environ.get('MYSQL_DB_PASS'),
+    }
+    config['dialect'] = 'sqlite' if config['sqlite_filename'] else 'mysql'
+    return config
+
+
+def sqlalchemy_uri(config: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Builds the SQLAlchemy database URI for the configured database.
+    """
+    config = config or get_config()
+    if config['dialect'] == 'sqlite':
+        return f'sqlite:///{os.path.abspath(config["sqlite_filename"])}'
+    return (
+        f'mysql+pymysql://{config["user"]}:{config["password"]}@{config["host"]}/{config["db"]}?charset=utf8mb4'
+    )
+
+
+def engine_options(config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Builds SQLAlchemy engine options that match the pool used by the scripts: a small pool whose connections are
+    checked before use and replaced if they have gone stale.
+    """
+    config = config or get_config()
+    options = {'pool_pre_ping': True}
+    if config['dialect'] == 'mysql':
+        # MySQL drops connections that sit idle for longer than wait_timeout, 8 hours by default
+        options.update(pool_size=config['pool_size'], pool_recycle=3600)
+    return options
+
+
+def connect_sqlite(filename: str) -> sqlite3.Connection:
+    # Connections are handed between threads by the pool, but only ever used by one thread at a time
+    return sqlite3.connect(filename, check_same_thread=False)
+
+
+def connect_mysql(config: Dict[str, Any]):
+    import MySQLdb
+
+    return MySQLdb.connect(
+        password=config['password'],
+        db=config['db'],
+        user=config['user'],
+        host=config['host'],
+        charset='utf8mb4',
+        use_unicode=True,
+    )
+
+
+def dialect_of(connection: Any) -> str:
+    """
+    Tells which SQL dialect a DB-API connection speaks.
+    """
+    return 'sqlite' if isinstance(connection, sqlite3.Connection) else 'mysql'
+
+
+def is_healthy(connection: Any) -> bool:
+    """
+    Checks that a connection still answers a trivial query.
+    """
+    try:
+        cursor = connection.cursor()
+        cursor.execute('SELECT 1')
+        cursor.fetchall()
+        cursor.close()
+        return True
+    except Exception:
+        return False
+
+
+class ConnectionPool:
+    def __init__(
+            self,
+            connect: Callable[[], Any],
+            size: int = 2,
+            health_check_interval: float = 30.0,
+    ):
+        """
+        Small pool of DB-API connections that are only opened when first needed.
+
+        A connection that has been idle for longer than `health_check_interval` is checked with a trivial query
+        before it is handed out, and replaced with a new one if it doesn't answer, e.g. after the server timed it
+        out. A connection that was in use when an error was raised is closed rather than put back.
+
+        Args:
+            connect: function opening a new connection
+            size: most connections open at once. Asking for more waits for one to be put back.
+            health_check_interval: seconds a connection can sit idle before it is checked again
+        """
+        if size < 1:
+            raise ValueError(f'Pool size must be at least 1. Got {size}')
+
+        self.connect = connect
+        self.size = size
+        self.health_check_interval = health_check_interval
+        self.idle = queue.LifoQueue()
+        self.lock = threading.Lock()
+        self.opened = 0
+
+    def _acquire(self) -> Any:
+        try:
+            connection, last_used = self.idle.get_nowait()
+        except queue.Empty:
+            with self.lock:
+                can_open = self.opened < self.size
+                if can_open:
+                    self.opened += 1
+            if can_open:
+                return self._open()
+            connection, last_used = self.idle.get()
+
+        if time.monotonic() - last_used > self.health_check_interval and not is_healthy(connection):
+            logger.warning('Database connection went stale. Reconnecting')
+            self._close(connection)
+            return self._open()
+        return connection
+
+    def _open(self) -> Any:
+        try:
+            return self.connect()
+        except Exception:
+            with self.lock:
+                self.opened -= 1
+            raise
+
+    @staticmethod
+    def _close(connection: Any):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard(self, connection: Any):
+        self._close(connection)
+        with self.lock:
+            self.opened -= 1
+
+    @contextlib.contextmanager
+    def connection(self) -> Iterator[Any]:
+        """
+        Lends out a connection for the duration of a with block.
+        """
+        connection = self._acquire()
+        try:
+            yield connection
+        except BaseException:
+            # Includes KeyboardInterrupt and GeneratorExit, which would otherwise leak the connection's slot
+            self._discard(connection)
+            raise
+        else:
+            self.idle.put((connection, time.monotonic()))
+
+    def close(self):
+        """
+        Closes every idle connection. Connections lent out are closed when they come back.
+        """
+        while True:
+            try:
+                connection, _ = self.idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(connection)
+
+    def __repr__(self):
+        return f'ConnectionPool with {self.opened} of {self.size} connections open'
+
+
+POOL: Optional[ConnectionPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Gets the process wide connection pool, creating it from the environment on first use. Nothing connects
+    until a connection is asked for.
+    """
+    global POOL
+    with _pool_lock:
+        if POOL is None:
+            config = get_config()
+            if config['dialect'] == 'sqlite':
+                POOL = ConnectionPool(lambda: connect_sqlite(config['sqlite_filename']), config['pool_size'])
+            else:
+                POOL = ConnectionPool(lambda: connect_mysql(config), config['pool_size'])
+        return POOL
+
+
+def connection() -> contextlib.AbstractContextManager:
+    """
+    Lends out a connection from the process wide pool for the duration of a with block.
+    """
+    return get_pool().connection()
+
+
+def close_pool():
+    """
+    Closes the process wide pool, so the next connection starts a new one from the environment.
+    """
+    global POOL
+    with _pool_lock:
+        if POOL is not None:
+            POOL.close()
+        POOL = None
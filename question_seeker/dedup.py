@@ -0,0 +1,159 @@
+"""
+Bounded-memory duplicate suppression for matched tweets, keyed on tweet id and on normalized text.
+"""
+import hashlib
+import math
+import re
+from typing import (
+    List,
+    Optional,
+)
+
+
+URL_R = re.compile(r'https?://\S+')
+MENTION_R = re.compile(r'@\w+')
+NON_WORD_R = re.compile(r'[\W_]+')
+
+
+def normalize_text(text: str) -> str:
+    """
+    Reduces tweet text to what copy-paste spam has in common: lowercase words without links, mentions, punctuation
+    or extra whitespace.
+
+    Args:
+        text: tweet text
+
+    Returns:
+        Normalized text
+    """
+    text = URL_R.sub(' ', text.lower())
+    text = MENTION_R.sub(' ', text)
+    return NON_WORD_R.sub(' ', text).strip()
+
+
+def tweet_keys(tweet: dict, text: Optional[str] = None) -> List[bytes]:
+    """
+    Gets the keys a tweet is deduplicated on: its id and a hash of its normalized text. Pure, so it can run in
+    ClassifierPool workers.
+
+    Args:
+        tweet: tweet as a dictionary
+        text: full text of the tweet, if already extracted
+
+    Returns:
+        List of the id key, if the tweet has an id, followed by the text key
+    """
+    if text is None:
+        extended = tweet.get('extended_tweet')
+        text = extended.get('full_text', '') if extended else tweet.get('text', '')
+
+    keys = []
+    if tweet.get('id_str'):
+        keys.append(b'id:' + tweet['id_str'].encode('utf-8'))
+    keys.append(b'text:' + hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=16).digest())
+    return keys
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Set membership test in a fixed amount of memory. Never misses a key that was added, but reports a key
+        that wasn't as present with probability `error_rate` once `capacity` keys have been added.
+
+        Args:
+            capacity: number of keys to size the filter for
+            error_rate: false positive rate at capacity
+        """
+        if capacity < 1:
+            raise ValueError(f'Capacity must be at least 1. Got {capacity}')
+        if not 0 < error_rate < 1:
+            raise ValueError(f'Error rate must be between 0 and 1. Got {error_rate}')
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def positions(self, key: bytes) -> List[int]:
+        # Double hashing: k positions from two 64 bit halves of one digest
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def __contains__(self, key: bytes) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self.positions(key))
+
+    def add(self, key: bytes):
+        for pos in self.positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+        self.count += 1
+
+    def __repr__(self):
+        return f'BloomFilter holding {self.count} of {self.capacity} keys in {len(self.bits):,} bytes'
+
+
+class DuplicateFilter:
+    def __init__(self, capacity: int = 1000000, error_rate: float = 0.001):
+        """
+        Remembers recently seen tweets in two rotating Bloom filters. Keys go into the current filter, and once it
+        holds `capacity` keys the previous one is thrown away and a fresh one started, so memory stays fixed while
+        at least the last `capacity` keys are always remembered.
+
+        A tweet is a duplicate if either its id or its normalized text has been seen. The first covers tweets seen
+        again after a reconnect, the second copy-paste spam posted under many ids. A tweet is wrongly called a
+        duplicate with probability of about twice `error_rate`.
+
+        Args:
+            capacity: number of keys each of the two filters holds. Each tweet uses two keys.
+            error_rate: false positive rate of each filter when full
+        """
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.current = BloomFilter(capacity, error_rate)
+        self.previous: Optional[BloomFilter] = None
+
+    def __contains__(self, key: bytes) -> bool:
+        return key in self.current or (self.previous is not None and key in self.previous)
+
+    def add(self, key: bytes):
+        if self.current.count >= self.capacity:
+            self.previous = self.current
+            self.current = BloomFilter(self.capacity, self.error_rate)
+        self.current.add(key)
+
+    def check_keys(self, keys: List[bytes]) -> Optional[str]:
+        """
+        Checks a tweet's keys against the ones seen so far, then remembers them.
+
+        Args:
+            keys: keys from tweet_keys()
+
+        Returns:
+            'duplicate_id' or 'duplicate_text' if the tweet was seen before, otherwise None
+        """
+        reason = None
+        for key in keys:
+            if key in self:
+                reason = reason or ('duplicate_id' if key.startswith(b'id:') else 'duplicate_text')
+            else:
+                self.add(key)
+        return reason
+
+    def check(self, tweet: dict, text: Optional[str] = None) -> Optional[str]:
+        """
+        Checks whether a tweet was seen before, and remembers it.
+
+        Args:
+            tweet: tweet as a dictionary
+            text: full text of the tweet, if already extracted
+
+        Returns:
+            'duplicate_id' or 'duplicate_text' if the tweet was seen before, otherwise None
+        """
+        return self.check_keys(tweet_keys(tweet, text))
+
+    def __repr__(self):
+        return f'DuplicateFilter remembering up to {2 * self.capacity:,} keys'
@@ -0,0 +1,136 @@
+"""
+Local stand-in for Twitter's streaming endpoint, for testing and benchmarking stream clients without credentials.
+"""
+import asyncio
+import threading
+from typing import (
+    Iterable,
+    List,
+    Optional,
+    Union,
+)
+
+from question_seeker.log import LOGGER as logger
+
+
+class FakeStreamServer:
+    def __init__(
+            self,
+            lines: Iterable[Union[str, bytes]],
+            port: int = 0,
+            host: str = '127.0.0.1',
+            rate: Optional[float] = None,
+            lines_per_chunk: int = 10,
+            keep_alive_every: int = 0,
+            status: int = 200,
+    ):
+        """
+        Serves raw tweets the way the v1.1 filter endpoint does: a chunked HTTP response of payloads separated by
+        \\r\\n, with blank keep-alive lines in between. Every request, whatever its path or body, gets the same
+        lines, after which the response ends. Runs its own event loop on a background thread.
+
+        Args:
+            lines: raw tweet payloads to send
+            port: port to listen on. 0 picks a free one, available as `port` once started.
+            host: interface to listen on
+            rate: tweets per second to send at. None sends them as fast as the client reads.
+            lines_per_chunk: number of payloads in each HTTP chunk. Payloads are split across chunk boundaries
+                like the real stream does, so clients have to buffer.
+            keep_alive_every: send a blank keep-alive line after every this many payloads. 0 never does.
+            status: HTTP status to answer with. Anything other than 200 ends the response straight away.
+        """
+        self.lines = [line.encode('utf-8') if isinstance(line, str) else line for line in lines]
+        self.host = host
+        self.port = port
+        self.rate = rate
+        self.lines_per_chunk = lines_per_chunk
+        self.keep_alive_every = keep_alive_every
+        self.status = status
+
+        self.requests: List[bytes] = []
+        self.loop = asyncio.new_event_loop()
+        self.server = None
+        self.connections = set()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='fake-stream-server', daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f'http://{self.host}:{self.port}/1.1/statuses/filter.json'
+
+    def start(self) -> 'FakeStreamServer':
+        self.thread.start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, self.host, self.port), self.loop,
+        ).result()
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f'Fake stream serving {len(self.lines)} tweets on port {self.port}')
+        return self
+
+    def stop(self):
+        async def close():
+            self.server.close()
+            for task in self.connections:
+                task.cancel()
+            await asyncio.gather(*self.connections, return_exceptions=True)
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(close(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+
+    def body_chunks(self) -> Iterable[bytes]:
+        """
+        Splits the stream body into chunks, cutting the last payload of each chunk in half.
+        """
+        pending = b''
+        for start in range(0, len(self.lines), self.lines_per_chunk):
+            body = b''
+            for i, line in enumerate(self.lines[start:start + self.lines_per_chunk], start):
+                body += line + b'\r\n'
+                if self.keep_alive_every and (i + 1) % self.keep_alive_every == 0:
+                    body += b'\r\n'
+            body = pending + body
+            cut = len(body) - len(self.lines[min(start + self.lines_per_chunk, len(self.lines)) - 1]) // 2
+            yield body[:cut]
+            pending = body[cut:]
+        if pending:
+            yield pending
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        task = asyncio.current_task()
+        self.connections.add(task)
+        try:
+            request = await reader.readuntil(b'\r\n\r\n')
+            length = [
+                int(line.split(b':', 1)[1]) for line in request.split(b'\r\n')
+                if line.lower().startswith(b'content-length:')
+            ]
+            if length:
+                request += await reader.readexactly(length[0])
+            self.requests.append(request)
+
+            if self.status != 200:
+                writer.write(f'HTTP/1.1 {self.status} Error\r\nContent-Length: 0\r\n\r\n'.encode('ascii'))
+                await writer.drain()
+                return
+
+            writer.write(b'HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nTransfer-Encoding: chunked\r\n\r\n')
+            sent = 0
+            start_time = self.loop.time()
+            for chunk in self.body_chunks():
+                if self.rate is not None:
+                    sent += self.lines_per_chunk
+                    delay = start_time + sent / self.rate - self.loop.time()
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                writer.write(f'{len(chunk):x}\r\n'.encode('ascii') + chunk + b'\r\n')
+                await writer.drain()
+            writer.write(b'0\r\n\r\n')
+            await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # The client hung up, e.g. once it hit its time limit
+            pass
+        finally:
+            writer.close()
+            self.connections.discard(task)
@@ -0,0 +1,369 @@
+"""
+In-process metrics for the streamer: counters, gauges and latency histograms, readable as Prometheus style text over
+HTTP or as periodic JSON snapshots.
+"""
+import bisect
+from collections import Counter as TallyCounter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import threading
+import time
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from question_seeker.log import LOGGER as logger
+from question_seeker import codec
+
+
+# Histogram bucket upper bounds in seconds, from 10µs to 10s
+LATENCY_BUCKETS = (
+    1e-5, 2.5e-5, 5e-5, 1e-4, 2.5e-4, 5e-4, 1e-3, 2.5e-3, 5e-3, 1e-2, 2.5e-2, 5e-2, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    escaped = (value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name: str, description: str):
+        """
+        Monotonic count, optionally split by labels.
+
+        Args:
+            name: metric name
+            description: help text
+        """
+        self.name = name
+        self.description = description
+        self.values: Dict[LabelKey, float] = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = _label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        with self.lock:
+            return self.values.get(_label_key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = dict(self.values)
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} counter']
+        lines.extend(f'{self.name}{_format_labels(key)} {value}' for key, value in sorted(values.items()))
+        return lines
+
+    def snapshot(self) -> List[dict]:
+        with self.lock:
+            return [{'labels': dict(key), 'value': value} for key, value in sorted(self.values.items())]
+
+
+class Gauge:
+    def __init__(self, name: str, description: str, func: Callable[[], float]):
+        """
+        Value read from a callback whenever the metrics are collected.
+
+        Args:
+            name: metric name
+            description: help text
+            func: function returning the current value
+        """
+        self.name = name
+        self.description = description
+        self.func = func
+
+    def get(self) -> float:
+        return self.func()
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} gauge', f'{self.name} {self.get()}']
+
+    def snapshot(self) -> List[dict]:
+        return [{'labels': {}, 'value': self.get()}]
+
+
+class Histogram:
+    def __init__(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        """
+        Distribution of observed values, usually durations in seconds, counted into fixed buckets.
+
+        Args:
+            name: metric name
+            description: help text
+            buckets: sorted upper bounds of the buckets. Values above the last bound only count towards +Inf.
+        """
+        self.name = name
+        self.description = description
+        self.buckets = tuple(buckets)
+        # Label key to [per bucket counts..., +Inf count, sum]
+        self.values: Dict[LabelKey, List[float]] = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self.lock:
+            counts = self.values.get(key)
+            if counts is None:
+                counts = self.values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def time(self, **labels) -> '_Timer':
+        """
+        Context manager that observes how long its block took.
+        """
+        return _Timer(self, labels)
+
+    def get_count(self, **labels) -> int:
+        with self.lock:
+            counts = self.values.get(_label_key(labels))
+        return int(sum(counts[:-1])) if counts else 0
+
+    def render(self) -> List[str]:
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+
+        lines = [f'# HELP {self.name} {self.description}', f'# TYPE {self.name} histogram']
+        for key, counts in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts[:-1]):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'{self.name}_bucket{_format_labels(key, ("le", le))} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(key)} {counts[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(key)} {cumulative}')
+        return lines
+
+    def snapshot(self) -> List[dict]:
+        with self.lock:
+            values = {key: list(counts) for key, counts in self.values.items()}
+
+        snapshot = []
+        for key, counts in sorted(values.items()):
+            count = int(sum(counts[:-1]))
+            snapshot.append({
+                'labels': dict(key),
+                'count': count,
+                'sum': counts[-1],
+                'mean': counts[-1] / count if count else 0.0,
+                'buckets': dict(zip([repr(bound) for bound in self.buckets] + ['+Inf'], counts[:-1])),
+            })
+        return snapshot
+
+
+class _Timer:
+    def __init__(self, histogram: Histogram, labels: Dict[str, str]):
+        self.histogram = histogram
+        self.labels = labels
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.start, **self.labels)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Collection of named metrics. Asking for a metric that already exists returns the existing one, so modules
+        can declare the metrics they update at import time.
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _get_or_create(self, name: str, factory: Callable):
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = factory()
+            return self.metrics[name]
+
+    def counter(self, name: str, description: str) -> Counter:
+        return self._get_or_create(name, lambda: Counter(name, description))
+
+    def histogram(self, name: str, description: str, buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._get_or_create(name, lambda: Histogram(name, description, buckets))
+
+    def gauge(self, name: str, description: str, func: Callable[[], float]) -> Gauge:
+        """
+        Registers a gauge, replacing the callback of any gauge already registered under the same name.
+        """
+        with self.lock:
+            self.metrics[name] = Gauge(name, description, func)
+            return self.metrics[name]
+
+    def render(self) -> str:
+        """
+        Renders every metric in the Prometheus text exposition format.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return '\n'.join(line for metric in metrics for line in metric.render()) + '\n'
+
+    def snapshot(self) -> dict:
+        """
+        Gets every metric as a JSON serializable dictionary.
+        """
+        with self.lock:
+            metrics = dict(self.metrics)
+        return {
+            'timestamp': time.time(),
+            'metrics': {name: metric.snapshot() for name, metric in metrics.items()},
+        }
+
+    def write_snapshot(self, filename: str):
+        """
+        Writes a JSON snapshot, replacing the previous one in a single rename so readers never see half a file.
+        """
+        tmp_filename = f'{filename}.tmp'
+        codec.dump(self.snapshot(), tmp_filename, indent=True)
+        os.replace(tmp_filename, filename)
+
+
+# Registry shared by the whole process
+REGISTRY = MetricsRegistry()
+
+TWEETS_RECEIVED = REGISTRY.counter('qs_tweets_received_total', 'Raw payloads received from the stream')
+TWEETS_REJECTED = REGISTRY.counter(
+    'qs_tweets_rejected_total', 'Tweets rejected, by stage (prefilter, decode or classify) and rule',
+)
+PREFILTER_FALSE_REJECTS = REGISTRY.counter(
+    'qs_prefilter_false_rejects_total', 'Tweets the pre-filter rejected that the full path would have kept',
+)
+BATCH_ERRORS = REGISTRY.counter(
+    'qs_batch_errors_total', 'Batches a worker thread failed to process and skipped, by step (process or drain)',
+)
+TWEETS_MATCHED = REGISTRY.counter('qs_tweets_matched_total', 'Tweets matched, by question start')
+TWEETS_WRITTEN = REGISTRY.counter('qs_tweets_written_total', 'Tweets written to file, by output file')
+TWEETS_SPILLED = REGISTRY.counter('qs_tweets_spilled_total', 'Raw payloads spilled to the overflow file')
+TWEETS_DRAINED = REGISTRY.counter('qs_tweets_drained_total', 'Raw payloads drained back from the overflow file')
+BATCH_SECONDS = REGISTRY.histogram(
+    'qs_batch_seconds', 'Time spent on each stage of processing a batch: prefilter, decode, classify and total',
+)
+WRITE_SECONDS = REGISTRY.histogram('qs_write_seconds', 'Time taken by TweetHandler batch writes, by output file')
+FLUSH_SECONDS = REGISTRY.histogram('qs_flush_seconds', 'Time taken by output file flushes, including any fsync')
+
+
+def record_outcomes(outcomes: TallyCounter, stage: str = 'classify'):
+    """
+    Adds the outcomes tallied for a batch of tweets to the shared counters. Tallying per batch and recording once
+    keeps the locks out of the per-tweet path.
+
+    Args:
+        outcomes: tally keyed by ('rejected', rule), ('matched', question start) and ('duplicate', reason) pairs, as
+            filled in by processing.classify() and processing.process()
+        stage: stage that rejected the tweets. Duplicates are always counted under the 'dedup' stage.
+    """
+    for (kind, label), count in outcomes.items():
+        if kind == 'rejected':
+            TWEETS_REJECTED.inc(count, stage=stage, rule=label)
+        elif kind == 'matched':
+            TWEETS_MATCHED.inc(count, start=label)
+        elif kind == 'duplicate':
+            TWEETS_REJECTED.inc(count, stage='dedup', rule=label)
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    registry: MetricsRegistry = REGISTRY
+
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = self.registry.render().encode('utf-8')
+            content_type = 'text/plain; version=0.0.4; charset=utf-8'
+        elif self.path == '/metrics.json':
+            body = codec.dumps(self.registry.snapshot()).encode('utf-8')
+            content_type = 'application/json'
+        else:
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args):
+        logger.debug(f'Metrics request: {format % args}')
+
+
+class MetricsServer:
+    def __init__(self, port: int, host: str = '127.0.0.1', registry: MetricsRegistry = REGISTRY):
+        """
+        Serves the registry on a background thread: Prometheus text at /metrics and JSON at /metrics.json.
+
+        Args:
+            port: port to listen on. 0 picks a free one, available as `port` once started.
+            host: interface to listen on. Local only by default.
+            registry: registry to serve
+        """
+        handler = type('MetricsRequestHandler', (_MetricsRequestHandler,), {'registry': registry})
+        self.server = ThreadingHTTPServer((host, port), handler)
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, name='metrics-server', daemon=True)
+
+    def start(self) -> 'MetricsServer':
+        self.thread.start()
+        logger.info(f'Serving metrics on port {self.port}')
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+        self.thread.join()
+
+
+class SnapshotWriter:
+    def __init__(self, filename: str, interval: float = 60.0, registry: MetricsRegistry = REGISTRY):
+        """
+        Writes a JSON snapshot of the registry every `interval` seconds on a background thread, and once more
+        when stopped.
+
+        Args:
+            filename: file to write the snapshot to
+            interval: seconds between snapshots
+            registry: registry to snapshot
+        """
+        self.filename = filename
+        self.interval = interval
+        self.registry = registry
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name='metrics-snapshot', daemon=True)
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            try:
+                self.registry.write_snapshot(self.filename)
+            except OSError as e:
+                logger.warning(f'Could not write metrics snapshot to {self.filename}: {e}')
+
+    def start(self) -> 'SnapshotWriter':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.stopped.set()
+        self.thread.join()
+        self.registry.write_snapshot(self.filename)
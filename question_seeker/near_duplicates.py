@@ -0,0 +1,181 @@
+"""
+Near-duplicate detection for tweet texts with SimHash signatures and LSH banding.
+"""
+import hashlib
+from typing import (
+    Dict,
+    Sequence,
+)
+
+import numpy as np
+import pandas as pd
+
+from question_seeker.dedup import normalize_text
+
+
+# Number of set bits in every byte value, for popcounts that work on any numpy version
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """
+    Counts the set bits in each element of a uint64 array.
+    """
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _BYTE_POPCOUNT[values.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def features(text: str):
+    """
+    Splits a text into the features its signature is built from: its normalized words and pairs of adjacent words.
+    """
+    words = normalize_text(text).split()
+    return words + [f'{a} {b}' for a, b in zip(words, words[1:])]
+
+
+def simhash(texts: Sequence[str], block_size: int = 10000) -> np.ndarray:
+    """
+    Computes 64 bit SimHash signatures. Texts that share most of their words get signatures that differ in only
+    a few bits.
+
+    Each distinct feature is hashed once, then the signatures are summed up a block of texts at a time, so time
+    grows linearly with the number of texts and memory stays bounded.
+
+    Args:
+        texts: texts to sign
+        block_size: number of texts to sum up at once
+
+    Returns:
+        Array of uint64 signatures, one per text
+    """
+    feature_hashes: Dict[str, int] = {}
+    signatures = np.zeros(len(texts), dtype=np.uint64)
+
+    for start in range(0, len(texts), block_size):
+        block = texts[start:start + block_size]
+        counts = []
+        hashes = []
+        for text in block:
+            text_features = features(text)
+            counts.append(len(text_features))
+            for feature in text_features:
+                value = feature_hashes.get(feature)
+                if value is None:
+                    value = feature_hashes[feature] = int.from_bytes(
+                        hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest(), 'little',
+                    )
+                hashes.append(value)
+        if not hashes:
+            continue
+
+        # Each feature votes +1 or -1 on each bit, and a signature bit is set if the votes for it are positive
+        bits = np.unpackbits(np.array(hashes, dtype=np.uint64).view(np.uint8).reshape(-1, 8), axis=1)
+        votes = bits.view(np.int8) * 2 - 1
+        counts = np.array(counts)
+        has_features = counts > 0
+        offsets = (np.cumsum(counts) - counts)[has_features]
+        totals = np.zeros((len(block), 64), dtype=np.int32)
+        totals[has_features] = np.add.reduceat(votes, offsets, axis=0, dtype=np.int32)
+
+        signature_bits = (totals > 0).astype(np.uint8)
+        signatures[start:start + len(block)] = np.packbits(signature_bits, axis=1).view(np.uint64).ravel()
+
+    return signatures
+
+
+def _connected_components(num_nodes: int, left: np.ndarray, right: np.ndarray) -> np.ndarray:
+    """
+    Labels every node with the smallest node it is connected to, by min-label propagation with pointer jumping.
+    """
+    labels = np.arange(num_nodes)
+    if not len(left):
+        return labels
+
+    while True:
+        smallest = np.minimum(labels[left], labels[right])
+        new_labels = labels.copy()
+        np.minimum.at(new_labels, left, smallest)
+        np.minimum.at(new_labels, right, smallest)
+        np.minimum.at(new_labels, labels, new_labels)
+        new_labels = new_labels[new_labels]
+        if np.array_equal(new_labels, labels):
+            return labels
+        labels = new_labels
+
+
+def cluster(signatures: np.ndarray, max_distance: int = 8, window: int = 16) -> np.ndarray:
+    """
+    Groups signatures that are within `max_distance` bits of each other.
+
+    The 64 bits are split into `max_distance + 1` bands. Two signatures within `max_distance` bits must agree
+    exactly on at least one band, so only signatures sharing a band value are candidates. Within each band,
+    signatures are sorted by band value, then by signature, and each is compared with the next `window`, which keeps
+    the work linear even when a template produces a huge bucket. Clusters are the connected components of the pairs
+    found, so near duplicates of near duplicates end up together.
+
+    Args:
+        signatures: uint64 SimHash signatures
+        max_distance: largest number of differing bits for two signatures to count as near duplicates
+        window: number of neighbours in band order to compare each signature with
+
+    Returns:
+        Array giving each signature the index of the first signature in its cluster
+    """
+    num_bands = max_distance + 1
+    if not 1 <= num_bands <= 64:
+        raise ValueError(f'max_distance must be between 0 and 63. Got {max_distance}')
+
+    signatures = np.ascontiguousarray(signatures, dtype=np.uint64)
+    band_bits = 64 // num_bands
+    left = []
+    right = []
+    for band in range(num_bands):
+        shift = np.uint64(band * band_bits)
+        width = 64 - band * band_bits if band == num_bands - 1 else band_bits
+        mask = np.uint64((1 << width) - 1)
+        band_values = (signatures >> shift) & mask
+
+        # Within a bucket, neighbours in signature order are the likeliest matches
+        order = np.lexsort((signatures, band_values))
+        sorted_bands = band_values[order]
+        for offset in range(1, window + 1):
+            if offset >= len(order):
+                break
+            a = order[:-offset]
+            b = order[offset:]
+            candidates = sorted_bands[:-offset] == sorted_bands[offset:]
+            a = a[candidates]
+            b = b[candidates]
+            close = popcount(signatures[a] ^ signatures[b]) <= max_distance
+            left.append(a[close])
+            right.append(b[close])
+
+    left = np.concatenate(left) if left else np.array([], dtype=np.int64)
+    right = np.concatenate(right) if right else np.array([], dtype=np.int64)
+    return _connected_components(len(signatures), left, right)
+
+
+def drop_near_duplicates(
+        df: pd.DataFrame,
+        column: str = 'tweet_text',
+        max_distance: int = 8,
+        window: int = 16,
+) -> pd.DataFrame:
+    """
+    Keeps the first row of each cluster of near duplicate texts.
+
+    Args:
+        df: dataframe holding tweets
+        column: column with the text to compare
+        max_distance: largest number of differing SimHash bits for two texts to count as near duplicates
+        window: number of neighbours to compare each text with in every band. See cluster().
+
+    Returns:
+        DataFrame with one representative row per cluster, in the original order
+    """
+    if df.empty:
+        return df
+
+    signatures = simhash(df[column].tolist())
+    labels = cluster(signatures, max_distance, window)
+    return df[labels == np.arange(len(df))]
@@ -0,0 +1,156 @@
+"""
+Cheap checks on raw stream payloads that reject tweets before they are decoded.
+"""
+from collections import Counter
+import re
+import threading
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+from question_seeker.log import LOGGER as logger
+from question_seeker import codec, metrics, processing
+
+# Whitespace tolerant, so payloads written by json.dumps() with its default separators are checked the same way
+RETWEET_PATTERN = re.compile(r'"retweeted_status"\s*:\s*\{')
+REPLY_KEY_PATTERN = re.compile(r'"in_reply_to_user_id"\s*:')
+NOT_REPLY_PATTERN = re.compile(r'"in_reply_to_user_id"\s*:\s*null')
+
+
+class RawPreFilter:
+    def __init__(
+            self,
+            ignore_retweets: bool = True,
+            ignore_replies: bool = True,
+            verify: bool = False,
+            matcher: Optional[processing.QuestionMatcher] = None,
+    ):
+        """
+        Rejects raw tweet payloads with substring checks so that only survivors pay for a full decode.
+
+        Twitter sends compact JSON, but recorded and generated files may have whitespace between a key and its
+        value, so the checks allow for it. They only reject a payload when the full path in processing.classify()
+        would reject it too:
+            - retweet: the payload contains `"retweeted_status": {`
+            - reply: the payload has an `in_reply_to_user_id` key and none of them are null. Quoted tweets
+              carry their own copy of the key, so a null anywhere lets the payload through.
+            - no_question: there is no question mark anywhere in the payload, so the text can't have one either
+
+        With `verify` set, every rejected payload is also decoded and run through processing.classify(). Any
+        payload the full path would have kept is counted under 'false_reject' and logged. This is a correctness
+        mode for checking the shortcuts against real traffic, not for production.
+
+        Args:
+            ignore_retweets: whether to reject retweets, same as processing.classify()
+            ignore_replies: whether to reject replies, same as processing.classify()
+            verify: whether to cross-check rejected payloads against the full path
+            matcher: QuestionMatcher for the tracked question starts. Required if `verify` is set.
+        """
+        if verify and matcher is None:
+            raise ValueError('A QuestionMatcher is needed to verify the pre-filter')
+
+        self.ignore_retweets = ignore_retweets
+        self.ignore_replies = ignore_replies
+        self.verify = verify
+        self.matcher = matcher
+
+        self.counts = Counter()
+        self.lock = threading.Lock()
+
+    def check(self, raw: Union[str, bytes]) -> Optional[str]:
+        """
+        Runs the substring checks on a single raw payload.
+
+        Args:
+            raw: raw tweet payload from the stream
+
+        Returns:
+            Name of the check that rejects the payload ('retweet', 'reply' or 'no_question'), or None if it passes
+        """
+        if isinstance(raw, bytes):
+            raw = raw.decode('utf-8')
+
+        if self.ignore_retweets and RETWEET_PATTERN.search(raw):
+            return 'retweet'
+
+        if self.ignore_replies and REPLY_KEY_PATTERN.search(raw) and not NOT_REPLY_PATTERN.search(raw):
+            return 'reply'
+
+        if '?' not in raw:
+            return 'no_question'
+
+        return None
+
+    def filter(self, raw_list: List[Union[str, bytes]]) -> List[Union[str, bytes]]:
+        """
+        Runs the checks over a batch of raw payloads and updates the counts.
+
+        Args:
+            raw_list: list of raw tweet payloads
+
+        Returns:
+            List of payloads that passed, in their original order
+        """
+        counts = Counter(received=len(raw_list))
+        survivors = []
+        for raw in raw_list:
+            reason = self.check(raw)
+            if reason is None:
+                survivors.append(raw)
+                continue
+
+            counts[reason] += 1
+            if self.verify and self.is_false_reject(raw, reason):
+                counts['false_reject'] += 1
+        counts['passed'] = len(survivors)
+
+        with self.lock:
+            self.counts.update(counts)
+        for reason in ['retweet', 'reply', 'no_question']:
+            if counts[reason]:
+                metrics.TWEETS_REJECTED.inc(counts[reason], stage='prefilter', rule=reason)
+        if counts['false_reject']:
+            metrics.PREFILTER_FALSE_REJECTS.inc(counts['false_reject'])
+        return survivors
+
+    def is_false_reject(self, raw: Union[str, bytes], reason: str) -> bool:
+        """
+        Checks a rejected payload against the full decode and match path.
+
+        Args:
+            raw: raw tweet payload that the pre-filter rejected
+            reason: name of the check that rejected it
+
+        Returns:
+            True if the full path would have kept the tweet
+        """
+        tweet = codec.loads(raw)
+        match = processing.classify(
+            tweet, self.matcher, ignore_retweets=self.ignore_retweets, ignore_replies=self.ignore_replies,
+        )
+        if match is None:
+            return False
+
+        logger.warning(f'Pre-filter rejected tweet {tweet.get("id_str")} as "{reason}" but it matched "{match[0]}"')
+        return True
+
+    def rejection_rates(self) -> Dict[str, float]:
+        """
+        Gets the share of received payloads rejected by each check, and the share that passed.
+
+        Returns:
+            Dictionary mapping check names, 'passed' and 'false_reject' to a fraction of payloads received
+        """
+        with self.lock:
+            counts = dict(self.counts)
+
+        received = counts.pop('received', 0)
+        if not received:
+            return {}
+        return {name: count / received for name, count in counts.items()}
+
+    def __repr__(self):
+        return f'RawPreFilter having seen {self.counts["received"]} tweets, passing {self.counts["passed"]}'
@@ -1,28 +1,44 @@
+from collections import Counter
 from itertools import chain
-import json
+import multiprocessing
 import re
+import time
 from typing import (
+    Any,
     Dict,
     List,
+    Optional,
+    Tuple,
     Union,
 )
 
+from question_seeker.dedup import DuplicateFilter, tweet_keys
 from question_seeker.log import LOGGER
-from question_seeker import q_starts, utils
-
-
-# PATTERN = r"(\b(why|y|who|what|where|how)\b \b(am|are|can|can't|did|do|don't|is|must|should)\b) .+\?"
-
-# For now, limit to just "imperative" starts
-PATTERN = r"(\b(why|y|who|what|where|how)\b \b(must|should)\b) .+\?"
-R = re.compile(PATTERN, flags=re.IGNORECASE)
+from question_seeker import codec, metrics, q_starts, trace, utils
 
 
 class TweetHandler:
-    def __init__(self, starts: List[str], filename: str, batch_size: int, write_to_file: bool):
+    def __init__(
+            self,
+            starts: List[str],
+            filename: str,
+            batch_size: int,
+            write_to_file: bool,
+            **file_options,
+    ):
+        """
+        Holds matched tweets for a list of question starts and writes them to file in batches.
+
+        Args:
+            starts: question starts handled by this object
+            filename: file to append tweets to
+            batch_size: int, number of tweets to hold onto before writing to a file
+            write_to_file: bool, whether to actually write to a file
+            file_options: rotation, compression, buffering and flushing options for utils.get_file_wrapper()
+        """
         self.starts = starts
         self.filename = filename
-        self.file = utils.FileWrapper(self.filename)
+        self.file = utils.get_file_wrapper(self.filename, **file_options)
         self.batch_size = batch_size
         self.write_to_file = write_to_file
         self.bucket = []
@@ -32,21 +48,24 @@ class TweetHandler:
         Adds a tweet to the handler bucket
 
         Args:
-            tweet: tweet text
+            tweet: tweet as a JSON string, written to file as it is
         """
         self.bucket.append(tweet)
         if len(self.bucket) >= self.batch_size:
-            if self.write_to_file:
-                self.write_tweets()
-            self.bucket = []
+            self.write_tweets()
 
     def write_tweets(self):
         """
-        Writes stored tweets to the file stored in the handler
+        Writes stored tweets to the file stored in the handler in one batch, if writing to file, and empties the
+        bucket so that no tweet is written twice
         """
-        for tweet in self.bucket:
-            self.file.write(tweet)
-        LOGGER.info(f'Wrote {len(self.bucket)} tweets to file')
+        if self.write_to_file and self.bucket:
+            start = time.perf_counter()
+            self.file.write_lines(self.bucket)
+            metrics.WRITE_SECONDS.observe(time.perf_counter() - start, file=self.filename)
+            metrics.TWEETS_WRITTEN.inc(len(self.bucket), file=self.filename)
+            LOGGER.info(f'Wrote {len(self.bucket)} tweets to file')
+        self.bucket = []
 
     def __repr__(self):
         return f'TweetHandler with filename "{self.filename}" holding {len(self.bucket)} tweets'
@@ -55,7 +74,8 @@ class TweetHandler:
 def get_tweet_handler_map(
         q_list_names: Union[List[str], str],
         batch_size: int,
-        write_to_file: bool
+        write_to_file: bool,
+        **file_options,
 ) -> Dict[str, TweetHandler]:
     """
     Creates a dictionary from question start to TweetHandler object for each question start matching the
@@ -65,6 +85,7 @@ def get_tweet_handler_map(
         q_list_names: list of strings to fetch question starts from q_starts
         batch_size: int, number of tweets to hold onto before writing to a file
         write_to_file: bool, whether to actually write to a file
+        file_options: rotation, compression, buffering and flushing options for utils.get_file_wrapper()
 
     Returns:
         Dictionary mapping of question starts to TweetHandler objects
@@ -72,7 +93,7 @@ def get_tweet_handler_map(
     handler_map = {}
     for name in q_list_names:
         tracking, filename = q_starts.get_q_list_and_filename(name)
-        handler = TweetHandler(tracking, filename, batch_size, write_to_file)
+        handler = TweetHandler(tracking, filename, batch_size, write_to_file, **file_options)
         handler_map.update({start: handler for start in handler.starts})
     return handler_map
 
@@ -82,66 +103,168 @@ def get_full_tracking_list(tweet_handler_map: Dict[str, TweetHandler]) -> List[s
     return list(chain.from_iterable([x.starts for x in tweet_handlers]))
 
 
-def process(
+class QuestionMatcher:
+    def __init__(self, tweet_handler_map: Dict[str, Any]):
+        """
+        Compiles every tracked question start into a single regex so that one scan of the tweet text finds both
+        the question start and the object it maps to.
+
+        The starts are folded into a character trie before compiling so the regex engine only follows branches
+        sharing the characters it has already read. Each start ends in an empty capture group, and the index of
+        the group that matched points straight at the start and its target.
+
+        Assumptions carried over from the original pattern:
+            - The start can appear anywhere in the tweet but must begin on a word boundary.
+            - The start must be followed by a space, at least one more character, and a question mark.
+            - Case is ignored.
+
+        Args:
+            tweet_handler_map: mapping of question starts to the objects to return on a match, usually the
+                output of get_tweet_handler_map()
+        """
+        self.tweet_handler_map = tweet_handler_map
+        self.targets: List[Optional[Tuple[str, Any]]] = [None]
+
+        trie = {}
+        for start in tweet_handler_map:
+            node = trie
+            for char in start.lower():
+                node = node.setdefault(char, {})
+            node[''] = start
+
+        self.pattern = r'\b(?:' + self._trie_to_pattern(trie) + r') .+\?'
+        self.regex = re.compile(self.pattern, flags=re.IGNORECASE)
+
+    def _trie_to_pattern(self, node: dict) -> str:
+        """
+        Recursively renders a trie node as a regex. Longer continuations are listed before the end of a start
+        so that, for example, "why can't" is preferred over "why can".
+
+        Args:
+            node: trie node mapping characters to child nodes, with the empty string marking the end of a start
+
+        Returns:
+            regex string for the node
+        """
+        branches = []
+        for char in sorted(x for x in node if x):
+            branches.append(re.escape(char) + self._trie_to_pattern(node[char]))
+
+        if '' in node:
+            start = node['']
+            self.targets.append((start, self.tweet_handler_map[start]))
+            branches.append('()')
+
+        if len(branches) == 1:
+            return branches[0]
+        return '(?:' + '|'.join(branches) + ')'
+
+    def match(self, tweet_text: str) -> Optional[Tuple[str, Any]]:
+        """
+        Searches the tweet text for any tracked question start.
+
+        Args:
+            tweet_text: body of the tweet
+
+        Returns:
+            Tuple of the matched question start and its target object, or None if nothing matched
+        """
+        match = self.regex.search(tweet_text)
+        if match is None:
+            return None
+        return self.targets[match.lastindex]
+
+    def __repr__(self):
+        return f'QuestionMatcher tracking {len(self.targets) - 1} question starts'
+
+
+def as_line(raw: Union[str, bytes]) -> str:
+    """
+    Turns a raw stream payload into a line to write to file, untouched apart from the trailing line break.
+
+    Args:
+        raw: raw tweet payload
+
+    Returns:
+        Payload as a string without the trailing line break
+    """
+    if isinstance(raw, bytes):
+        raw = raw.decode('utf-8')
+    return raw.rstrip('\r\n')
+
+
+def get_rejection_reason(
         tweet: dict,
-        tweet_handler_map: Dict[str, TweetHandler],
         ignore_retweets: bool = True,
         ignore_replies: bool = True,
         ignore_links: bool = True,
-):
+) -> Optional[str]:
     """
-    Checks if a string is asking a question that is being tracked.
-    Assumptions:
-        - Looks throughout the entire tweet, not just the beginning.
-        - Question must end with a question mark.
-        - Case is ignored.
+    Checks a tweet against the rules that rule it out before any text matching.
 
     Args:
-        tweet: tweet to match against
-        tweet_handler_map: mapping of question starts to TweetHandler objects
+        tweet: tweet to check
         ignore_retweets:
         ignore_replies:
         ignore_links:
+
+    Returns:
+        Name of the first rule that rejects the tweet ('retweet', 'reply', 'hashtags', 'mentions' or 'links'), or
+        None if the tweet should go on to matching
     """
     # Ignore retweets
     # Only looking for original queries, not echoing other ideas, even if it indicates agreement.
     # Cuts down on redundancy of saved tweets.
     if ignore_retweets:
         if tweet.get('retweeted_status') is not None:
-            return
+            return 'retweet'
 
     # Ignore direct replies to people
     # Only looking for questions posed to the general public, not to
     # specific people
     if ignore_replies:
         if tweet.get('in_reply_to_user_id') is not None:
-            return
+            return 'reply'
 
-    media = tweet['entities']
+    # Stream messages without entities (deletes, limit notices) have nothing to match against anyway
+    media = tweet.get('entities', {})
 
     # Don't consider tweets with >2 hashtags.
     # Making the assumption that 3+ hashtags indicates engagement ploys
     # rather than seeking an actual answer.
     # if tweet_text.count('#') > 2:
     #     return
-    if len(media['hashtags']) > 2:
-        return
+    if len(media.get('hashtags', [])) > 2:
+        return 'hashtags'
 
     # Don't consider tweets with >2 @ mentions.
     # Also making the assumption that 3+ mentions are engagement ploys
     # if tweet_text.count('@') > 2:
     #     return
-    if len(media['user_mentions']) > 2:
-        return
+    if len(media.get('user_mentions', [])) > 2:
+        return 'mentions'
 
     # Ignore all media.
     # This includes both web links and attached images. I'm not planning on fetching and
     # rendering images or arbitrary links but don't want to present tweets without context,
     # so for now just ignore any tweets with external links.
     if ignore_links:
-        if media['urls'] or media.get('media'):
-            return
+        if media.get('urls') or media.get('media'):
+            return 'links'
+
+    return None
+
+
+def get_tweet_text(tweet: dict) -> str:
+    """
+    Gets the full body of a tweet with newlines replaced by spaces.
+
+    Args:
+        tweet: tweet as a dictionary
 
+    Returns:
+        Tweet text
+    """
     # Account for extended tweet field
     if tweet.get('extended_tweet'):
         tweet_text = tweet.get('extended_tweet', {}).get('full_text', '')
@@ -152,40 +275,245 @@ def process(
     if '\n' in tweet_text:
         tweet_text = tweet_text.replace('\n', ' ')
 
-    match = R.search(tweet_text)
-    LOGGER.debug(f'String to parse: {tweet_text}')
+    return tweet_text
 
-    if match:
-        LOGGER.debug(f'Match groups: {match.groups()}')
-    else:
-        LOGGER.debug('No match')
 
+def classify(
+        tweet: dict,
+        matcher: QuestionMatcher,
+        ignore_retweets: bool = True,
+        ignore_replies: bool = True,
+        ignore_links: bool = True,
+        outcomes: Optional[Counter] = None,
+) -> Optional[Tuple[str, Any]]:
+    """
+    Checks if a string is asking a question that is being tracked, without doing anything with the result.
+    Assumptions:
+        - Looks throughout the entire tweet, not just the beginning.
+        - Question must end with a question mark.
+        - Case is ignored.
+
+    The decision is written to the trace file if tracing is on (see trace.enable()).
+
+    Args:
+        tweet: tweet to match against
+        matcher: QuestionMatcher compiled from the tracked question starts
+        ignore_retweets:
+        ignore_replies:
+        ignore_links:
+        outcomes: optional tally to count the outcome in, under ('rejected', rule) with 'no_match' as the rule
+            for tweets that pass the rules but don't match, or ('matched', question start)
+
+    Returns:
+        Tuple of the matched question start and its target from the matcher, or None if the tweet is rejected
+    """
+    reason = get_rejection_reason(tweet, ignore_retweets, ignore_replies, ignore_links)
+    if reason is not None:
+        if outcomes is not None:
+            outcomes['rejected', reason] += 1
+        if trace.TRACER is not None:
+            trace.TRACER.trace(tweet, reason)
+        return None
+
+    tweet_text = get_tweet_text(tweet)
+    match = matcher.match(tweet_text)
+
+    if outcomes is not None:
+        outcomes[('matched', match[0]) if match else ('rejected', 'no_match')] += 1
+    if trace.TRACER is not None:
+        trace.TRACER.trace(tweet, None if match else 'no_match', tweet_text, match[0] if match else None)
+    return match
+
+
+def process(
+        tweet: dict,
+        tweet_handler_map: Dict[str, TweetHandler],
+        ignore_retweets: bool = True,
+        ignore_replies: bool = True,
+        ignore_links: bool = True,
+        matcher: Optional[QuestionMatcher] = None,
+        raw: Optional[Union[str, bytes]] = None,
+        outcomes: Optional[Counter] = None,
+        dedup: Optional[DuplicateFilter] = None,
+):
+    """
+    Checks if a string is asking a question that is being tracked and adds it to the matching TweetHandler.
+    See classify() for the matching rules.
+
+    If the raw payload the tweet was decoded from is passed, that is what gets written, byte for byte apart from
+    the trailing line break. The decoded tweet is then only used to make the decision and is never re-encoded.
+
+    Args:
+        tweet: tweet to match against
+        tweet_handler_map: mapping of question starts to TweetHandler objects
+        ignore_retweets:
+        ignore_replies:
+        ignore_links:
+        matcher: QuestionMatcher compiled from `tweet_handler_map`. One is compiled on every call if this is not
+            passed, so callers processing many tweets should build it once up front.
+        raw: optional raw payload `tweet` was decoded from
+        outcomes: optional tally to count the outcome in. See classify(). Duplicates are counted under
+            ('duplicate', reason).
+        dedup: optional DuplicateFilter. Matched tweets it has seen before, by id or by text, are not added.
+    """
+    if matcher is None:
+        matcher = QuestionMatcher(tweet_handler_map)
+
+    match = classify(tweet, matcher, ignore_retweets, ignore_replies, ignore_links, outcomes)
     if match:
-        q_lead = match.groups()[0].rstrip()
-        LOGGER.debug(f'Question lead: {q_lead}')
-        LOGGER.debug(f'Tweet handler map keys: {tweet_handler_map.keys()}')
-        if q_lead.lower() in tweet_handler_map:
-            tweet_handler_map[q_lead.lower()].add_tweet(json.dumps(tweet))
-            LOGGER.debug(f'Added tweet to handler {tweet_handler_map[q_lead.lower()]}')
+        if dedup is not None:
+            reason = dedup.check(tweet)
+            if reason is not None:
+                if outcomes is not None:
+                    outcomes['duplicate', reason] += 1
+                return
+        q_lead, tweet_handler = match
+        tweet_handler.add_tweet(codec.dumps(tweet) if raw is None else as_line(raw))
 
 
 def process_tweets(
         tweet_list: List[dict],
         tweet_handler_map: Dict[str, TweetHandler],
-        force_write: bool = False
+        force_write: bool = False,
+        matcher: Optional[QuestionMatcher] = None,
+        raw_list: Optional[List[Union[str, bytes]]] = None,
+        dedup: Optional[DuplicateFilter] = None,
 ):
     """
     Filters a batch of collected tweets for the presence of one of the tracked questions, adding relevant tweets
-    to the appropriate TweetHandler object via the add_tweet() method.
+    to the appropriate TweetHandler object via the add_tweet() method. The outcome for every tweet is counted in
+    the shared metrics registry.
 
     Args:
         tweet_list: list of tweet objects as dictionaries
         tweet_handler_map: mapping of question starts to TweetHandler objects
         force_write: bool, whether to force all tweet handlers to write their held tweets to file
+        matcher: optional QuestionMatcher compiled from `tweet_handler_map`. Built once for the batch if not passed.
+        raw_list: optional list of the raw payloads `tweet_list` was decoded from, in the same order. Matched tweets
+            are written from these as they are instead of being re-encoded.
+        dedup: optional DuplicateFilter to drop matched tweets that were seen before
     """
-    for tweet in tweet_list:
-        process(tweet, tweet_handler_map)
+    if matcher is None:
+        matcher = QuestionMatcher(tweet_handler_map)
+
+    outcomes = Counter()
+    if raw_list is None:
+        for tweet in tweet_list:
+            process(tweet, tweet_handler_map, matcher=matcher, outcomes=outcomes, dedup=dedup)
+    else:
+        for tweet, raw in zip(tweet_list, raw_list):
+            process(tweet, tweet_handler_map, matcher=matcher, raw=raw, outcomes=outcomes, dedup=dedup)
+    metrics.record_outcomes(outcomes)
 
     if force_write:
         for tweet_handler in list(set(tweet_handler_map.values())):
             tweet_handler.write_tweets()
+
+
+# Workers are started from a clean process rather than forked from this one. The streamer has metrics, tracing
+# and worker threads running by the time a pool is made, and forking a process with threads can copy a lock
+# that another thread held, leaving the worker deadlocked.
+WORKER_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Matcher for ClassifierPool worker processes, set once per process by _init_classifier_worker()
+_WORKER_MATCHER: Optional[QuestionMatcher] = None
+
+
+def _init_classifier_worker(starts: List[str]):
+    global _WORKER_MATCHER
+    _WORKER_MATCHER = QuestionMatcher({start: start for start in starts})
+    # Workers never trace, since the tracer's rotating file can only have one writer
+    trace.TRACER = None
+
+
+def _classify_lines(raw_lines: List[str]) -> Tuple[List[Tuple[str, str, List[bytes]]], Counter]:
+    """
+    Runs in a ClassifierPool worker process. Decodes and classifies a chunk of raw tweets.
+
+    Args:
+        raw_lines: list of raw tweet payloads
+
+    Returns:
+        List of (question start, raw payload, dedup keys) for the tweets that matched, in input order, and the
+        tally of outcomes for the chunk, since metrics recorded in a worker would never reach the parent's registry.
+        Payloads that aren't valid JSON are skipped and tallied under ('rejected', 'malformed').
+    """
+    matched = []
+    outcomes = Counter()
+    for line in raw_lines:
+        # One bad payload would otherwise fail every chunk of the batch
+        try:
+            tweet = codec.loads(line)
+        except ValueError:
+            outcomes['rejected', 'malformed'] += 1
+            continue
+        match = classify(tweet, _WORKER_MATCHER, outcomes=outcomes)
+        if match:
+            matched.append((match[0], line, tweet_keys(tweet)))
+    return matched, outcomes
+
+
+class ClassifierPool:
+    def __init__(
+            self,
+            tweet_handler_map: Dict[str, TweetHandler],
+            processes: int,
+            dedup: Optional[DuplicateFilter] = None,
+    ):
+        """
+        Pool of worker processes that decode and classify raw tweets in parallel.
+
+        Workers only send back the question start, raw payload and dedup keys of each match. That way the
+        TweetHandlers and the DuplicateFilter in this process are the only ones that hold state.
+
+        Chunks come back in the order they were sent, so each handler gets its tweets in the same order as with
+        process_tweets(). Workers are started with WORKER_START_METHOD rather than forked, so a pool can be made
+        while other threads are running.
+
+        Args:
+            tweet_handler_map: mapping of question starts to TweetHandler objects
+            processes: number of worker processes
+            dedup: optional DuplicateFilter to drop matched tweets that were seen before
+        """
+        self.tweet_handler_map = tweet_handler_map
+        self.processes = processes
+        self.dedup = dedup
+        self.pool = multiprocessing.get_context(WORKER_START_METHOD).Pool(
+            processes,
+            initializer=_init_classifier_worker,
+            initargs=(list(tweet_handler_map.keys()),),
+        )
+
+    def process_tweets(self, raw_list: List[str], force_write: bool = False):
+        """
+        Splits a batch of raw tweets across the worker processes and adds the matches to their TweetHandlers.
+
+        Args:
+            raw_list: list of raw tweet payloads
+            force_write: bool, whether to force all tweet handlers to write their held tweets to file
+        """
+        chunk_size = -(-len(raw_list) // self.processes)
+        chunks = [raw_list[i:i + chunk_size] for i in range(0, len(raw_list), chunk_size)] if raw_list else []
+
+        outcomes = Counter()
+        for matched, chunk_outcomes in self.pool.map(_classify_lines, chunks):
+            outcomes.update(chunk_outcomes)
+            for start, line, keys in matched:
+                if self.dedup is not None:
+                    reason = self.dedup.check_keys(keys)
+                    if reason is not None:
+                        outcomes['duplicate', reason] += 1
+                        continue
+                self.tweet_handler_map[start].add_tweet(as_line(line))
+        metrics.record_outcomes(outcomes)
+
+        if force_write:
+            for tweet_handler in list(set(self.tweet_handler_map.values())):
+                tweet_handler.write_tweets()
+
+    def close(self):
+        self.pool.close()
+        self.pool.join()
+
+    def __repr__(self):
+        return f'ClassifierPool with {self.processes} processes'
@@ -0,0 +1,123 @@
+"""
+Offline stand-in for the tweepy Stream that replays recorded tweets into a Listener.
+"""
+import re
+import time
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Union,
+)
+
+from question_seeker.log import LOGGER as logger
+from question_seeker import utils
+
+
+TIMESTAMP_R = re.compile(r'"timestamp_ms"\s*:\s*"(\d+)"')
+
+
+class ReplayStream:
+    def __init__(self, filename: str, listener, rate: Union[str, float] = 'max'):
+        """
+        Feeds tweets recorded one per line, like the files TweetHandler writes, through the same Listener.on_data
+        path the live stream uses.
+
+        Args:
+            filename: file of recorded raw tweets. Can be a compressed .gz or .xz segment.
+            listener: stream.Listener to feed the tweets to
+            rate: how fast to replay the tweets:
+                - 'max': as fast as the listener takes them
+                - 'realtime': with the same gaps between tweets as when they were recorded, going by their
+                  timestamp_ms field
+                - a number: that many tweets per second
+        """
+        if rate not in ['max', 'realtime']:
+            rate = float(rate)
+            if rate <= 0:
+                raise ValueError(f'Replay rate must be positive. Got {rate}')
+
+        self.filename = filename
+        self.listener = listener
+        self.rate = rate
+        self.stats: Dict[str, float] = {}
+
+    def wait(self, line: str, count: int, start_time: float, first_timestamp: Optional[int]) -> Optional[int]:
+        """
+        Sleeps until the next tweet is due.
+
+        Args:
+            line: raw tweet about to be replayed
+            count: number of tweets replayed so far
+            start_time: time the replay started
+            first_timestamp: timestamp_ms of the first tweet when replaying in real time
+
+        Returns:
+            timestamp_ms of the first tweet, once it has been seen
+        """
+        if self.rate == 'max':
+            return first_timestamp
+
+        if self.rate == 'realtime':
+            match = TIMESTAMP_R.search(line)
+            if match is None:
+                return first_timestamp
+            timestamp = int(match.group(1))
+            if first_timestamp is None:
+                return timestamp
+            due = start_time + (timestamp - first_timestamp) / 1000
+        else:
+            due = start_time + count / self.rate
+
+        delay = due - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        return first_timestamp
+
+    def filter(self, track: Optional[List[str]] = None, **kwargs) -> Dict[str, float]:
+        """
+        Replays the file into the listener until it runs out of tweets or the listener asks to stop, then writes
+        all held tweets and reports the sustained throughput. Named after tweepy's Stream.filter so it can be used
+        in its place.
+
+        Args:
+            track: ignored. Tweets were filtered when they were recorded.
+            kwargs: ignored, for the same reason
+
+        Returns:
+            Dictionary with the number of tweets replayed, seconds taken and tweets per second
+        """
+        logger.info(f'Replaying tweets from {self.filename} at rate {self.rate}')
+        count = 0
+        first_timestamp = None
+        stopped = False
+        start_time = time.time()
+
+        with utils.open_text(self.filename) as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                first_timestamp = self.wait(line, count, start_time, first_timestamp)
+                count += 1
+                if self.listener.on_data(line) is False:
+                    # The listener already wrote out its tweets
+                    stopped = True
+                    break
+
+        if not stopped:
+            self.listener.stop()
+
+        elapsed = time.time() - start_time
+        self.stats = {
+            'tweets': count,
+            'seconds': elapsed,
+            'tweets_per_second': count / elapsed if elapsed else 0.0,
+            'dropped': self.listener.dropped_count,
+        }
+        report = (
+            f'Replayed {count} tweets in {elapsed:.2f}s: {self.stats["tweets_per_second"]:,.0f} tweets/s, '
+            f'{self.listener.dropped_count} dropped'
+        )
+        print(report)
+        logger.info(report)
+        return self.stats
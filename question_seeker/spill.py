@@ -0,0 +1,101 @@
+"""
+Append-only overflow file for raw tweets that arrive while the in-memory backlog is over its budget.
+"""
+import os
+import threading
+from typing import (
+    List,
+    Union,
+)
+
+from question_seeker.log import LOGGER as logger
+from question_seeker import metrics
+
+
+class SpillFile:
+    def __init__(self, filename: str = 'tweet_overflow.spill'):
+        """
+        Holds raw payloads on local disk, one per line, and hands them back in the order they were spilled.
+
+        Payloads left over from an earlier run that stopped before draining are picked up and drained first. Once
+        everything has been drained, the file is truncated so it never grows beyond the longest backlog.
+
+        Args:
+            filename: overflow file. Should be on a local disk, not the one tweets are written to.
+        """
+        self.filename = filename
+        self.lock = threading.Lock()
+        self.writer = open(filename, 'ab')
+        self.reader = open(filename, 'rb')
+        self.read_offset = 0
+        self.pending = sum(1 for line in self.reader if line.strip())
+        self.spilled_count = 0
+        self.drained_count = 0
+        if self.pending:
+            logger.warning(f'Found {self.pending} spilled tweets in {filename} from an earlier run')
+
+    def append(self, data: Union[str, bytes]):
+        """
+        Spills a raw payload to the end of the file.
+
+        Args:
+            data: raw tweet payload
+        """
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        line = data.rstrip(b'\r\n') + b'\n'
+
+        with self.lock:
+            self.writer.write(line)
+            self.pending += 1
+            self.spilled_count += 1
+            if self.spilled_count == 1 or self.spilled_count % 1000 == 0:
+                logger.warning(f'Tweet backlog over budget. Spilled {self.spilled_count} tweets to {self.filename}')
+        metrics.TWEETS_SPILLED.inc()
+
+    def read(self, max_lines: int) -> List[bytes]:
+        """
+        Takes the oldest spilled payloads off the file.
+
+        Args:
+            max_lines: maximum number of payloads to take
+
+        Returns:
+            Up to `max_lines` raw payloads, oldest first
+        """
+        with self.lock:
+            if not self.pending:
+                return []
+
+            self.writer.flush()
+            self.reader.seek(self.read_offset)
+            lines = []
+            while len(lines) < max_lines:
+                line = self.reader.readline()
+                if not line:
+                    break
+                if line.strip():
+                    lines.append(line.rstrip(b'\r\n'))
+            self.read_offset = self.reader.tell()
+            self.pending -= len(lines)
+            self.drained_count += len(lines)
+
+            # Start over once everything is drained. Appends go to the new end of the file.
+            if not self.pending:
+                self.writer.truncate(0)
+                self.read_offset = 0
+        metrics.TWEETS_DRAINED.inc(len(lines))
+        return lines
+
+    def close(self, remove: bool = True):
+        """
+        Closes the file, removing it if nothing is left in it.
+        """
+        with self.lock:
+            self.writer.close()
+            self.reader.close()
+            if remove and not self.pending and os.path.exists(self.filename):
+                os.remove(self.filename)
+
+    def __repr__(self):
+        return f'SpillFile "{self.filename}" holding {self.pending} tweets'
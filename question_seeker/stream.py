@@ -1,13 +1,17 @@
 """
 Listener functions for reading from Twitter API.
 """
+import asyncio
 import datetime
-import json
+import queue
+import threading
 import time
 from typing import (
+    Callable,
     Dict,
     List,
     Optional,
+    Tuple,
     Union,
 )
 
@@ -17,14 +21,28 @@ from tweepy import Stream, OAuthHandler
 from tweepy.streaming import StreamListener
 
 from question_seeker import (
+    codec,
     log,
+    metrics,
     processing,
+    trace,
     utils,
 )
+from question_seeker.aio_stream import AsyncStream, STREAM_URL
+from question_seeker.dedup import DuplicateFilter
+from question_seeker.prefilter import RawPreFilter
+from question_seeker.replay import ReplayStream
+from question_seeker.spill import SpillFile
 
 
 logger = log.LOGGER
 
+# Prefix of the `source` argument for replaying recorded tweets instead of connecting to Twitter
+REPLAY_PREFIX = 'replay:'
+
+# Stream clients: tweepy's blocking Stream, or the asyncio client in aio_stream
+CLIENTS = ['tweepy', 'asyncio']
+
 
 class Listener(StreamListener):
     def __init__(
@@ -33,19 +51,63 @@ class Listener(StreamListener):
             time_limit: Optional[int] = None,
             batch_size: int = 50,
             write_to_file: bool = True,
+            num_workers: int = 0,
+            queue_size: int = 10000,
+            processes: int = 0,
+            prefilter: bool = False,
+            verify_prefilter: bool = False,
+            memory_budget: Optional[int] = None,
+            spill_file: str = 'tweet_overflow.spill',
+            dedup: Optional[DuplicateFilter] = None,
     ):
         """
         Wrapper for the tweepy StreamListener object that injects additional behavior when data is retrieved.
 
+        By default every batch is parsed, matched and written inside on_data, on tweepy's read thread. Setting
+        `num_workers` switches to queued ingestion: on_data only puts the raw payload on a bounded queue and the
+        worker threads do the parsing, matching and writing. If the queue is full the payload is dropped and
+        counted rather than blocking the read thread, which would get the stream disconnected for reading too
+        slowly.
+
+        Setting `processes` additionally fans each batch out to a pool of worker processes for decoding and
+        matching, for when a single core can't keep up with the stream.
+
+        Setting `memory_budget` along with `num_workers` caps the bytes of raw payloads held in the queue. Payloads
+        that would go over it, or that find the queue full, are appended to a local overflow file instead of being
+        dropped. While anything is in that file, new payloads go there too, and once the workers have emptied the
+        queue they drain it oldest first, so tweets are processed in the order they arrived.
+
+        Setting `prefilter` runs cheap substring checks on each raw payload first (see prefilter.RawPreFilter) so
+        that retweets, replies and tweets without a question mark are dropped before they are decoded.
+
         Args:
             tweet_handler_map: Dictionary of prompt starts to Handler objects
             time_limit: optional amount of time to listen for before stopping. Continues listening indefinitely if
                 this is set to None
             batch_size: How many tweets to accumulate before writing them all to disk
             write_to_file: whether to write tweets to disk or not
+            num_workers: number of worker threads to process tweets with. 0 processes tweets inline in on_data
+            queue_size: maximum number of raw payloads waiting for a worker when num_workers is set
+            processes: number of worker processes to classify tweets with. 0 classifies them in this process
+            prefilter: whether to reject tweets from their raw payload before decoding them
+            verify_prefilter: whether to cross-check every pre-filter rejection against the full decode and match
+                path. Slow, only meant for checking the pre-filter.
+            memory_budget: optional maximum number of bytes of raw payloads to hold in the queue before spilling
+                to `spill_file`. Needs `num_workers`.
+            spill_file: overflow file for payloads over the memory budget
+            dedup: optional DuplicateFilter. Matched tweets it has already seen, by id or by normalized text, are
+                not written. Pass the same one to every Listener across reconnects.
         """
         super().__init__()
+        if memory_budget is not None and not num_workers:
+            raise ValueError('A memory budget needs queued ingestion. Set num_workers as well.')
+
         self.tweet_handler_map = tweet_handler_map
+        self.matcher = processing.QuestionMatcher(tweet_handler_map)
+        self.dedup = dedup
+        self.prefilter = None
+        if prefilter or verify_prefilter:
+            self.prefilter = RawPreFilter(verify=verify_prefilter, matcher=self.matcher)
         self.time_limit = time_limit
         self.batch_size = batch_size
         self.write_to_file = write_to_file
@@ -55,6 +117,44 @@ class Listener(StreamListener):
         self.total_tweet_counter = 0
         self.tweet_count_file = utils.FileWrapper('tweet_counter.txt')
 
+        # Workers are started without forking, so the metrics, tracing and worker threads already running are safe
+        self.pool = processing.ClassifierPool(tweet_handler_map, processes, dedup) if processes else None
+
+        # Queued ingestion
+        self.process_lock = threading.Lock()
+        self.queue = queue.Queue(maxsize=queue_size) if num_workers else None
+        self.dropped_count = 0
+
+        # Spilling to disk over the memory budget
+        self.memory_budget = memory_budget
+        self.spill = SpillFile(spill_file) if memory_budget is not None else None
+        self.queued_bytes = 0
+        self.queued_bytes_lock = threading.Lock()
+        self.drain_lock = threading.Lock()
+
+        self.workers = [
+            threading.Thread(target=self.work, name=f'tweet-worker-{i}', daemon=True) for i in range(num_workers)
+        ]
+        for worker in self.workers:
+            worker.start()
+
+        metrics.REGISTRY.gauge('qs_queue_depth', 'Raw payloads waiting for a worker thread', lambda: self.queue_depth)
+        metrics.REGISTRY.gauge(
+            'qs_tweets_dropped', 'Raw payloads dropped because the worker queue was full', lambda: self.dropped_count,
+        )
+        metrics.REGISTRY.gauge('qs_queued_bytes', 'Bytes of raw payloads held in the queue', lambda: self.queued_bytes)
+        metrics.REGISTRY.gauge(
+            'qs_spill_pending', 'Raw payloads waiting in the overflow file',
+            lambda: self.spill.pending if self.spill is not None else 0,
+        )
+
+    @property
+    def queue_depth(self) -> int:
+        """
+        Number of raw payloads waiting for a worker thread. Always 0 when processing inline.
+        """
+        return self.queue.qsize() if self.queue is not None else 0
+
     def on_data(self, data: str) -> bool:
         """
         Processes incoming tweet data from Twitter API stream.
@@ -66,12 +166,13 @@ class Listener(StreamListener):
             True to continue streaming, False to stop streaming if the time limit elapses.
         """
         def process_tweet(t_data):
-            self.tweet_list.append(json.loads(t_data))
+            if self.queue is not None:
+                self.enqueue(t_data)
+                return True
+
+            self.tweet_list.append(t_data)
             if len(self.tweet_list) >= self.batch_size:
-                processing.process_tweets(self.tweet_list, self.tweet_handler_map)
-                self.total_tweet_counter += len(self.tweet_list)
-                if self.total_tweet_counter % 1000 == 0:
-                    self.report_tweet_count()
+                self.process_batch(self.tweet_list)
                 self.tweet_list = []
             return True
 
@@ -82,16 +183,218 @@ class Listener(StreamListener):
             else:
                 print('Stopping tweet collection')
                 logger.info('Stopping tweet collection')
-                processing.process_tweets(self.tweet_list, self.tweet_handler_map, force_write=True)
+                self.stop()
                 return False
         else:
             # Process data infinitely
             process_tweet(data)
 
+    def enqueue(self, data: str):
+        """
+        Hands a raw payload to the worker threads without blocking. If the queue is full, or over the memory
+        budget, the payload is spilled to disk when there is a budget and dropped otherwise.
+
+        Args:
+            data: raw tweet payload from the stream
+        """
+        if self.spill is not None and (self.spill.pending or self.queued_bytes + len(data) > self.memory_budget):
+            self.spill.append(data)
+            return
+
+        try:
+            self.queue.put_nowait(data)
+        except queue.Full:
+            if self.spill is not None:
+                self.spill.append(data)
+                return
+            self.dropped_count += 1
+            if self.dropped_count == 1 or self.dropped_count % 1000 == 0:
+                logger.warning(f'Tweet queue is full. Dropped {self.dropped_count} tweets so far')
+            return
+
+        if self.spill is not None:
+            with self.queued_bytes_lock:
+                self.queued_bytes += len(data)
+
+    def work(self):
+        """
+        Worker thread loop. Batches raw payloads off the queue and processes them until it gets a None sentinel.
+        Drains the overflow file whenever the queue runs dry.
+
+        A batch that fails is logged, counted and skipped, so one bad tweet can't stop the worker and leave the
+        queue to fill up.
+        """
+        batch = []
+        while True:
+            try:
+                data = self.queue.get(timeout=0.1 if self.spill is not None else None)
+            except queue.Empty:
+                if self.spill.pending:
+                    # Anything held here arrived before the spilled payloads
+                    self.run_safely(self.process_batch, batch, step='process')
+                    batch = []
+                    self.run_safely(self.drain_spill, step='drain')
+                continue
+
+            if data is None:
+                break
+            if self.spill is not None:
+                with self.queued_bytes_lock:
+                    self.queued_bytes -= len(data)
+            batch.append(data)
+            if len(batch) >= self.batch_size:
+                self.run_safely(self.process_batch, batch, step='process')
+                batch = []
+
+        # Catch the remaining tweets
+        self.run_safely(self.process_batch, batch, step='process')
+
+    @staticmethod
+    def run_safely(func: Callable, *args, step: str):
+        """
+        Runs a step of the worker loop, logging and counting any error instead of raising it.
+
+        Args:
+            func: function to run
+            args: arguments to pass to it
+            step: name of the step, for the error counter
+        """
+        try:
+            func(*args)
+        except Exception:
+            metrics.BATCH_ERRORS.inc(step=step)
+            logger.exception(f'Tweet worker failed to {step} a batch. Skipping it')
+
+    def process_batch(self, raw_batch: List[str], force_write: bool = False):
+        """
+        Parses a batch of raw payloads and runs them through the tweet handlers.
+
+        Args:
+            raw_batch: list of raw tweet payloads
+            force_write: bool, whether to force all tweet handlers to write their held tweets to file
+        """
+        received = len(raw_batch)
+        metrics.TWEETS_RECEIVED.inc(received)
+        batch_start = time.perf_counter()
+
+        if self.prefilter is not None:
+            with metrics.BATCH_SECONDS.time(stage='prefilter'):
+                raw_batch = self.prefilter.filter(raw_batch)
+
+        if self.pool is None:
+            with metrics.BATCH_SECONDS.time(stage='decode'):
+                tweets, raw_batch = self.decode(raw_batch)
+
+        # Tweet handlers and counters are shared between worker threads
+        with self.process_lock:
+            # With a pool, decoding happens in the workers and is part of this stage
+            with metrics.BATCH_SECONDS.time(stage='classify'):
+                if self.pool is not None:
+                    self.pool.process_tweets(raw_batch, force_write=force_write)
+                else:
+                    processing.process_tweets(
+                        tweets,
+                        self.tweet_handler_map,
+                        force_write=force_write,
+                        matcher=self.matcher,
+                        raw_list=raw_batch,
+                        dedup=self.dedup,
+                    )
+            metrics.BATCH_SECONDS.observe(time.perf_counter() - batch_start, stage='total')
+            if not received:
+                return
+
+            # Report every time the count passes a multiple of 1000, whatever the batch size
+            previous_count = self.total_tweet_counter
+            self.total_tweet_counter += received
+            if self.total_tweet_counter // 1000 > previous_count // 1000:
+                self.report_tweet_count()
+
+    @staticmethod
+    def decode(raw_batch: List[str]) -> Tuple[List[dict], List[str]]:
+        """
+        Decodes each raw payload on its own, so one that isn't valid JSON is skipped rather than losing the batch.
+
+        Args:
+            raw_batch: list of raw tweet payloads
+
+        Returns:
+            Decoded tweets and the raw payloads they came from, in matching order
+        """
+        tweets = []
+        raw_kept = []
+        malformed = 0
+        for data in raw_batch:
+            try:
+                tweets.append(codec.loads(data))
+            except ValueError:
+                malformed += 1
+                continue
+            raw_kept.append(data)
+
+        if malformed:
+            metrics.TWEETS_REJECTED.inc(malformed, stage='decode', rule='malformed')
+            logger.warning(f'Skipped {malformed} payloads that are not valid JSON')
+        return tweets, raw_kept
+
+    def drain_spill(self) -> int:
+        """
+        Processes the oldest batch of payloads from the overflow file.
+
+        Returns:
+            Number of payloads drained
+        """
+        # One drain at a time keeps spilled batches in order
+        with self.drain_lock:
+            raw_batch = self.spill.read(self.batch_size)
+            if raw_batch:
+                self.process_batch(raw_batch)
+        return len(raw_batch)
+
+    def stop_workers(self):
+        """
+        Lets the worker threads finish everything already queued and waits for them to exit.
+        """
+        if not self.workers:
+            return
+
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        logger.info(f'Stopped tweet workers. Dropped {self.dropped_count} tweets while queued')
+
+    def stop(self):
+        """
+        Stops the worker threads, then writes all held tweets to file and shuts down the process pool.
+        """
+        self.stop_workers()
+        if self.spill is not None:
+            while self.drain_spill():
+                pass
+            self.spill.close()
+        self.process_batch(self.tweet_list, force_write=True)
+        self.tweet_list = []
+
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
+
     def report_tweet_count(self):
         # Report number of tweets collected
         report_line = f'{self.total_tweet_counter},{datetime.datetime.now()}'
         self.tweet_count_file.write(report_line)
+        if self.queue is not None:
+            logger.info(f'Tweet queue depth {self.queue_depth}, dropped {self.dropped_count} tweets')
+        if self.spill is not None:
+            logger.info(
+                f'Spilled {self.spill.spilled_count} tweets, drained {self.spill.drained_count}, '
+                f'{self.spill.pending} waiting'
+            )
+        if self.prefilter is not None:
+            rates = ', '.join(f'{name} {rate:.1%}' for name, rate in self.prefilter.rejection_rates().items())
+            logger.info(f'Pre-filter rates: {rates}')
 
     def on_error(self, status: int):
         """
@@ -101,8 +404,7 @@ class Listener(StreamListener):
             status: API error code
         """
         # Write all held tweets to files before closing
-        self.total_tweet_counter += len(self.tweet_list)
-        processing.process_tweets(self.tweet_list, self.tweet_handler_map, force_write=True)
+        self.stop()
 
         # Close files
         for tweet_handler in self.tweet_handler_map.values():
@@ -121,33 +423,79 @@ class Listener(StreamListener):
 @backoff.on_exception(backoff.expo, ConnectionError, max_tries=8,
                       on_giveup=lambda x: utils.send_email('Giving up reconnecting after 8 tries. App down.'))
 def connect_stream(
-        auth: OAuthHandler,
+        auth: Optional[OAuthHandler],
         tweet_handler_map: Dict[str, processing.TweetHandler],
         time_limit: Optional[int] = None,
         batch_size: int = 20,
-        write_to_file: bool = True
+        write_to_file: bool = True,
+        num_workers: int = 0,
+        queue_size: int = 10000,
+        processes: int = 0,
+        prefilter: bool = False,
+        verify_prefilter: bool = False,
+        memory_budget: Optional[int] = None,
+        spill_file: str = 'tweet_overflow.spill',
+        dedup: Optional[DuplicateFilter] = None,
+        source: str = 'twitter',
+        replay_rate: Union[str, float] = 'max',
+        client: str = 'tweepy',
+        stream_url: str = STREAM_URL,
 ):
     """
     Creates a stream listener and begins listening for incoming tweets.
     Uses the backoff package to attempt reconnection with exponential backoff on rate limits.
 
     Args:
-        auth: authenticated Twitter API object
+        auth: authenticated Twitter API object. Not needed when replaying.
         tweet_handler_map: dict, question starts from q_starts.py to track
         time_limit: int or None, amount of time to keep the stream open. Setting to None listens indefinitely
         batch_size: int, number of tweets to hold in memory before parsing. In v1 without multiprocessing, this is set
             low by default so that the parsing and writing doesn't block getting additional stream data.
         write_to_file: bool, whether to write tweets to a file. Can set False for testing purposes.
+        num_workers: int, number of worker threads to parse and write tweets off the stream's read thread. 0 parses
+            inline.
+        queue_size: int, maximum number of raw tweets waiting for a worker before new ones are dropped
+        processes: int, number of worker processes to decode and match tweets in. 0 does it in this process.
+        prefilter: bool, whether to reject retweets, replies and tweets without a question mark from the raw payload
+            before decoding it
+        verify_prefilter: bool, whether to cross-check every pre-filter rejection against the full path. Slow.
+        memory_budget: int or None, bytes of raw tweets the worker queue can hold before spilling further tweets
+            to `spill_file` instead of dropping them. Needs num_workers.
+        spill_file: str, local overflow file for tweets over the memory budget. Drained in order once the queue
+            empties.
+        dedup: DuplicateFilter or None, filter to drop matched tweets already seen. Shared across reconnects.
+        source: str, 'twitter' for the live API, or 'replay:<filename>' to replay recorded tweets from a file
+        replay_rate: str or float, 'max', 'realtime' or tweets per second when replaying. See replay.ReplayStream.
+        client: str, one of CLIENTS. 'asyncio' reads the stream on an event loop and processes batches in an
+            executor. See aio_stream.AsyncStream.
+        stream_url: str, endpoint for the asyncio client, e.g. a local fake_stream.FakeStreamServer
     """
     # Create a new listener and stream
     logger.info('Creating Listener and Stream')
-    agent = Listener(tweet_handler_map, time_limit, batch_size=batch_size, write_to_file=write_to_file)
-    t_stream = Stream(auth, agent)
+    agent = Listener(
+        tweet_handler_map,
+        time_limit,
+        batch_size=batch_size,
+        write_to_file=write_to_file,
+        num_workers=num_workers,
+        queue_size=queue_size,
+        processes=processes,
+        prefilter=prefilter,
+        verify_prefilter=verify_prefilter,
+        memory_budget=memory_budget,
+        spill_file=spill_file,
+        dedup=dedup,
+    )
 
     # Begin streaming
     logger.info('Beginning streaming')
     tracking = processing.get_full_tracking_list(tweet_handler_map)
-    t_stream.filter(track=tracking)
+    if source.startswith(REPLAY_PREFIX):
+        ReplayStream(source[len(REPLAY_PREFIX):], agent, replay_rate).filter(track=tracking)
+    elif client == 'asyncio':
+        asyncio.run(AsyncStream(auth, agent, url=stream_url).filter(track=tracking))
+    else:
+        Stream(auth, agent).filter(track=tracking)
 
 
 def stream(
@@ -157,6 +505,33 @@ def stream(
         time_limit: Optional[int] = None,
         batch_size: int = 50,
         write_to_file: bool = True,
+        num_workers: int = 0,
+        queue_size: int = 10000,
+        processes: int = 0,
+        prefilter: bool = False,
+        verify_prefilter: bool = False,
+        memory_budget: Optional[int] = None,
+        spill_file: str = 'tweet_overflow.spill',
+        dedup: bool = False,
+        dedup_capacity: int = 1000000,
+        dedup_error_rate: float = 0.001,
+        rotate_bytes: Optional[int] = None,
+        rotate_interval: Optional[int] = None,
+        compression: Optional[str] = None,
+        flush_policy: str = 'close',
+        flush_interval: float = 5.0,
+        fsync: bool = False,
+        buffer_size: int = -1,
+        source: str = 'twitter',
+        replay_rate: Union[str, float] = 'max',
+        metrics_port: Optional[int] = None,
+        metrics_snapshot: Optional[str] = None,
+        metrics_interval: float = 60.0,
+        trace_file: Optional[str] = None,
+        trace_sample: int = 1,
+        trace_matched_only: bool = False,
+        client: str = 'tweepy',
+        stream_url: str = STREAM_URL,
 ):
     """
     Main function. Authorizes API object, creates a logger, parses questions to track, and kicks off stream listener.
@@ -169,11 +544,57 @@ def stream(
         batch_size: int, number of tweets to hold in memory before parsing. In v1 without multiprocessing, this is set
             low by default so that the parsing and writing doesn't block getting additional stream data.
         write_to_file: bool, whether to write tweets to a file. Can set False for testing purposes.
+        num_workers: int, number of worker threads to parse and write tweets off the stream's read thread. 0 parses
+            inline.
+        queue_size: int, maximum number of raw tweets waiting for a worker before new ones are dropped
+        processes: int, number of worker processes to decode and match tweets in. 0 does it in this process.
+        prefilter: bool, whether to reject retweets, replies and tweets without a question mark from the raw payload
+            before decoding it
+        verify_prefilter: bool, whether to cross-check every pre-filter rejection against the full path. Slow.
+        memory_budget: int or None, bytes of raw tweets the worker queue can hold before spilling further tweets
+            to `spill_file` instead of dropping them. Needs num_workers.
+        spill_file: str, local overflow file for tweets over the memory budget. Drained in order once the queue
+            empties.
+        dedup: bool, whether to drop matched tweets already seen in this run, by id or by normalized text, e.g.
+            tweets sent again after a reconnect and copy-paste spam
+        dedup_capacity: int, number of keys each of the duplicate filter's two Bloom filters holds. Memory use is
+            about 1.8 bytes per key at the default error rate.
+        dedup_error_rate: float, false positive rate of each Bloom filter when full
+        rotate_bytes: int or None, size in bytes at which to roll each output file over into a closed segment
+        rotate_interval: int or None, number of seconds, e.g. 3600 for hourly, at which to roll each output file over
+        compression: str or None, 'gzip' or 'lzma' to compress closed segments
+        flush_policy: str, when to flush output files: after every 'batch', every `flush_interval` seconds
+            ('interval'), or only when the buffer fills up or the file is closed ('close')
+        flush_interval: float, seconds between flushes with the 'interval' flush policy
+        fsync: bool, whether to fsync output files after each flush
+        buffer_size: int, size in bytes of each output file's write buffer. -1 uses the default.
+        source: str, 'twitter' for the live API, or 'replay:<filename>' to replay tweets recorded one per line, e.g.
+            by an earlier run, through the same listener without credentials or network
+        replay_rate: str or float, how fast to replay: 'max' for as fast as possible, 'realtime' to follow the
+            recorded timestamps, or a number of tweets per second
+        metrics_port: int or None, local port to serve live metrics on, as Prometheus text at /metrics and JSON at
+            /metrics.json
+        metrics_snapshot: str or None, file to write a JSON snapshot of the metrics to every `metrics_interval`
+            seconds
+        metrics_interval: float, seconds between metrics snapshots
+        trace_file: str or None, file to trace match decisions to as JSON lines, separate from the log. Rolls over
+            every 10 MB. Tracing is off when this is None.
+        trace_sample: int, trace one in every this many tweets
+        trace_matched_only: bool, only trace tweets that matched
+        client: str, 'tweepy' for tweepy's blocking stream, or 'asyncio' to read the stream on an event loop and
+            parse and write in an executor
+        stream_url: str, endpoint for the asyncio client. An http:// URL, like a local fake_stream.FakeStreamServer,
+            is connected to without credentials.
 
     Returns:
         True if all goes well and the function ends normally
     """
-    auth = utils.get_auth()
+    if source != 'twitter' and not source.startswith(REPLAY_PREFIX):
+        raise ValueError(f'Unknown source "{source}". Use "twitter" or "{REPLAY_PREFIX}<filename>"')
+    if client not in CLIENTS:
+        raise ValueError(f'Unknown client "{client}". Choose from {CLIENTS}')
+    local_stream = client == 'asyncio' and stream_url.startswith('http://')
+    auth = utils.get_auth() if source == 'twitter' and not local_stream else None
 
     # Set logger
     global logger
@@ -181,13 +602,53 @@ def stream(
 
     # Get the tweet handling objects
     q_list_names = [q_list_names] if not isinstance(q_list_names, list) else q_list_names
-    tweet_handler_map = processing.get_tweet_handler_map(q_list_names, batch_size, write_to_file)
+    tweet_handler_map = processing.get_tweet_handler_map(
+        q_list_names,
+        batch_size,
+        write_to_file,
+        max_bytes=rotate_bytes,
+        rotate_interval=rotate_interval,
+        compression=compression,
+        flush_policy=flush_policy,
+        flush_interval=flush_interval,
+        fsync=fsync,
+        buffer_size=buffer_size,
+    )
+
+    # Live metrics, kept up across reconnects
+    metrics_server = metrics.MetricsServer(metrics_port).start() if metrics_port is not None else None
+    snapshot_writer = metrics.SnapshotWriter(metrics_snapshot, metrics_interval).start() if metrics_snapshot else None
+    if trace_file is not None:
+        trace.enable(trace_file, sample_every=trace_sample, matched_only=trace_matched_only)
 
     # Connect to a stream using exponential backoff in the event of a connection error
     try:
-        connect_stream(auth, tweet_handler_map, time_limit, batch_size=batch_size, write_to_file=write_to_file)
+        connect_stream(
+            auth,
+            tweet_handler_map,
+            time_limit,
+            batch_size=batch_size,
+            write_to_file=write_to_file,
+            num_workers=num_workers,
+            queue_size=queue_size,
+            processes=processes,
+            prefilter=prefilter,
+            verify_prefilter=verify_prefilter,
+            memory_budget=memory_budget,
+            spill_file=spill_file,
+            dedup=DuplicateFilter(dedup_capacity, dedup_error_rate) if dedup else None,
+            source=source,
+            replay_rate=replay_rate,
+            client=client,
+            stream_url=stream_url,
+        )
     finally:
         logger.info('Stopping stream')
+        if metrics_server is not None:
+            metrics_server.stop()
+        if snapshot_writer is not None:
+            snapshot_writer.stop()
+        trace.disable()
 
     return True
 
@@ -0,0 +1,113 @@
+"""
+Sampled tracing of match decisions, written as JSON lines to a rotating file separate from the main log.
+"""
+import itertools
+import logging
+from logging.handlers import RotatingFileHandler
+import time
+from typing import (
+    Optional,
+)
+
+from question_seeker import codec
+
+
+class Tracer:
+    def __init__(
+            self,
+            filename: str = 'qs_trace.jsonl',
+            sample_every: int = 1,
+            matched_only: bool = False,
+            max_bytes: int = 10 * 1024 * 1024,
+            backup_count: int = 5,
+    ):
+        """
+        Records why tweets were or weren't matched, one JSON object per line:
+            {"time": ..., "id": ..., "outcome": "matched" or the rejection rule, "start": ..., "text": ...}
+
+        Only sampled tweets pay for building and writing a record.
+
+        Args:
+            filename: trace file. Rolled over into filename.1, filename.2 and so on once it reaches `max_bytes`.
+            sample_every: trace one in every this many tweets
+            matched_only: only trace matched tweets. Sampling then applies to matched tweets alone.
+            max_bytes: size in bytes at which to roll the trace file over
+            backup_count: number of rolled over trace files to keep
+        """
+        if sample_every < 1:
+            raise ValueError(f'sample_every must be at least 1. Got {sample_every}')
+
+        self.filename = filename
+        self.sample_every = sample_every
+        self.matched_only = matched_only
+        self.counter = itertools.count()
+
+        self.handler = RotatingFileHandler(filename, maxBytes=max_bytes, backupCount=backup_count, encoding='utf-8')
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+        self.logger = logging.getLogger(f'{__name__}.{filename}')
+        self.logger.setLevel(logging.INFO)
+        self.logger.propagate = False
+        self.logger.addHandler(self.handler)
+
+    def trace(self, tweet: dict, reason: Optional[str], text: Optional[str] = None, start: Optional[str] = None):
+        """
+        Writes a record for the tweet if it is sampled.
+
+        Args:
+            tweet: tweet the decision was made on
+            reason: rejection rule, 'no_match', or None if the tweet matched
+            text: text the matcher saw, if it got that far
+            start: matched question start
+        """
+        if self.matched_only and start is None:
+            return
+        if next(self.counter) % self.sample_every:
+            return
+
+        self.logger.info(codec.dumps({
+            'time': time.time(),
+            'id': tweet.get('id_str'),
+            'outcome': 'matched' if reason is None else reason,
+            'start': start,
+            'text': text if text is not None else tweet.get('text'),
+        }))
+
+    def close(self):
+        self.logger.removeHandler(self.handler)
+        self.handler.close()
+
+    def __repr__(self):
+        return f'Tracer writing to "{self.filename}", sampling 1 in {self.sample_every}'
+
+
+# Tracer in use. Checked with a single `is not None` on the matching path, so tracing costs nothing when off.
+TRACER: Optional[Tracer] = None
+
+
+def enable(
+        filename: str = 'qs_trace.jsonl',
+        sample_every: int = 1,
+        matched_only: bool = False,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+) -> Tracer:
+    """
+    Starts tracing match decisions, replacing any tracer already in use. See Tracer for the arguments.
+
+    Returns:
+        The new tracer
+    """
+    global TRACER
+    disable()
+    TRACER = Tracer(filename, sample_every, matched_only, max_bytes, backup_count)
+    return TRACER
+
+
+def disable():
+    """
+    Stops tracing and closes the trace file.
+    """
+    global TRACER
+    if TRACER is not None:
+        TRACER.close()
+        TRACER = None
@@ -0,0 +1,221 @@
+"""
+Append-only JSON lines store of extracted tweets, with an on-disk index of the tweet ids it holds.
+"""
+import os
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Union,
+)
+
+import numpy as np
+import pandas as pd
+
+from question_seeker.log import LOGGER as logger
+from question_seeker import codec, utils
+
+
+class TweetStore:
+    def __init__(self, filename: str, overwrite: bool = False, merge_ratio: float = 0.1):
+        """
+        Keeps tweet records in a JSON lines file that is only ever appended to, and skips tweets whose id is
+        already in it, so appending costs time in the number of new tweets rather than the size of the store.
+
+        Ids are kept next to the file in two sidecars:
+            - `filename`.idx: sorted uint64 ids, memory mapped and probed with a binary search
+            - `filename`.idx.tail: ids appended since the sorted index was last rebuilt, in arrival order
+        Once the tail holds more than `merge_ratio` times as many ids as the sorted index, the two are merged.
+        Merging rewrites only the ids, and happens geometrically less often as the store grows.
+
+        `filename`.idx.size records how big the store was when the sidecars were last written. If the file was
+        changed behind the store's back, e.g. by a crash between writing tweets and their ids, the sidecars are
+        rebuilt from the file.
+
+        Args:
+            filename: JSON lines file to keep tweets in. Created if it doesn't exist.
+            overwrite: if True, empties the store first
+            merge_ratio: tail size, relative to the sorted index, at which the two are merged
+        """
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.tail_filename = filename + '.idx.tail'
+        self.size_filename = filename + '.idx.size'
+        self.merge_ratio = merge_ratio
+
+        if overwrite or not os.path.exists(filename):
+            open(filename, 'wb').close()
+        if self._recorded_size() != os.path.getsize(filename):
+            self.rebuild_index()
+
+        self.index = self._load_index()
+        self.tail = set(np.fromfile(self.tail_filename, dtype=np.uint64).tolist())
+
+    def _recorded_size(self) -> int:
+        if not all(os.path.exists(fn) for fn in [self.index_filename, self.tail_filename, self.size_filename]):
+            return -1
+        with open(self.size_filename) as file:
+            return int(file.read().strip() or -1)
+
+    def _record_size(self):
+        with open(self.size_filename, 'w') as file:
+            file.write(str(os.path.getsize(self.filename)))
+
+    def _load_index(self) -> np.ndarray:
+        if not os.path.getsize(self.index_filename):
+            return np.array([], dtype=np.uint64)
+        return np.memmap(self.index_filename, dtype=np.uint64, mode='r')
+
+    def _write_index(self, ids: np.ndarray):
+        # Write to a temporary file and rename, so a crash never leaves a half written index behind
+        tmp_filename = self.index_filename + '.tmp'
+        np.unique(ids).astype(np.uint64).tofile(tmp_filename)
+        os.replace(tmp_filename, self.index_filename)
+        open(self.tail_filename, 'wb').close()
+
+    def rebuild_index(self):
+        """
+        Rebuilds the id sidecars by reading every tweet in the store.
+        """
+        if os.path.getsize(self.filename):
+            logger.warning(f'Rebuilding the tweet id index of {self.filename}')
+        ids = []
+        with open(self.filename, 'rb') as file:
+            for line in file:
+                if line.strip():
+                    ids.append(int(codec.loads(line)['tweet_id']))
+        self._write_index(np.array(ids, dtype=np.uint64))
+        self._record_size()
+        self.index = self._load_index()
+        self.tail = set()
+
+    def contains(self, tweet_ids: Iterable[Union[str, int]]) -> np.ndarray:
+        """
+        Checks which tweet ids are already in the store.
+
+        Args:
+            tweet_ids: tweet ids, as strings or ints
+
+        Returns:
+            Boolean array, True for each id that is in the store
+        """
+        ids = np.array([int(tweet_id) for tweet_id in tweet_ids], dtype=np.uint64)
+        found = np.zeros(len(ids), dtype=bool)
+        if len(self.index):
+            positions = np.searchsorted(self.index, ids)
+            in_range = positions < len(self.index)
+            found[in_range] = self.index[positions[in_range]] == ids[in_range]
+        if self.tail:
+            found |= np.array([tweet_id in self.tail for tweet_id in ids.tolist()], dtype=bool)
+        return found
+
+    def append(self, tweets: Union[pd.DataFrame, List[Dict]]) -> int:
+        """
+        Adds the tweets whose id isn't in the store yet.
+
+        Args:
+            tweets: either a dataframe or a list of dictionaries holding tweet info, with a `tweet_id` field
+
+        Returns:
+            Number of tweets added
+        """
+        records = utils.frame_to_records(tweets) if isinstance(tweets, pd.DataFrame) else tweets
+        if not records:
+            return 0
+
+        ids = [int(record['tweet_id']) for record in records]
+        found = self.contains(ids)
+        new_records = []
+        new_ids = []
+        for record, tweet_id, is_found in zip(records, ids, found):
+            # Also drop repeats within the batch
+            if not is_found and tweet_id not in self.tail:
+                new_records.append(record)
+                new_ids.append(tweet_id)
+                self.tail.add(tweet_id)
+        if not new_records:
+            return 0
+
+        # Tweets go in before their ids, so a crash in between is caught by the size check and rebuilt
+        data = ''.join(codec.dumps(record) + '\n' for record in new_records)
+        with open(self.filename, 'ab') as file:
+            file.write(data.encode('utf-8', errors='backslashreplace'))
+        with open(self.tail_filename, 'ab') as file:
+            file.write(np.array(new_ids, dtype=np.uint64).tobytes())
+
+        if len(self.tail) > self.merge_ratio * len(self.index):
+            self.merge()
+        self._record_size()
+        return len(new_records)
+
+    def merge(self):
+        """
+        Merges the tail into the sorted index.
+        """
+        ids = np.concatenate([np.asarray(self.index), np.array(sorted(self.tail), dtype=np.uint64)])
+        # Release the memory map before the file under it is replaced
+        self.index = None
+        self._write_index(ids)
+        self.index = self._load_index()
+        self.tail = set()
+
+    def truncate(self, size: int):
+        """
+        Cuts the store back to an earlier size, e.g. to drop tweets appended by a run that failed part way.
+
+        Args:
+            size: size in bytes to cut the file back to, as given by os.path.getsize() before the appends
+        """
+        self.index = None
+        with open(self.filename, 'r+b') as file:
+            file.truncate(size)
+        self.rebuild_index()
+
+    def delete(self):
+        """
+        Removes the store's file and its sidecars.
+        """
+        self.index = None
+        self.tail = set()
+        for filename in [self.filename, self.index_filename, self.tail_filename, self.size_filename]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def replace(self, filename: str):
+        """
+        Moves the store and its sidecars to `filename`, replacing any store there. Used to build a store under a
+        temporary name and put it in place only once it is complete.
+
+        Args:
+            filename: JSON lines file to move the store to
+        """
+        # Without a recorded size, a crash part way through the moves makes the next open rebuild the sidecars
+        if os.path.exists(filename + '.idx.size'):
+            os.remove(filename + '.idx.size')
+
+        self.index = None
+        os.replace(self.filename, filename)
+        os.replace(self.index_filename, filename + '.idx')
+        os.replace(self.tail_filename, filename + '.idx.tail')
+        os.replace(self.size_filename, filename + '.idx.size')
+
+        self.filename = filename
+        self.index_filename = filename + '.idx'
+        self.tail_filename = filename + '.idx.tail'
+        self.size_filename = filename + '.idx.size'
+        self.index = self._load_index()
+
+    def read(self) -> pd.DataFrame:
+        """
+        Reads every tweet in the store.
+
+        Returns:
+            DataFrame with one row per tweet
+        """
+        return utils.encoded_read(self.filename)
+
+    def __len__(self) -> int:
+        return len(self.index) + len(self.tail)
+
+    def __repr__(self):
+        return f'TweetStore "{self.filename}" holding {len(self)} tweets'
@@ -1,7 +1,17 @@
+import collections
+from concurrent.futures import Future, ThreadPoolExecutor
+import datetime
+import gzip
+import json
+import lzma
 import os
+import shutil
+import time
 from typing import (
     Dict,
+    Iterator,
     List,
+    Optional,
     TextIO,
     Union,
 )
@@ -10,6 +20,7 @@ import pandas as pd
 import requests
 import tweepy
 
+from question_seeker import codec, metrics
 from question_seeker.log import LOGGER as logger
 
 
@@ -45,35 +56,525 @@ def get_auth() -> tweepy.OAuthHandler:
     return auth
 
 
+# Ways FileWrapper.write_lines() can flush the file
+FLUSH_POLICIES = ['batch', 'interval', 'close']
+
+
 class FileWrapper:
-    def __init__(self, filename: str, mode: str='a'):
+    def __init__(
+            self,
+            filename: str,
+            mode: str='a',
+            encoding: str = 'utf-8',
+            buffer_size: int = -1,
+            flush_policy: str = 'close',
+            flush_interval: float = 5.0,
+            fsync: bool = False,
+    ):
         """
         Wrapper for file handles to prevent multiple opens
 
+        Batches of lines written through write_lines() go out in a single write call. When they reach the disk is
+        up to the flush policy:
+            - 'batch': flush after every batch
+            - 'interval': flush after a batch if it has been at least `flush_interval` seconds since the last flush
+            - 'close': only flush when the buffer fills up or the file is closed
+        With `fsync` set, every flush also waits for the OS to put the data on disk, which bounds what a crash can
+        lose to what was written since the last flush. How long each flush took is kept in `flush_latencies`.
+
         Args:
             filename: str, name of a file
             mode: str, how to open the file
+            encoding: str, text encoding to write with
+            buffer_size: int, size in bytes of the write buffer. -1 uses the default.
+            flush_policy: str, one of FLUSH_POLICIES
+            flush_interval: float, seconds between flushes with the 'interval' policy
+            fsync: bool, whether to fsync after flushing
         """
+        if flush_policy not in FLUSH_POLICIES:
+            raise ValueError(f'Unknown flush policy "{flush_policy}". Choose from {FLUSH_POLICIES}')
+
         self.filename = filename
         self.mode = mode
-        self.file = open(self.filename, self.mode)
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.flush_policy = flush_policy
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+
+        self.last_flush = time.time()
+        self.flush_latencies = collections.deque(maxlen=1000)
+
+        self.file = self._open()
         self.isopen = True
 
+    def _open(self) -> TextIO:
+        # Lone surrogates from tweets cut off mid emoji are written as JSON style \u escapes instead of failing
+        return open(
+            self.filename, self.mode, buffering=self.buffer_size, encoding=self.encoding, errors='backslashreplace',
+        )
+
     def open(self) -> TextIO:
         if self.isopen:
             return self.file
-        self.file = open(self.filename, self.mode)
+        self.file = self._open()
         self.isopen = True
         return self.file
 
     def close(self):
         if not self.isopen:
             return
+        if self.fsync:
+            self.flush()
         self.file.close()
         self.isopen = False
 
+    def flush(self):
+        """
+        Flushes the write buffer to the OS, and to disk if fsync is set, recording how long it took.
+        """
+        start = time.perf_counter()
+        self.file.flush()
+        if self.fsync:
+            os.fsync(self.file.fileno())
+        latency = time.perf_counter() - start
+        self.flush_latencies.append(latency)
+        metrics.FLUSH_SECONDS.observe(latency)
+        self.last_flush = time.time()
+
     def write(self, line: str):
-        self.file.write(line + '\n')
+        self.open().write(line + '\n')
+
+    def write_lines(self, lines: List[str]):
+        """
+        Writes a batch of lines in one call and flushes according to the flush policy. Reopens the file if it
+        was closed.
+
+        Args:
+            lines: lines to write, without line breaks
+        """
+        if not lines:
+            return
+
+        self.open().write('\n'.join(lines) + '\n')
+
+        if self.flush_policy == 'batch':
+            self.flush()
+        elif self.flush_policy == 'interval' and time.time() - self.last_flush >= self.flush_interval:
+            self.flush()
+
+
+# Compression name to (file suffix, open function)
+COMPRESSORS = {
+    'gzip': ('.gz', gzip.open),
+    'lzma': ('.xz', lzma.open),
+}
+
+
+class RotatingFileWrapper(FileWrapper):
+    def __init__(
+            self,
+            filename: str,
+            max_bytes: Optional[int] = None,
+            rotate_interval: Optional[int] = None,
+            compression: Optional[str] = None,
+            **kwargs,
+    ):
+        """
+        FileWrapper that rolls the file over into closed segments once it gets too big or too old.
+
+        New lines always go to `filename`. On rotation the file is renamed to a segment named after the time it was
+        started, e.g. imperative_tweets.20200314T150000.json, optionally compressed, and recorded in a manifest
+        next to it (imperative_tweets.json.manifest). A fresh file is then started at `filename`.
+
+        Compressing a large segment can take a long time, and rotation happens inside a write, often on the
+        stream's read thread. So compressing and recording segments is handed to a background thread that handles
+        them one at a time, in order. close() waits for it to finish.
+
+        Args:
+            filename: str, name of the file to write to
+            max_bytes: int, rotate once the file holds at least this many bytes. None to not rotate on size.
+            rotate_interval: int, rotate when the clock crosses a multiple of this many seconds, e.g. 3600 for every
+                hour on the hour. None to not rotate on time.
+            compression: str, 'gzip' or 'lzma' to compress closed segments, or None to leave them as they are
+            kwargs: mode, encoding, buffering and flushing options passed on to FileWrapper
+        """
+        if compression is not None and compression not in COMPRESSORS:
+            raise ValueError(f'Unknown compression "{compression}". Choose from {list(COMPRESSORS)}')
+
+        super().__init__(filename, **kwargs)
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.compression = compression
+        self.manifest_filename = filename + '.manifest'
+        self.archiver = ThreadPoolExecutor(max_workers=1, thread_name_prefix='segment-archiver')
+        self.pending: List[Future] = []
+
+        self.bytes_written = os.path.getsize(filename)
+        self.segment_start = os.path.getmtime(filename) if self.bytes_written else time.time()
+
+    def _encoded_size(self, lines: List[str]) -> int:
+        # Emoji and other non-ASCII text take more than one byte per character
+        return sum(len(line.encode(self.encoding, errors='backslashreplace')) + 1 for line in lines)
+
+    def write(self, line: str):
+        if self.should_rotate():
+            self.rotate()
+        super().write(line)
+        self.bytes_written += self._encoded_size([line])
+
+    def write_lines(self, lines: List[str]):
+        # Rotation is checked per batch, so a segment can go over max_bytes by up to one batch
+        if self.should_rotate():
+            self.rotate()
+        super().write_lines(lines)
+        self.bytes_written += self._encoded_size(lines)
+
+    def should_rotate(self) -> bool:
+        if not self.bytes_written:
+            return False
+        if self.max_bytes is not None and self.bytes_written >= self.max_bytes:
+            return True
+        if self.rotate_interval is not None:
+            return time.time() // self.rotate_interval != self.segment_start // self.rotate_interval
+        return False
+
+    def close(self):
+        """
+        Closes the file and waits for closed segments to be compressed and recorded in the manifest.
+        """
+        super().close()
+        for future in self.pending:
+            future.result()
+        self.pending = []
+
+    def rotate(self) -> Optional[str]:
+        """
+        Closes the current file as a segment and starts a new file. The segment is compressed, if set up to, and
+        recorded in the manifest in the background.
+
+        Returns:
+            Name the closed segment will have once it is compressed, or None if the file was empty and nothing was
+            rotated
+        """
+        if not self.bytes_written:
+            return None
+
+        was_open = self.isopen
+        super().close()
+
+        # Name the segment after when it was started
+        root, ext = os.path.splitext(self.filename)
+        stamp = time.strftime('%Y%m%dT%H%M%S', time.gmtime(self.segment_start))
+        segment = f'{root}.{stamp}{ext}'
+        counter = 1
+        while any(os.path.exists(segment + suffix) for suffix in ['', '.gz', '.xz']):
+            segment = f'{root}.{stamp}-{counter}{ext}'
+            counter += 1
+        os.rename(self.filename, segment)
+
+        entry = {
+            'segment': os.path.basename(segment),
+            'start': datetime.datetime.fromtimestamp(self.segment_start, datetime.timezone.utc).isoformat(),
+            'end': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'bytes': self.bytes_written,
+            'compression': self.compression,
+        }
+        self.pending = [future for future in self.pending if not future.done()]
+        self.pending.append(self.archiver.submit(self._archive, segment, entry))
+
+        self.bytes_written = 0
+        self.segment_start = time.time()
+        self.file = self._open()
+        self.isopen = was_open
+        if not was_open:
+            self.file.close()
+        return segment + COMPRESSORS[self.compression][0] if self.compression is not None else segment
+
+    def _archive(self, segment: str, entry: Dict):
+        """
+        Runs on the archiver thread. Compresses a closed segment if set up to and adds it to the manifest.
+
+        Args:
+            segment: name of the closed segment
+            entry: manifest entry for the segment
+        """
+        try:
+            if self.compression is not None:
+                suffix, open_fn = COMPRESSORS[self.compression]
+                with open(segment, 'rb') as source, open_fn(segment + suffix, 'wb') as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(segment)
+                segment += suffix
+                entry['segment'] = os.path.basename(segment)
+
+            manifest = codec.load(self.manifest_filename) if os.path.exists(self.manifest_filename) else []
+            manifest.append(entry)
+            # Write under a temporary name and move into place, so a crash never leaves a truncated manifest
+            tmp_filename = temporary_filename(self.manifest_filename)
+            codec.dump(manifest, tmp_filename, indent=True)
+            os.replace(tmp_filename, self.manifest_filename)
+            logger.info(f'Rotated {self.filename} to {segment}')
+        except Exception:
+            logger.exception(f'Archiving segment {segment} of {self.filename} failed')
+            raise
+
+
+def get_file_wrapper(
+        filename: str,
+        max_bytes: Optional[int] = None,
+        rotate_interval: Optional[int] = None,
+        compression: Optional[str] = None,
+        **kwargs,
+) -> FileWrapper:
+    """
+    Creates a RotatingFileWrapper if any rotation is asked for, otherwise a plain FileWrapper.
+
+    Args:
+        filename: str, name of the file to write to
+        max_bytes: int, rotate once the file holds at least this many bytes
+        rotate_interval: int, rotate every time the clock crosses a multiple of this many seconds
+        compression: str, 'gzip' or 'lzma' to compress closed segments
+        kwargs: buffering and flushing options passed on to FileWrapper
+
+    Returns:
+        File wrapper for appending to the file
+    """
+    if max_bytes is None and rotate_interval is None:
+        return FileWrapper(filename, **kwargs)
+    return RotatingFileWrapper(filename, max_bytes, rotate_interval, compression, **kwargs)
+
+
+def open_text(filename: str) -> TextIO:
+    """
+    Opens a UTF-8 text file for reading, decompressing it on the fly if it ends with .gz or .xz.
+
+    Args:
+        filename: name of the file to open
+
+    Returns:
+        File object open for reading text
+    """
+    for suffix, open_fn in COMPRESSORS.values():
+        if filename.endswith(suffix):
+            return open_fn(filename, 'rt', encoding='utf-8')
+    return open(filename, encoding='utf-8')
+
+
+def strip_json_suffix(filename: str) -> str:
+    """
+    Removes a .json extension from a filename, along with any compression extension after it.
+
+    Args:
+        filename: name of a json file or compressed json file
+
+    Returns:
+        Filename without the extensions
+    """
+    for suffix in ['.gz', '.xz']:
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+    return filename[:-len('.json')] if filename.endswith('.json') else filename
+
+
+def is_json_file(filename: str) -> bool:
+    """
+    Checks for a .json extension, allowing for a compressed segment written by RotatingFileWrapper.
+    """
+    return filename.endswith(('.json', '.json.gz', '.json.xz'))
+
+
+def frame_to_records(df: pd.DataFrame) -> List[Dict]:
+    """
+    Converts a dataframe to a list of dictionaries with missing values as None, so they are written as null.
+
+    Args:
+        df: dataframe to convert
+
+    Returns:
+        List of one dictionary per row
+    """
+    return df.astype(object).where(df.notna(), None).to_dict(orient='records')
+
+
+def is_jsonl_file(filename: str) -> bool:
+    """
+    Checks for a .jsonl extension, used for files holding one JSON record per line.
+    """
+    return filename.endswith('.jsonl')
+
+
+def encoded_read(input_filename: str) -> pd.DataFrame:
+    """
+    Reads a json file of tweet records written by encoded_write() into a dataframe. A .jsonl file is read as one
+    record per line.
+
+    Args:
+        input_filename: filename to read
+
+    Returns:
+        DataFrame with one row per record
+    """
+    if is_jsonl_file(input_filename):
+        with open(input_filename, 'rb') as file:
+            return pd.DataFrame([codec.loads(line) for line in file if line.strip()])
+    return pd.DataFrame(codec.load(input_filename))
+
+
+def iter_json_array(input_filename: str, block_size: int = 1 << 20) -> Iterator[Dict]:
+    """
+    Reads the records of a json array file one at a time, holding only a block of the file in memory rather than
+    the whole array.
+
+    Args:
+        input_filename: json file holding an array of records, e.g. one written by encoded_write()
+        block_size: number of characters to read at a time
+
+    Returns:
+        Iterator over the records
+    """
+    decoder = json.JSONDecoder()
+    with open(input_filename, encoding='utf-8') as file:
+        buffer = file.read(block_size).lstrip()
+        if not buffer.startswith('['):
+            raise ValueError(f'{input_filename} does not hold a JSON array')
+        position = 1
+        while True:
+            # Skip the separator before the next record
+            while position < len(buffer) and (buffer[position].isspace() or buffer[position] == ','):
+                position += 1
+            if buffer.startswith(']', position):
+                return
+
+            try:
+                record, position = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # The record runs past the end of the block
+                block = file.read(block_size)
+                if not block:
+                    raise
+                buffer = buffer[position:] + block
+                position = 0
+                continue
+            yield record
+
+
+def temporary_filename(filename: str) -> str:
+    """
+    Gets a name to write a file under before moving it into place with os.replace(). It is in the same directory,
+    so the move is atomic, and unique to the process, so processes writing side by side don't collide.
+    """
+    return f'{filename}.{os.getpid()}.tmp'
+
+
+class JsonArrayWriter:
+    def __init__(self, filename: str, indent: bool = True, append: bool = False):
+        """
+        Writes records to a JSON array file a batch at a time, so the whole array never has to be in memory. The
+        file reads back the same as one written by encoded_write() once the writer is closed.
+
+        A new file is written under a temporary name and only moved into place on close, so readers never see a
+        half written array.
+
+        Args:
+            filename: file to write
+            indent: if True, writes with 4 character indent formatting
+            append: if True and the file holds a JSON array, adds the records to the end of it
+        """
+        self.filename = filename
+        self.indent = indent
+        self.count = 0
+        self.tmp_filename = None
+        self.original_end = None
+
+        if append and os.path.exists(filename) and os.path.getsize(filename):
+            self.file = open(filename, 'r+b')
+            has_records = self._reopen_array()
+        else:
+            self.tmp_filename = temporary_filename(filename)
+            self.file = open(self.tmp_filename, 'wb')
+            self.file.write(b'[')
+            has_records = False
+        self.separator = b',' if has_records else b''
+
+    def _reopen_array(self) -> bool:
+        """
+        Moves the file position back over the closing bracket of the array so records can be added after it.
+
+        Returns:
+            True if the array already holds records
+        """
+        start = max(0, self.file.seek(0, os.SEEK_END) - 4096)
+        self.file.seek(start)
+        tail = self.file.read().rstrip()
+        if not tail.endswith(b']'):
+            raise ValueError(f'{self.filename} does not end with a JSON array')
+
+        end = start + len(tail) - 1
+        self.file.seek(end)
+        # Kept to put the file back as it was if the appended records are discarded
+        self.original_end = (end, self.file.read())
+        self.file.seek(end)
+        self.file.truncate()
+        return not tail[:-1].rstrip().endswith(b'[')
+
+    def write_records(self, records: Union[pd.DataFrame, List[Dict]]):
+        """
+        Adds a batch of records to the array.
+
+        Args:
+            records: either a dataframe or a list of dictionaries
+        """
+        if isinstance(records, pd.DataFrame):
+            records = frame_to_records(records)
+        if not records:
+            return
+
+        if self.indent:
+            encoded = [
+                '\n' + '\n'.join('    ' + line for line in codec.dumps(record, indent=True).split('\n'))
+                for record in records
+            ]
+        else:
+            encoded = [codec.dumps(record) for record in records]
+        # Lone surrogates are written as backslash escapes, same as codec.dump()
+        data = ','.join(encoded).encode('utf-8', errors='backslashreplace')
+        self.file.write(self.separator + data)
+        self.separator = b','
+        self.count += len(records)
+
+    def close(self, discard: bool = False):
+        """
+        Closes the array and moves a new file into place.
+
+        Args:
+            discard: if True, throws the records written away instead, e.g. after an error. A new file is removed
+                and an existing file is put back as it was.
+        """
+        if self.file.closed:
+            return
+        if discard:
+            if self.tmp_filename is not None:
+                self.file.close()
+                os.remove(self.tmp_filename)
+            else:
+                end, original = self.original_end
+                self.file.seek(end)
+                self.file.truncate()
+                self.file.write(original)
+                self.file.close()
+            return
+
+        self.file.write(b'\n]' if self.indent and self.separator else b']')
+        self.file.close()
+        if self.tmp_filename is not None:
+            os.replace(self.tmp_filename, self.filename)
+
+    def __enter__(self) -> 'JsonArrayWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close(discard=exc_type is not None)
 
 
 def encoded_write(
@@ -88,12 +589,20 @@ def encoded_write(
     Args:
         tweets: either a dataframe or a list of dictionaries holding tweet info
         output_filename: filename to write output to
-        indent: if True, writes with 4 character indent formatting
+        indent: if True, writes with 4 character indent formatting. Ignored for a .jsonl file, which is always
+            written as one record per line.
     """
-    df = pd.DataFrame(tweets) if isinstance(tweets, list) else tweets
+    records = tweets if isinstance(tweets, list) else frame_to_records(tweets)
 
-    with open(output_filename, 'w', encoding='utf-8') as file:
-        if indent:
-            df.to_json(file, force_ascii=False, orient='records', indent=4)
+    # Write under a temporary name and move into place, so readers never see a half written file
+    tmp_filename = temporary_filename(output_filename)
+    try:
+        if is_jsonl_file(output_filename):
+            with open(tmp_filename, 'w', encoding='utf-8', errors='backslashreplace') as file:
+                file.write(''.join(codec.dumps(record) + '\n' for record in records))
         else:
-            df.to_json(file, force_ascii=False, orient='records')
+            codec.dump(records, tmp_filename, indent)
+        os.replace(tmp_filename, output_filename)
+    finally:
+        if os.path.exists(tmp_filename):
+            os.remove(tmp_filename)
@@ -1,25 +1,97 @@
+from concurrent.futures import (
+    as_completed,
+    ProcessPoolExecutor,
+)
 import os
+import random
+import time
+import traceback
+from typing import (
+    Dict,
+    Optional,
+)
 
 import fire
 
+from question_seeker import utils
 from scripts import text_extractor
 
 
+def _init_worker():
+    # Forked workers start with a copy of the parent's random state, which would give every worker the same
+    # permalink slugs
+    random.seed()
+
+
+def extract_file(fullpath: str, chunk_size: Optional[int] = None) -> Dict:
+    """
+    Runs the text extractor on one file, catching any error so that one bad file doesn't stop the others.
+
+    Args:
+        fullpath: json file to extract
+        chunk_size: number of tweets to process at a time. See text_extractor.extract_tweet_info().
+
+    Returns:
+        Dictionary with the filename, the number of tweets read, how long it took and the error if there was one
+    """
+    start = time.perf_counter()
+    result = {'filename': fullpath, 'tweets': 0, 'error': None}
+    try:
+        result['tweets'] = text_extractor.handler(fullpath, chunk_size=chunk_size)
+    except Exception:
+        result['error'] = traceback.format_exc()
+    result['seconds'] = time.perf_counter() - start
+    return result
+
+
 def bulk_extraction(
         dirname: str,
+        processes: int = 1,
+        chunk_size: Optional[int] = None,
 ):
     """
-    Bulk extracts tweets from any json file in the given directory
+    Bulk extracts tweets from any json file in the given directory, including compressed segments
+
+    Files are independent, so with `processes` above 1 they are extracted side by side in a process pool. Every
+    file gets its own output names, and outputs are written under a temporary name and moved into place, so
+    workers sharing the `all_tweets` and `pending_curation` folders never see each other's half written files.
+    A file that fails is reported and skipped, and leaves no half written output behind.
 
     Args:
         dirname: directory to search for files in
+        processes: number of files to extract at once
+        chunk_size: number of tweets each file is processed in at a time, to bound memory per worker
     """
-    for filename in os.listdir(dirname):
-        if not filename.endswith('.json'):
-            continue
+    fullpaths = [
+        os.path.join(dirname, filename) for filename in sorted(os.listdir(dirname)) if utils.is_json_file(filename)
+    ]
+
+    start = time.perf_counter()
+    results = []
+
+    def report(result: Dict):
+        results.append(result)
+        status = 'failed' if result['error'] else f'{result["tweets"]:,} tweets in {result["seconds"]:.1f}s'
+        print(f'[{len(results)}/{len(fullpaths)}] {result["filename"]}: {status}')
+        if result['error']:
+            print(result['error'])
+
+    if processes > 1:
+        with ProcessPoolExecutor(processes, initializer=_init_worker) as executor:
+            futures = [executor.submit(extract_file, fullpath, chunk_size) for fullpath in fullpaths]
+            for future in as_completed(futures):
+                report(future.result())
+    else:
+        for fullpath in fullpaths:
+            report(extract_file(fullpath, chunk_size))
 
-        fullpath = os.path.join(dirname, filename)
-        text_extractor.handler(fullpath)
+    seconds = time.perf_counter() - start
+    tweets = sum(result['tweets'] for result in results)
+    failed = [result['filename'] for result in results if result['error']]
+    print(f'Extracted {tweets:,} tweets from {len(results) - len(failed)} files in {seconds:.1f}s '
+          f'({tweets / seconds if seconds else 0:,.0f} tweets/s)')
+    if failed:
+        print(f'{len(failed)} files failed: {", ".join(failed)}')
 
 
 if __name__ == '__main__':
@@ -1,5 +1,4 @@
 import fire
-import pandas as pd
 
 from question_seeker import utils
 
@@ -15,7 +14,7 @@ def collapse_texts(
     The use case is after curating the file of just tweet bodies, this method prunes the original 
     tweet texts json file to only retain those that are left in the strings file.
     '''
-    df = pd.read_json(texts_df_filename)
+    df = utils.encoded_read(texts_df_filename)
     with open(strings_filename, encoding='utf-8') as file:
         data = [x.strip() for x in file.readlines()]
     
@@ -1,4 +1,3 @@
-import json
 import os
 from typing import (
     Dict,
@@ -8,7 +7,7 @@ from typing import (
 
 import fire
 
-from question_seeker import utils
+from question_seeker import codec, utils
 
 
 def curate(
@@ -21,8 +20,7 @@ def curate(
     Args:
         filename: file of tweets to prune
     """
-    with open(filename) as file:
-        data = json.load(file)
+    data = codec.load(filename)
 
     def save_tweets(
             tweets: List[Dict],
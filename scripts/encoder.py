@@ -1,7 +1,6 @@
 import os
 
 import fire
-import pandas as pd
 
 from question_seeker import utils
 
@@ -21,7 +20,7 @@ def encode_json_file(
     if not filename.endswith('.json'):
         raise RuntimeError(f'Need to pass a json file. Got {filename}')
 
-    df = pd.read_json(filename)
+    df = utils.encoded_read(filename)
     utils.encoded_write(df, filename, indent)
 
 
@@ -1,86 +1,196 @@
-import json
+import contextlib
 import os
+import time
 from typing import (
     Any,
+    Dict,
+    Iterator,
     List,
+    Optional,
     Tuple,
 )
 
-import dotenv
 import fire
-import MySQLdb
-import pandas as pd
 
+from question_seeker import codec, db, utils
 
-dotenv.load_dotenv()
 
-db = MySQLdb.connect(
-    password=os.environ.get('MYSQL_DB_PASS'),
-    db=os.environ.get('MYSQL_DB_NAME'),
-    user=os.environ.get('MYSQL_DB_USER'),
-    host=os.environ.get('MYSQL_DB_HOST'),
-    charset='utf8mb4',
-    use_unicode=True,
-)
-c = db.cursor()
+COLUMNS = ['tweet_text', 'tweet_id', 'tweet_timestamp', 'loc_name', 'country', 'permalink_slug']
+
+# What to do with a row whose tweet_id is already in the table
+ON_DUPLICATE = ['ignore', 'update']
+
+# Older SQLite builds allow at most 999 parameters in one statement
+SQLITE_MAX_VARIABLES = 999
+
+
+@contextlib.contextmanager
+def open_connection(sqlite_filename: Optional[str] = None, connection: Any = None) -> Iterator[Any]:
+    """
+    Picks the connection to load into: the one given, a SQLite file, or else one from the shared pool.
+    """
+    if connection is not None:
+        yield connection
+    elif sqlite_filename is not None:
+        with contextlib.closing(db.connect_sqlite(sqlite_filename)) as sqlite_connection:
+            yield sqlite_connection
+    else:
+        with db.connection() as pooled_connection:
+            yield pooled_connection
+
+
+def build_insert(num_rows: int, dialect: str, on_duplicate: str = 'ignore') -> str:
+    """
+    Builds one INSERT statement for a batch of rows that skips or updates rows whose tweet_id is already taken.
+
+    Args:
+        num_rows: number of rows the statement inserts
+        dialect: 'mysql' or 'sqlite'
+        on_duplicate: one of ON_DUPLICATE
+
+    Returns:
+        SQL string
+    """
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f'Unknown duplicate handling "{on_duplicate}". Choose from {ON_DUPLICATE}')
+
+    placeholder = '%s' if dialect == 'mysql' else '?'
+    row = '(' + ', '.join([placeholder] * len(COLUMNS)) + ')'
+    values = ', '.join([row] * num_rows)
+    columns = ', '.join(COLUMNS)
+    updated = [col for col in COLUMNS if col != 'tweet_id']
+
+    if dialect == 'mysql':
+        if on_duplicate == 'ignore':
+            # Not INSERT IGNORE, which also turns errors like too long text or missing values into warnings
+            return f'INSERT INTO tweet ({columns}) VALUES {values} ON DUPLICATE KEY UPDATE tweet_id = tweet_id'
+        updates = ', '.join(f'{col} = VALUES({col})' for col in updated)
+        return f'INSERT INTO tweet ({columns}) VALUES {values} ON DUPLICATE KEY UPDATE {updates}'
+
+    if on_duplicate == 'ignore':
+        # Not INSERT OR IGNORE, which also skips rows that break NOT NULL and other constraints
+        return f'INSERT INTO tweet ({columns}) VALUES {values} ON CONFLICT(tweet_id) DO NOTHING'
+    updates = ', '.join(f'{col} = excluded.{col}' for col in updated)
+    return f'INSERT INTO tweet ({columns}) VALUES {values} ON CONFLICT(tweet_id) DO UPDATE SET {updates}'
+
+
+def file_version(input_filename: str) -> Dict[str, int]:
+    """
+    Gets the size and modification time of a file, to tell whether it changed since a checkpoint was saved.
+    """
+    stat = os.stat(input_filename)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+
+def write_checkpoint(checkpoint_filename: str, input_filename: str, rows: int):
+    codec.dump({'rows': rows, **file_version(input_filename)}, checkpoint_filename)
+
+
+def read_checkpoint(checkpoint_filename: str, input_filename: str) -> int:
+    """
+    Reads the number of rows a previous run committed.
+
+    Args:
+        checkpoint_filename: checkpoint file saved by the previous run
+        input_filename: file being loaded
+
+    Returns:
+        Number of rows to skip. 0 if there is no checkpoint, or if the input file changed since it was saved.
+    """
+    if not os.path.exists(checkpoint_filename):
+        return 0
+
+    checkpoint = codec.load(checkpoint_filename)
+    version = file_version(input_filename)
+    if any(checkpoint.get(key) != value for key, value in version.items()):
+        print(f'Ignoring the checkpoint of {input_filename}, which changed since the checkpoint was saved')
+        return 0
+    return checkpoint['rows']
 
 
 def insert_tweets(
         input_filename: str,
         delete_file: bool = False,
-        lines_per_commit: int = 40,
-):
-    df = pd.read_json(input_filename)
-
-    def do_execute(lines: List[Tuple[Any, ...]]):
-        """
-        Wrapper for bulk insert
-
-        Args:
-            lines: List of multiple tuples holding values to be inserted
-        """
-        sql_string = (
-            """
-            INSERT INTO tweet 
-            (tweet_text, tweet_id, tweet_timestamp, loc_name, country, permalink_slug) 
-            VALUES (%s, %s, %s, %s, %s, %s);
-            """
-        )
-
-        # Commit, or rollback
-        try:
-            c.executemany(
-                sql_string,
-                lines,
-            )
-            db.commit()
-            print('inserted')
-        except:
-            db.rollback()
-            raise
-
-    # Iterate over tweets in data json, committing groups at a time
-    value_list = []
-    for counter, line in enumerate(df.to_dict(orient='records')):
-        tup = (
-            line['tweet_text'],
-            line['tweet_id'],
-            line['tweet_timestamp'],
-            line['loc_name'],
-            line['country'],
-            line['permalink_slug'],
-        )
-        value_list.append(tup)
-
-        if counter % lines_per_commit == 0:
-            do_execute(value_list)
-            value_list = []
-
-    # Catch the remaining lines
-    do_execute(value_list)
+        batch_size: int = 1000,
+        on_duplicate: str = 'ignore',
+        resume: bool = True,
+        sqlite_filename: Optional[str] = None,
+        connection: Any = None,
+        lines_per_commit: Optional[int] = None,
+) -> int:
+    """
+    Loads a file of tweets into the tweet table in batches, committing once per batch. Each batch is sent as
+    multi-row INSERT statements, and a tweet_id that is already in the table skips or updates the row instead of
+    failing the load, so running the same file twice is safe.
+
+    After every commit the number of rows loaded so far is saved to a checkpoint file next to the input, along with
+    the input's size and modification time. If a load stops part way, running it again on the same file picks up
+    after the last committed batch. A checkpoint for a file that has since changed is ignored, and the file loaded
+    from the start. The checkpoint is removed once the whole file is loaded.
+
+    Args:
+        input_filename: json file of tweets to load
+        delete_file: if True, removes the input file once it is loaded
+        batch_size: number of rows per commit
+        on_duplicate: 'ignore' to keep the row already in the table, 'update' to overwrite it with the new one
+        resume: if True, skips the rows a previous run committed
+        sqlite_filename: load into this SQLite database instead of the configured one, e.g. for a local run
+        connection: open DB-API connection to load into instead. If neither this nor `sqlite_filename` is given,
+            a connection is taken from the shared pool in question_seeker.db.
+        lines_per_commit: deprecated name for `batch_size`, kept so existing invocations still work
+
+    Returns:
+        Number of rows changed, as counted by the database. MySQL counts an updated row twice.
+    """
+    if on_duplicate not in ON_DUPLICATE:
+        raise ValueError(f'Unknown duplicate handling "{on_duplicate}". Choose from {ON_DUPLICATE}')
+    if lines_per_commit is not None:
+        print('lines_per_commit is deprecated. Use batch_size instead')
+        batch_size = lines_per_commit
+
+    records = utils.frame_to_records(utils.encoded_read(input_filename))
+    rows: List[Tuple[Any, ...]] = [tuple(record.get(col) for col in COLUMNS) for record in records]
+
+    checkpoint_filename = input_filename + '.checkpoint'
+    start_row = read_checkpoint(checkpoint_filename, input_filename) if resume else 0
+    if start_row:
+        print(f'Resuming {input_filename} after {start_row} committed rows')
+
+    changed = 0
+    start = time.perf_counter()
+    with open_connection(sqlite_filename, connection) as connection:
+        dialect = db.dialect_of(connection)
+        rows_per_statement = SQLITE_MAX_VARIABLES // len(COLUMNS) if dialect == 'sqlite' else batch_size
+        cursor = connection.cursor()
+        for batch_start in range(start_row, len(rows), batch_size):
+            batch = rows[batch_start:batch_start + batch_size]
+
+            # Commit, or rollback
+            try:
+                for i in range(0, len(batch), rows_per_statement):
+                    statement_rows = batch[i:i + rows_per_statement]
+                    cursor.execute(
+                        build_insert(len(statement_rows), dialect, on_duplicate),
+                        [value for row in statement_rows for value in row],
+                    )
+                    changed += max(cursor.rowcount, 0)
+                connection.commit()
+            except Exception:
+                connection.rollback()
+                raise
+
+            write_checkpoint(checkpoint_filename, input_filename, batch_start + len(batch))
+
+    seconds = time.perf_counter() - start
+    loaded = max(len(rows) - start_row, 0)
+    print(f'Loaded {loaded} rows from {input_filename} in {seconds:.2f}s '
+          f'({loaded / seconds if seconds else 0:,.0f} rows/s), {changed} rows changed')
 
+    if os.path.exists(checkpoint_filename):
+        os.remove(checkpoint_filename)
     if delete_file:
         os.remove(input_filename)
+    return changed
 
 
 if __name__ == '__main__':
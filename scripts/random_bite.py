@@ -4,7 +4,6 @@ import string
 
 import fire
 import numpy as np
-import pandas as pd
 
 from question_seeker import utils
 
@@ -22,7 +21,7 @@ def take_bite(
     with 'texts'), and another (suffixed with 'strings') with only the tweet bodies for easy curation. 
 
     '''
-    df = pd.read_json(input_fn)
+    df = utils.encoded_read(input_fn)
 
     df_len = len(df)
     mask = [False] * df_len
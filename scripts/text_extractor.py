@@ -1,14 +1,19 @@
 import datetime
-import json
+import os
 from pathlib import Path
 import random
 import string
-from typing import Optional
+from typing import (
+    Iterator,
+    Optional,
+)
 
 import fire
 import pandas as pd
 
-from question_seeker import utils
+from question_seeker.log import LOGGER as logger
+from question_seeker import blocklist, codec, near_duplicates, utils
+from question_seeker.tweet_store import TweetStore
 
 
 def clean_tweet(tweet: str) -> str:
@@ -36,66 +41,40 @@ def clean_tweet(tweet: str) -> str:
     return tweet
 
 
-def filter_for_curation(df: pd.DataFrame):
+def filter_for_curation(
+        df: pd.DataFrame,
+        max_distance: Optional[int] = 8,
+        blocklist_fn: str = blocklist.CURATION_BLOCKLIST,
+):
     """
     Filters tweets with commonly used phrases out from the body of tweets
-    that will be curated.
+    that will be curated, then keeps one tweet out of each group of near
+    duplicates.
 
     This should only be called when making two copies of the collected tweets.
     It is meant to be a time-saver for the curation process, not to remove
     tweets from the overall collected corpus.
 
-    Right now this is done with exact matches, but could be updated later to
-    use fuzzy string matching and scoring to account for tweets that contain
-    similar and adjacent phrases.
+    Phrases are read from `blocklist_fn` and are exact matches. The number of
+    tweets each phrase removed is logged. Near duplicates are found by
+    comparing SimHash signatures of the tweets, so tweets that only differ in
+    case, punctuation, links, mentions or a word or two are curated once.
 
     Args:
         df: dataframe holding tweets
+        max_distance: largest number of differing SimHash bits for two tweets
+            to count as near duplicates. If None, near duplicates are kept.
+        blocklist_fn: phrase blocklist file. See blocklist.read_phrases().
 
     Returns:
         DataFrame with commonly seen tweets filtered out
     """
-    def filter_tweet(tweet: str) -> bool:
-        """
-        Filtering function to run on individual tweets.
-        Returns True if the tweet should be be kept, False otherwise.
+    df, removed = blocklist.load_blocklist(blocklist_fn).apply(df, 'tweet_text')
+    for phrase, count in removed.value_counts().items():
+        logger.info(f'Blocklist phrase "{phrase}" removed {count} tweets from curation')
 
-        Args:
-            tweet: body of the tweet to filter
-
-        Returns:
-            True if the tweet PASSES and does NOT contain any of the
-            phrases below
-        """
-        keep_tweet = True
-
-        phrase_list = [
-            'what should i watch',
-            'what should i watch next',
-            'what should i do today',
-            'what should i cook next',
-            'what should i cook today',
-            'what should i draw next',
-            'netflix',
-            'stream',
-            'what should i eat? : ',
-            'breakfast',
-            'wear to the living room',
-            '200 followers',
-            '100 followers',
-        ]
-        lower_tweet = tweet.lower()
-        if any([x in lower_tweet for x in phrase_list]):
-            keep_tweet = False
-
-        if lower_tweet == 'what should i do?':
-            keep_tweet = False
-
-        return keep_tweet
-
-    df['keep'] = df.tweet_text.apply(filter_tweet)
-    df = df[df.keep]
-    df = df.drop('keep', axis=1)
+    if max_distance is not None:
+        df = near_duplicates.drop_near_duplicates(df, 'tweet_text', max_distance)
     return df
 
 
@@ -108,15 +87,34 @@ def write_tweets(
     """
     Saves tweets to a json file
 
+    A .jsonl output is kept as a TweetStore, so appending only writes the
+    new tweets instead of rewriting the whole file. Appending to any other
+    output reads and rewrites all of it.
+
     Args:
         tweets: DataFrame of tweet info
         output_fn: output filename
         append: if True, appends new tweets to the existing file at `output_fn`
-        indent: if True, adds indenting formatting to json file
+        indent: if True, adds indenting formatting to json file. Ignored for .jsonl files.
     """
+    if utils.is_jsonl_file(output_fn):
+        if append:
+            TweetStore(output_fn).append(tweets)
+            return
+
+        # Build the new store under a temporary name, so the old one stays until the new one is complete
+        store = TweetStore(utils.temporary_filename(output_fn), overwrite=True)
+        try:
+            store.append(tweets)
+        except Exception:
+            store.delete()
+            raise
+        store.replace(output_fn)
+        return
+
     # Open existing file and append new tweets
     if append:
-        df = pd.read_json(output_fn)
+        df = utils.encoded_read(output_fn)
         tweets = pd.concat([df, tweets])
 
     # Remove duplicates
@@ -126,23 +124,181 @@ def write_tweets(
     utils.encoded_write(tweets, output_fn, indent)
 
 
+class StreamingTweetWriter:
+    def __init__(self, output_fn: str, append: bool = False, indent: bool = False):
+        """
+        Writes tweets to a json file a chunk at a time, dropping tweets whose id was already written. A .jsonl
+        output is kept as a TweetStore. Any other output keeps the ids written in a temporary TweetStore next to
+        it, so ids are held on disk either way and memory doesn't grow with the size of the output.
+
+        Until the writer is closed, an output being replaced rather than appended to is written under a temporary
+        name, so discarding it leaves the previous output in place.
+
+        Args:
+            output_fn: output filename
+            append: if True, appends new tweets to the existing file at `output_fn`
+            indent: if True, adds indenting formatting to json file. Ignored for .jsonl files.
+        """
+        self.output_fn = output_fn
+        self.append = append
+        self.store = None
+        self.writer = None
+        self.ids = None
+        if utils.is_jsonl_file(output_fn):
+            if append:
+                self.store = TweetStore(output_fn)
+                # Kept to cut the store back to if the tweets written are discarded
+                self.start_size = os.path.getsize(output_fn)
+            else:
+                self.store = TweetStore(utils.temporary_filename(output_fn), overwrite=True)
+            return
+
+        self.ids = TweetStore(utils.temporary_filename(output_fn + '.ids'), overwrite=True)
+        if append:
+            ids = []
+            for record in utils.iter_json_array(output_fn):
+                ids.append({'tweet_id': record['tweet_id']})
+                if len(ids) >= 10000:
+                    self.ids.append(ids)
+                    ids = []
+            self.ids.append(ids)
+        self.writer = utils.JsonArrayWriter(output_fn, indent, append)
+
+    def write(self, tweets: pd.DataFrame):
+        """
+        Writes the tweets that weren't written before.
+
+        Args:
+            tweets: DataFrame of tweet info
+        """
+        if self.store is not None:
+            self.store.append(tweets)
+            return
+
+        tweets = tweets[~tweets.duplicated('tweet_id')]
+        tweets = tweets[~self.ids.contains(tweets.tweet_id)]
+        self.ids.append([{'tweet_id': tweet_id} for tweet_id in tweets.tweet_id])
+        self.writer.write_records(tweets)
+
+    def close(self, discard: bool = False):
+        """
+        Finishes the output.
+
+        Args:
+            discard: if True, throws away the tweets written, leaving the output as it was before
+        """
+        if self.store is not None:
+            if not self.append:
+                if discard:
+                    self.store.delete()
+                else:
+                    self.store.replace(self.output_fn)
+            elif discard:
+                self.store.truncate(self.start_size)
+            return
+
+        self.writer.close(discard)
+        self.ids.delete()
+
+
+def extract_record(tdict: dict) -> dict:
+    """
+    Pulls the fields kept for curation out of a full tweet.
+
+    Args:
+        tdict: full tweet info as a dictionary
+
+    Returns:
+        Dictionary of tweet info
+    """
+    if 'extended_tweet' in tdict:
+        tweet = tdict['extended_tweet']['full_text']
+    else:
+        tweet = tdict['text']
+
+    tweet = clean_tweet(tweet)
+
+    # Get location info if available
+    if tdict.get('place') is not None:
+        tweetplace = tdict['place']
+        loc_name = tweetplace.get('full_name')
+        country = tweetplace.get('country_code')
+    else:
+        loc_name = ''
+        country = ''
+
+    # Make a random slug for the URL permalink
+    # This isn't cryptographically secure, but it doesn't have to be
+    slug = ''.join(random.choices(string.ascii_uppercase + string.digits, k=7))
+
+    return {
+        'tweet_text': tweet,
+        'tweet_id': tdict['id_str'],
+        'tweet_timestamp': tdict['created_at'],
+        'loc_name': loc_name,
+        'country': country,
+        'permalink_slug': slug,
+    }
+
+
+def read_chunks(input_fn: str, chunk_size: int) -> Iterator[pd.DataFrame]:
+    """
+    Reads a file of full tweets, one per line, and extracts them a chunk at a time.
+
+    Args:
+        input_fn: input json filename. Can be a compressed segment ending in .json.gz or .json.xz.
+        chunk_size: number of tweets in each chunk
+
+    Returns:
+        Iterator over DataFrames of at most `chunk_size` tweets
+    """
+    tweets = []
+    with utils.open_text(input_fn) as file:
+        for line in file:
+            tweets.append(extract_record(codec.loads(line)))
+            if len(tweets) >= chunk_size:
+                yield pd.DataFrame(tweets)
+                tweets = []
+    if tweets:
+        yield pd.DataFrame(tweets)
+
+
 def extract_tweet_info(
         input_fn: str,
         output_fn: str,
         append: bool = False,
         make_copies: bool = True,
+        chunk_size: Optional[int] = None,
 ):
     """
     Extracts the body of the tweet from the massive dict of metadata
     that Twitter provides. If the tweet is long enough, it is stored in
     the `extended_tweet` field (added after the switch to 280 chars).
 
+    With `chunk_size` set, the input is streamed: each chunk is extracted,
+    deduplicated, filtered and written out before the next one is read, so
+    memory stays bounded by the chunk size rather than the input or output
+    size. Tweet ids already written are kept on disk, see
+    StreamingTweetWriter. Near duplicates are only looked for within a chunk.
+
+    The cost of appending depends on the output format. A .jsonl output is
+    kept as a TweetStore, so appending only writes the new tweets. A .json
+    output, the default, is read back to find the ids already in it, and
+    without `chunk_size` it is also rewritten whole, so each append costs
+    time in the size of the existing file. Use a .jsonl `output_fn` for
+    outputs that are appended to often.
+
     Args:
-        input_fn: input json filename containing full tweet info as dictionaries
+        input_fn: input json filename containing full tweet info as dictionaries. Can be a compressed segment
+            ending in .json.gz or .json.xz.
         output_fn: output filename
         append: if True, appends new tweets to the existing file at `output_fn`
         make_copies: if True, writes one copy of the tweets to an `all_tweets` folder and another copy to a
             `pending_curation` folder for human curation
+        chunk_size: number of tweets to process at a time. If None, the whole file is processed at once.
+
+    Returns:
+        Number of tweets read from `input_fn`
     """
     full_input_fp = Path(input_fn)
     full_output_fp = Path(output_fn)
@@ -153,41 +309,41 @@ def extract_tweet_info(
     if not full_input_fp.exists():
         raise FileNotFoundError(f'No file found named {input_fn}')
 
-    tweets = []
-
-    with open(input_fn) as file:
-        for line in file:
-            tdict = json.loads(line)
-            if 'extended_tweet' in tdict:
-                tweet = tdict['extended_tweet']['full_text']
-            else:
-                tweet = tdict['text']
-
-            tweet = clean_tweet(tweet)
-
-            # Get location info if available
-            if tdict.get('place') is not None:
-                tweetplace = tdict['place']
-                loc_name = tweetplace.get('full_name')
-                country = tweetplace.get('country_code')
-            else:
-                loc_name = ''
-                country = ''
+    if make_copies:
+        Path(base_outdir / 'all_tweets').mkdir(parents=True, exist_ok=True)
+        all_tweets_output_fn = str(base_outdir / f'all_tweets/{outname.replace(".json", "_all.json")}')
+        Path(base_outdir / 'pending_curation').mkdir(parents=True, exist_ok=True)
+        pending_curation_fn = str(base_outdir / 'pending_curation' / outname)
 
-            # Make a random slug for the URL permalink
-            # This isn't cryptographically secure, but it doesn't have to be
-            slug = ''.join(random.choices(string.ascii_uppercase + string.digits, k=7))
+    if chunk_size is not None:
+        if make_copies:
+            all_writer = StreamingTweetWriter(all_tweets_output_fn, append)
+            curation_writer = StreamingTweetWriter(pending_curation_fn, append, indent=True)
+        else:
+            all_writer = StreamingTweetWriter(str(full_output_fp), append)
+            curation_writer = None
+
+        count = 0
+        completed = False
+        try:
+            for df in read_chunks(input_fn, chunk_size):
+                count += len(df)
+                all_writer.write(df)
+                if curation_writer is not None:
+                    curation_writer.write(filter_for_curation(df))
+            completed = True
+        finally:
+            # Don't leave a partial output behind if the input turns out to be bad
+            all_writer.close(discard=not completed)
+            if curation_writer is not None:
+                curation_writer.close(discard=not completed)
+        return count
 
-            tweet_dict = {
-                'tweet_text': tweet,
-                'tweet_id': tdict['id_str'],
-                'tweet_timestamp': tdict['created_at'],
-                'loc_name': loc_name,
-                'country': country,
-                'permalink_slug': slug,
-            }
+    tweets = []
 
-            tweets.append(tweet_dict)
+    with utils.open_text(input_fn) as file:
+        for line in file:
+            tweets.append(extract_record(codec.loads(line)))
 
     # Make into a dataframe
     df = pd.DataFrame(tweets)
@@ -195,17 +351,14 @@ def extract_tweet_info(
     # Save tweets
     if make_copies:
         # First do all_tweets
-        Path(base_outdir / 'all_tweets').mkdir(parents=True, exist_ok=True)
-        all_tweets_output_fn = str(base_outdir / f'all_tweets/{outname.replace(".json", "_all.json")}')
         write_tweets(df, all_tweets_output_fn, append)
 
         # Write them again to a pending_curation folder (indent for human readability)
-        Path(base_outdir / 'pending_curation').mkdir(parents=True, exist_ok=True)
-        pending_curation_fn = str(base_outdir / 'pending_curation' / outname)
         curation_df = filter_for_curation(df)
         write_tweets(curation_df, pending_curation_fn, append, indent=True)
     else:
         write_tweets(df, str(full_output_fp), append)
+    return len(df)
 
 
 def handler(
@@ -213,19 +366,26 @@ def handler(
         output_fn: Optional[str] = None,
         append: bool = False,
         make_copies: bool = True,
+        chunk_size: Optional[int] = None,
 ):
     """
     Make some runtime sanity checks and then call the text extractor.
 
     Args:
-        input_fn: input filename - must be json.
-        output_fn: optional output filename
+        input_fn: input filename - must be json, or a .json.gz or .json.xz segment.
+        output_fn: optional output filename. Defaults to a new .json file. Pass a .jsonl name to make appends
+            only cost time in the number of new tweets, see extract_tweet_info().
         append: if True, appends new tweets to the existing file at `output_fn`
         make_copies: if True, writes one copy of the tweets to an `all_tweets` folder and another copy to a
             `pending_curation` folder for human curation
+        chunk_size: number of tweets to process at a time, to keep memory bounded on large files. If None, the
+            whole file is processed at once.
+
+    Returns:
+        Number of tweets read from `input_fn`
     """
     # Check that input fn in json
-    if not input_fn.endswith('.json'):
+    if not utils.is_json_file(input_fn):
         raise RuntimeError(f'Input function must be a json file. Got "{input_fn}"')
 
     full_input_fp = Path(input_fn).resolve()
@@ -234,7 +394,7 @@ def handler(
 
     # Create output filename if none was passed
     if output_fn is None:
-        output_fn = input_filename.replace('.json', '').replace('tweets', 'texts')
+        output_fn = utils.strip_json_suffix(input_filename).replace('tweets', 'texts')
 
         # Add the date and a random slug to the filename
         # Today formatted as MMDDYYYY
@@ -253,11 +413,12 @@ def handler(
                 f'To append to a file, the output file needs to exist. File path "{output_fn}" does not exist.'
             )
 
-    extract_tweet_info(
+    return extract_tweet_info(
         str(full_input_fp),
         str(full_output_fp),
         append,
         make_copies,
+        chunk_size,
     )
 
 
@@ -0,0 +1,115 @@
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from tweepy import OAuthHandler
+import pytest
+
+from question_seeker import aio_stream, processing, q_starts
+from question_seeker import stream as streamer
+from question_seeker.fake_stream import FakeStreamServer
+
+
+class TestAsyncStream:
+    @classmethod
+    def setup_class(cls):
+        cls.matching = [json.dumps({'text': f'Why am I awake at {i} am? 🤔'}) for i in range(25)]
+        cls.non_matching = [json.dumps({'text': 'Nothing to see here'}) for _ in range(5)]
+        cls.raw_tweets = cls.matching + cls.non_matching
+        cls.tmpdir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        cls.tmpdir.cleanup()
+        for filename in [
+            'personal_tweets.json',
+            'tweet_counter.txt',
+        ]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def make_listener(self, filename: str = 'personal_tweets.json', **kwargs) -> streamer.Listener:
+        handler = processing.TweetHandler(
+            q_starts.personal_starts, os.path.join(self.tmpdir.name, filename), 100, write_to_file=True,
+        )
+        tweet_handler_map = {start: handler for start in handler.starts}
+        return streamer.Listener(tweet_handler_map, batch_size=4, **kwargs)
+
+    @staticmethod
+    def read_written(listener: streamer.Listener) -> list:
+        handler = listener.tweet_handler_map['why am']
+        handler.file.close()
+        with open(handler.filename, encoding='utf-8') as file:
+            return file.read().splitlines()
+
+    def test_stream(self):
+        server = FakeStreamServer(self.raw_tweets, lines_per_chunk=3, keep_alive_every=5).start()
+        listener = self.make_listener('stream.json')
+        try:
+            client = aio_stream.AsyncStream(None, listener, url=server.url)
+            stats = asyncio.run(client.filter(track=['why am', 'y am']))
+        finally:
+            server.stop()
+
+        assert stats['tweets'] == 30
+        assert listener.total_tweet_counter == 30
+        assert self.read_written(listener) == self.matching
+        assert b'track=why+am%2Cy+am' in server.requests[0]
+
+    def test_several_streams(self):
+        servers = [FakeStreamServer(self.raw_tweets).start() for _ in range(2)]
+        listeners = [self.make_listener(f'several_{i}.json') for i in range(len(servers))]
+
+        async def run():
+            return await asyncio.gather(*[
+                aio_stream.AsyncStream(None, listener, url=server.url).filter()
+                for server, listener in zip(servers, listeners)
+            ])
+
+        try:
+            results = asyncio.run(run())
+        finally:
+            for server in servers:
+                server.stop()
+
+        assert [stats['tweets'] for stats in results] == [30, 30]
+        assert all(self.read_written(listener) == self.matching for listener in listeners)
+
+    def test_time_limit(self):
+        server = FakeStreamServer(self.raw_tweets * 100, rate=100, lines_per_chunk=1).start()
+        listener = self.make_listener('time_limit.json', time_limit=0.5)
+        start = time.time()
+        try:
+            stats = asyncio.run(aio_stream.AsyncStream(None, listener, url=server.url).filter())
+        finally:
+            server.stop()
+
+        assert time.time() - start < 2
+        assert 0 < stats['tweets'] < 3000
+        assert listener.total_tweet_counter == stats['tweets']
+
+    def test_error_status(self, monkeypatch):
+        monkeypatch.setattr(streamer.utils, 'send_email', lambda message: None)
+        server = FakeStreamServer(self.raw_tweets, status=420).start()
+        listener = self.make_listener('error.json')
+        try:
+            with pytest.raises(ConnectionError):
+                asyncio.run(aio_stream.AsyncStream(None, listener, url=server.url).filter())
+        finally:
+            server.stop()
+
+    def test_signed_request(self):
+        auth = OAuthHandler('consumer_key', 'consumer_secret')
+        auth.set_access_token('access_token', 'access_token_secret')
+        client = aio_stream.AsyncStream(auth, self.make_listener('signed.json'))
+
+        host, port, use_tls, request = client.build_request(['why am'])
+        assert (host, port, use_tls) == ('stream.twitter.com', 443, True)
+        assert request.startswith(b'POST /1.1/statuses/filter.json HTTP/1.1\r\n')
+        assert b'Authorization: OAuth ' in request
+        assert request.endswith(b'\r\n\r\ntrack=why+am')
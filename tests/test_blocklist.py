@@ -0,0 +1,52 @@
+import os
+import tempfile
+
+import pandas as pd
+
+from question_seeker import blocklist
+from scripts import text_extractor
+
+
+class TestBlocklist:
+    @classmethod
+    def setup_class(cls):
+        cls.df = pd.DataFrame({
+            'tweet_text': [
+                'What should I watch next on Netflix?',
+                'What should I do?',
+                'what should i do? I am bored',
+                'Why is breakfast the most important meal?',
+                'Why do cats purr?',
+            ],
+            'tweet_id': ['1', '2', '3', '4', '5'],
+        })
+
+    def test_read_phrases(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            fn = os.path.join(tmpdir, 'blocklist.txt')
+            with open(fn, 'w') as file:
+                file.write('# comment\n\nwhat should i eat? : \n= what should i do?\n')
+            assert blocklist.read_phrases(fn) == (['what should i eat? : '], ['what should i do?'])
+
+    def test_match(self):
+        bl = blocklist.PhraseBlocklist(['what should i watch', 'What should I watch next', 'breakfast'],
+                                       exact=['what should i do?'])
+        matches = bl.match(self.df.tweet_text)
+        # The longest phrase is reported, and the whole tweet rule only matches the whole tweet
+        assert matches[0] == 'what should i watch next'
+        assert matches.isna().tolist() == [False, False, True, False, True]
+        assert matches[1] == 'what should i do?'
+        assert matches[3] == 'breakfast'
+
+    def test_apply(self):
+        kept, removed = blocklist.PhraseBlocklist(['netflix']).apply(self.df)
+        assert kept.tweet_id.tolist() == ['2', '3', '4', '5']
+        assert removed.to_dict() == {0: 'netflix'}
+
+        kept, removed = blocklist.PhraseBlocklist().apply(self.df)
+        assert kept.tweet_id.tolist() == self.df.tweet_id.tolist()
+        assert removed.empty
+
+    def test_filter_for_curation(self):
+        curation_df = text_extractor.filter_for_curation(self.df, max_distance=None)
+        assert curation_df.tweet_id.tolist() == ['3', '5']
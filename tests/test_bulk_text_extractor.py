@@ -0,0 +1,49 @@
+import os
+import shutil
+import tempfile
+
+from benchmarks.corpus import CorpusGenerator
+from question_seeker import codec
+from scripts import bulk_text_extractor
+
+
+class TestBulkTextExtractor:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        for i in range(4):
+            lines = CorpusGenerator(seed=i).generate(100)
+            with open(os.path.join(cls.dirname, f'why_tweets_{i}.json'), 'w', encoding='utf-8') as file:
+                file.write('\n'.join(lines) + '\n')
+        with open(os.path.join(cls.dirname, 'bad_tweets.json'), 'w') as file:
+            file.write('{"text": "Why is this cut off\n')
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def test_bulk_extraction(self, capsys):
+        bulk_text_extractor.bulk_extraction(self.dirname, processes=2, chunk_size=30)
+
+        output = capsys.readouterr().out
+        assert 'Extracted 400 tweets from 4 files' in output
+        assert '1 files failed' in output and 'bad_tweets.json' in output
+
+        all_tweets = sorted(os.listdir(os.path.join(self.dirname, 'all_tweets')))
+        assert len(all_tweets) == 4
+        assert all(name.startswith('why_texts_') for name in all_tweets)
+        assert len(os.listdir(os.path.join(self.dirname, 'pending_curation'))) == 4
+        # The bad file left no temporary files behind
+        assert not any(name.endswith('.tmp') for _, _, names in os.walk(self.dirname) for name in names)
+
+        # Workers don't share their random state, so permalink slugs differ between files
+        slugs = [
+            tweet['permalink_slug']
+            for name in all_tweets
+            for tweet in codec.load(os.path.join(self.dirname, 'all_tweets', name))
+        ]
+        assert len(slugs) == 400
+        assert len(set(slugs)) > 390
@@ -0,0 +1,72 @@
+import json
+import os
+
+import pandas as pd
+
+from question_seeker import codec, utils
+
+
+class TestCodec:
+    @classmethod
+    def setup_class(cls):
+        cls.tweet = {'id_str': '1234567890123456789', 'text': 'Why should I eat 🍕 for breakfast? “asking”'}
+        cls.filename = 'codec_test.json'
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files and restore the default backend
+        """
+        if os.path.exists(cls.filename):
+            os.remove(cls.filename)
+        codec.set_backend()
+
+    def test_backends_agree(self):
+        raw = json.dumps(self.tweet)
+        for backend in codec.BACKENDS:
+            codec.set_backend(backend)
+            assert codec.loads(raw) == self.tweet
+            assert codec.loads(raw.encode('utf-8')) == self.tweet
+
+            # Emojis are kept as they are, not escaped
+            dumped = codec.dumps(self.tweet)
+            assert '🍕' in dumped
+            assert json.loads(dumped) == self.tweet
+
+    def test_lone_surrogate(self):
+        # A tweet cut off in the middle of an emoji
+        raw = '{"text": "Why am I \\ud83c"}'
+        for backend in codec.BACKENDS:
+            codec.set_backend(backend)
+            tweet = codec.loads(raw)
+            assert tweet == json.loads(raw)
+            assert json.loads(codec.dumps(tweet)) == tweet
+
+    def test_unknown_backend(self):
+        try:
+            codec.set_backend('not_a_backend')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Expected a ValueError')
+
+    def test_encoded_round_trip(self):
+        df = pd.DataFrame([
+            {'tweet_text': self.tweet['text'], 'tweet_id': self.tweet['id_str'], 'loc_name': None},
+            {'tweet_text': 'Why am I here?', 'tweet_id': '2', 'loc_name': 'Boston, MA'},
+        ])
+        for indent in [True, False]:
+            utils.encoded_write(df, self.filename, indent)
+            with open(self.filename, encoding='utf-8') as file:
+                contents = file.read()
+            assert '🍕' in contents
+            assert 'NaN' not in contents
+
+            read_df = utils.encoded_read(self.filename)
+            assert read_df.tweet_id.tolist() == ['1234567890123456789', '2']
+            assert read_df.tweet_text.tolist() == df.tweet_text.tolist()
+
+    def test_encoded_write_lone_surrogate(self):
+        tweets = [{'tweet_text': 'Why am I \ud83c', 'tweet_id': '3'}]
+        utils.encoded_write(tweets, self.filename, indent=False)
+        assert utils.encoded_read(self.filename).tweet_text.tolist() == ['Why am I \ud83c']
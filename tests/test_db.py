@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from question_seeker import db
+
+
+class TestDb:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.dirname, 'qs.db')
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files and the pool made from the test environment
+        """
+        db.close_pool()
+        os.environ.pop('QS_SQLITE_DB', None)
+        shutil.rmtree(cls.dirname)
+
+    def test_lazy_pool(self):
+        opened = []
+
+        def connect():
+            opened.append(db.connect_sqlite(self.filename))
+            return opened[-1]
+
+        pool = db.ConnectionPool(connect, size=2)
+        assert not opened
+
+        with pool.connection() as first:
+            with pool.connection() as second:
+                assert first is not second
+        # Connections are reused rather than opened again
+        with pool.connection() as third:
+            assert third in opened
+        assert len(opened) == 2
+        pool.close()
+        assert pool.opened == 0
+
+    def test_waits_for_connection(self):
+        pool = db.ConnectionPool(lambda: db.connect_sqlite(self.filename), size=1)
+        used = []
+
+        def worker():
+            with pool.connection() as connection:
+                used.append(connection)
+
+        with pool.connection() as connection:
+            thread = threading.Thread(target=worker)
+            thread.start()
+            thread.join(0.1)
+            assert thread.is_alive()
+        thread.join()
+        assert used == [connection]
+
+    def test_reconnect(self):
+        pool = db.ConnectionPool(lambda: db.connect_sqlite(self.filename), size=1, health_check_interval=0)
+        with pool.connection() as connection:
+            connection.close()
+        with pool.connection() as reconnected:
+            assert reconnected is not connection
+            assert db.is_healthy(reconnected)
+
+    def test_error_discards_connection(self):
+        pool = db.ConnectionPool(lambda: db.connect_sqlite(self.filename), size=1)
+        try:
+            with pool.connection() as connection:
+                connection.execute('SELECT * FROM missing_table')
+        except Exception:
+            pass
+        assert pool.opened == 0
+
+    def test_interrupt_discards_connection(self):
+        pool = db.ConnectionPool(lambda: db.connect_sqlite(self.filename), size=1)
+        try:
+            with pool.connection():
+                raise KeyboardInterrupt
+        except KeyboardInterrupt:
+            pass
+        assert pool.opened == 0
+
+        # A generator closed while it holds a connection gives its slot back too
+        def rows():
+            with pool.connection() as connection:
+                yield from connection.execute('SELECT 1')
+
+        generator = rows()
+        next(generator)
+        generator.close()
+        assert pool.opened == 0
+        with pool.connection() as connection:
+            assert db.is_healthy(connection)
+
+    def test_sqlite_config(self):
+        os.environ['QS_SQLITE_DB'] = self.filename
+        db.close_pool()
+        assert db.sqlalchemy_uri() == f'sqlite:///{self.filename}'
+        assert db.engine_options() == {'pool_pre_ping': True}
+        with db.connection() as connection:
+            assert db.dialect_of(connection) == 'sqlite'
+            assert connection.execute('SELECT 1').fetchone() == (1,)
@@ -0,0 +1,66 @@
+import json
+import os
+
+from question_seeker import dedup, processing
+
+
+class TestDedup:
+    @classmethod
+    def setup_class(cls):
+        cls.tweets = [
+            {'id_str': '1', 'text': 'Why am I awake?'},
+            # Sent again after a reconnect
+            {'id_str': '1', 'text': 'Why am I awake?'},
+            # Copy-paste spam under another id
+            {'id_str': '2', 'text': 'why am I AWAKE??? https://t.co/abc @someone'},
+            {'id_str': '3', 'text': 'Why am I still awake?'},
+        ]
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        if os.path.exists('personal_tweets.json'):
+            os.remove('personal_tweets.json')
+
+    def test_normalize_text(self):
+        assert dedup.normalize_text('Why am I AWAKE?? https://t.co/abc @someone 🤔') == 'why am i awake'
+
+    def test_bloom_filter(self):
+        bloom = dedup.BloomFilter(10000, 0.01)
+        keys = [f'id:{i}'.encode() for i in range(10000)]
+        for key in keys:
+            bloom.add(key)
+
+        assert all(key in bloom for key in keys)
+        false_positives = sum(f'other:{i}'.encode() in bloom for i in range(10000))
+        assert false_positives < 200
+
+    def test_duplicate_filter(self):
+        duplicates = dedup.DuplicateFilter(capacity=100)
+        assert [duplicates.check(tweet) for tweet in self.tweets] == [None, 'duplicate_id', 'duplicate_text', None]
+
+    def test_rotation(self):
+        duplicates = dedup.DuplicateFilter(capacity=10)
+        for i in range(25):
+            duplicates.add(f'id:{i}'.encode())
+
+        # The last `capacity` keys are always remembered, older ones are eventually forgotten
+        assert all(f'id:{i}'.encode() in duplicates for i in range(15, 25))
+        assert b'id:0' not in duplicates
+
+    def test_process_tweets(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        processing.process_tweets(self.tweets, tweet_handler_map, dedup=dedup.DuplicateFilter(capacity=100))
+        assert [json.loads(tweet) for tweet in tweet_handler_map['why am'].bucket] == [self.tweets[0], self.tweets[3]]
+
+    def test_classifier_pool(self):
+        raw_list = [json.dumps(tweet) for tweet in self.tweets]
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        pool = processing.ClassifierPool(tweet_handler_map, processes=2, dedup=dedup.DuplicateFilter(capacity=100))
+        try:
+            pool.process_tweets(raw_list)
+        finally:
+            pool.close()
+        assert tweet_handler_map['why am'].bucket == [raw_list[0], raw_list[3]]
@@ -0,0 +1,116 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+
+from question_seeker import codec, utils
+from scripts import insert_into_db
+
+
+class TestInsertIntoDb:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.tweets = [
+            {
+                'tweet_text': f'Why am I tweet {i}?',
+                'tweet_id': str(1250000000000000000 + i),
+                'tweet_timestamp': 'Tue Apr 14 12:00:00 +0000 2020',
+                'loc_name': '',
+                'country': None,
+                'permalink_slug': f'SLUG{i:03d}',
+            }
+            for i in range(500)
+        ]
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def connect(self, name: str) -> sqlite3.Connection:
+        connection = sqlite3.connect(os.path.join(self.dirname, name))
+        connection.execute(
+            'CREATE TABLE tweet (id INTEGER PRIMARY KEY, tweet_text TEXT NOT NULL, tweet_id TEXT NOT NULL UNIQUE, '
+            'tweet_timestamp TEXT NOT NULL, loc_name TEXT, country TEXT, permalink_slug TEXT)'
+        )
+        return connection
+
+    def write(self, name: str, tweets: list) -> str:
+        filename = os.path.join(self.dirname, name)
+        utils.encoded_write(tweets, filename)
+        return filename
+
+    def test_bulk_load(self):
+        connection = self.connect('bulk.db')
+        filename = self.write('bulk_texts.json', self.tweets)
+        assert insert_into_db.insert_tweets(filename, batch_size=300, connection=connection) == 500
+
+        # Loading the same tweets again, with some new ones, skips the duplicates instead of failing
+        filename = self.write('more_texts.json', self.tweets[400:] + [dict(self.tweets[0], tweet_id='1')])
+        assert insert_into_db.insert_tweets(filename, connection=connection) == 1
+
+        rows = connection.execute('SELECT tweet_id, country FROM tweet ORDER BY id').fetchall()
+        assert [row[0] for row in rows] == [tweet['tweet_id'] for tweet in self.tweets] + ['1']
+        assert rows[0][1] is None
+        assert not os.path.exists(filename + '.checkpoint')
+
+    def test_update(self):
+        connection = self.connect('update.db')
+        filename = self.write('update_texts.json', self.tweets[:10])
+        insert_into_db.insert_tweets(filename, connection=connection)
+
+        edited = [dict(tweet, tweet_text='Why was I edited?') for tweet in self.tweets[:10]]
+        filename = self.write('edited_texts.json', edited)
+        insert_into_db.insert_tweets(filename, on_duplicate='update', connection=connection)
+        texts = connection.execute('SELECT DISTINCT tweet_text FROM tweet').fetchall()
+        assert texts == [('Why was I edited?',)]
+
+    def test_resume(self):
+        connection = self.connect('resume.db')
+        filename = self.write('resume_texts.json', self.tweets)
+        # A previous run committed the first 200 rows and then stopped
+        insert_into_db.write_checkpoint(filename + '.checkpoint', filename, 200)
+
+        assert insert_into_db.insert_tweets(filename, batch_size=100, connection=connection) == 300
+        assert connection.execute('SELECT COUNT(*) FROM tweet').fetchone() == (300,)
+        assert not os.path.exists(filename + '.checkpoint')
+
+    def test_resume_changed_file(self):
+        connection = self.connect('changed.db')
+        filename = self.write('changed_texts.json', self.tweets[:300])
+        insert_into_db.write_checkpoint(filename + '.checkpoint', filename, 200)
+
+        # The file was rewritten with other tweets after the checkpoint was saved, so all of it is loaded
+        filename = self.write('changed_texts.json', self.tweets[200:])
+        assert insert_into_db.insert_tweets(filename, batch_size=100, connection=connection) == 300
+
+        # A checkpoint from before file versions were saved is ignored too
+        codec.dump({'rows': 200}, filename + '.checkpoint')
+        assert insert_into_db.read_checkpoint(filename + '.checkpoint', filename) == 0
+
+    def test_constraint_errors_raise(self):
+        connection = self.connect('constraints.db')
+        # Only a duplicate tweet_id is skipped. A row breaking NOT NULL fails the load.
+        filename = self.write('null_texts.json', [dict(self.tweets[0], tweet_text=None)])
+        try:
+            insert_into_db.insert_tweets(filename, connection=connection)
+        except sqlite3.IntegrityError:
+            pass
+        else:
+            raise AssertionError('Expected an IntegrityError')
+        assert connection.execute('SELECT COUNT(*) FROM tweet').fetchone() == (0,)
+
+    def test_lines_per_commit(self):
+        connection = self.connect('lines_per_commit.db')
+        filename = self.write('lines_per_commit_texts.json', self.tweets[:50])
+        assert insert_into_db.insert_tweets(filename, lines_per_commit=20, connection=connection) == 50
+
+    def test_build_insert_mysql(self):
+        statement = insert_into_db.build_insert(2, 'mysql')
+        # Only duplicate keys are skipped. INSERT IGNORE would also hide errors like too long text.
+        assert 'IGNORE' not in statement
+        assert statement.endswith('ON DUPLICATE KEY UPDATE tweet_id = tweet_id')
+        assert statement.count('(%s, %s, %s, %s, %s, %s)') == 2
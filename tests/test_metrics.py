@@ -0,0 +1,104 @@
+import json
+import os
+import tempfile
+import urllib.request
+
+from question_seeker import metrics, processing
+from question_seeker import stream as streamer
+
+
+class TestMetrics:
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        for filename in [
+            'personal_tweets.json',
+            'tweet_counter.txt',
+        ]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_registry_render(self):
+        registry = metrics.MetricsRegistry()
+        counter = registry.counter('test_total', 'Test counter')
+        counter.inc(rule='retweet')
+        counter.inc(2, rule='retweet')
+        counter.inc(rule='a "quoted" rule')
+        histogram = registry.histogram('test_seconds', 'Test histogram', buckets=(0.1, 1.0))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5.0)
+        registry.gauge('test_depth', 'Test gauge', lambda: 7)
+
+        # The same name gives back the same metric
+        assert registry.counter('test_total', 'Test counter') is counter
+        assert counter.get(rule='retweet') == 3
+
+        text = registry.render()
+        assert 'test_total{rule="retweet"} 3' in text
+        assert 'test_total{rule="a \\"quoted\\" rule"} 1' in text
+        assert 'test_seconds_bucket{le="0.1"} 1' in text
+        assert 'test_seconds_bucket{le="1.0"} 2' in text
+        assert 'test_seconds_bucket{le="+Inf"} 3' in text
+        assert 'test_seconds_count 3' in text
+        assert 'test_depth 7' in text
+
+        snapshot = registry.snapshot()['metrics']
+        assert snapshot['test_seconds'][0]['count'] == 3
+        assert snapshot['test_depth'][0]['value'] == 7
+
+    def test_server_and_snapshot(self):
+        registry = metrics.MetricsRegistry()
+        registry.counter('test_total', 'Test counter').inc()
+
+        server = metrics.MetricsServer(0, registry=registry).start()
+        try:
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics') as response:
+                assert 'test_total 1' in response.read().decode('utf-8')
+            with urllib.request.urlopen(f'http://127.0.0.1:{server.port}/metrics.json') as response:
+                assert json.loads(response.read())['metrics']['test_total'][0]['value'] == 1
+        finally:
+            server.stop()
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = os.path.join(tmpdir, 'metrics.json')
+            writer = metrics.SnapshotWriter(filename, interval=60, registry=registry).start()
+            writer.stop()
+            with open(filename) as file:
+                assert json.load(file)['metrics']['test_total'][0]['value'] == 1
+
+    def test_listener_counts(self):
+        received = metrics.TWEETS_RECEIVED.get()
+        retweets = metrics.TWEETS_REJECTED.get(stage='classify', rule='retweet')
+        no_match = metrics.TWEETS_REJECTED.get(stage='classify', rule='no_match')
+        matched = metrics.TWEETS_MATCHED.get(start='why am')
+
+        raw_tweets = (
+            [json.dumps({'text': 'Why am I awake?'})] * 6
+            + [json.dumps({'text': 'Why am I awake?', 'retweeted_status': {}})] * 3
+            + [json.dumps({'text': 'Nothing to see here'})] * 5
+        )
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=7, write_to_file=False)
+        for data in raw_tweets:
+            listener.on_data(data)
+        listener.stop()
+
+        assert metrics.TWEETS_RECEIVED.get() - received == 14
+        assert metrics.TWEETS_REJECTED.get(stage='classify', rule='retweet') - retweets == 3
+        assert metrics.TWEETS_REJECTED.get(stage='classify', rule='no_match') - no_match == 5
+        assert metrics.TWEETS_MATCHED.get(start='why am') - matched == 6
+        assert metrics.BATCH_SECONDS.get_count(stage='total') >= 2
+
+    def test_report_with_uneven_batches(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=7, write_to_file=False)
+        reports = []
+        listener.report_tweet_count = lambda: reports.append(listener.total_tweet_counter)
+
+        # 7 doesn't divide 1000, but passing each multiple still reports once
+        for _ in range(300):
+            listener.process_batch([json.dumps({'text': 'Nothing to see here'})] * 7)
+        assert reports == [1001, 2002]
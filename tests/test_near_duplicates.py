@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+
+from question_seeker import near_duplicates
+from scripts import text_extractor
+
+
+class TestNearDuplicates:
+    @classmethod
+    def setup_class(cls):
+        cls.texts = [
+            'How do I bake bread at home without yeast and without an oven at all?',
+            'What should I watch tonight?',
+            # Same text once normalized
+            'how do i bake bread at home without yeast and without an oven at all??? https://t.co/abc @someone',
+            # One word added
+            'How do I bake bread at home without any yeast and without an oven at all?',
+            'Why is the sky blue?',
+        ]
+
+    def test_popcount(self):
+        values = np.array([0, 1, 0xFF, 2 ** 64 - 1], dtype=np.uint64)
+        assert near_duplicates.popcount(values).tolist() == [0, 1, 8, 64]
+
+    def test_simhash(self):
+        signatures = near_duplicates.simhash(self.texts, block_size=2)
+        distances = near_duplicates.popcount(signatures ^ signatures[0]).tolist()
+
+        assert distances[0] == distances[2] == 0
+        assert distances[3] <= 8
+        assert distances[1] > 16 and distances[4] > 16
+        assert near_duplicates.simhash(['', '!!!']).tolist() == [0, 0]
+
+    def test_cluster(self):
+        # Each signature is 4 bits away from the one before it, so all of them chain into one cluster
+        signatures = np.array([0, 0xF, 0xFF, 0xFFF, 2 ** 64 - 1], dtype=np.uint64)
+        assert near_duplicates.cluster(signatures, max_distance=4).tolist() == [0, 0, 0, 0, 4]
+        assert near_duplicates.cluster(signatures, max_distance=3).tolist() == [0, 1, 2, 3, 4]
+
+    def test_drop_near_duplicates(self):
+        df = pd.DataFrame({'tweet_text': self.texts, 'tweet_id': [str(i) for i in range(len(self.texts))]})
+        assert near_duplicates.drop_near_duplicates(df).tweet_id.tolist() == ['0', '1', '4']
+        assert near_duplicates.drop_near_duplicates(df, max_distance=0).tweet_id.tolist() == ['0', '1', '3', '4']
+
+    def test_filter_for_curation(self):
+        df = pd.DataFrame({'tweet_text': self.texts, 'tweet_id': [str(i) for i in range(len(self.texts))]})
+        assert text_extractor.filter_for_curation(df).tweet_id.tolist() == ['0', '4']
+        assert text_extractor.filter_for_curation(df, max_distance=None).tweet_id.tolist() == ['0', '2', '3', '4']
@@ -0,0 +1,77 @@
+import json
+import os
+
+from question_seeker import processing
+from question_seeker.prefilter import RawPreFilter
+
+
+def compact(tweet: dict) -> str:
+    # Twitter sends JSON without whitespace between keys and values
+    return json.dumps(tweet, separators=(',', ':'))
+
+
+class TestPreFilter:
+    @classmethod
+    def setup_class(cls):
+        base = {'in_reply_to_user_id': None, 'entities': {'hashtags': [], 'user_mentions': [], 'urls': []}}
+        cls.question = compact({**base, 'id_str': '1', 'text': 'Why am I so tired?'})
+        cls.retweet = compact({**base, 'id_str': '2', 'text': 'RT why am I so tired?', 'retweeted_status': {}})
+        cls.reply = compact({**base, 'id_str': '3', 'text': 'why am I here?', 'in_reply_to_user_id': 12})
+        cls.statement = compact({**base, 'id_str': '4', 'text': 'Why am I even surprised.'})
+        cls.quoting_reply = compact({
+            **base,
+            'id_str': '5',
+            'text': 'Why am I reading this?',
+            'quoted_status': {'in_reply_to_user_id': 99},
+        })
+        cls.raw_list = [cls.question, cls.retweet, cls.reply, cls.statement, cls.quoting_reply]
+
+        cls.tweet_handler_map = processing.get_tweet_handler_map(['personal'], 10, write_to_file=False)
+        cls.matcher = processing.QuestionMatcher(cls.tweet_handler_map)
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        if os.path.exists('personal_tweets.json'):
+            os.remove('personal_tweets.json')
+
+    def test_check(self):
+        prefilter = RawPreFilter()
+        assert prefilter.check(self.question) is None
+        assert prefilter.check(self.retweet) == 'retweet'
+        assert prefilter.check(self.reply) == 'reply'
+        assert prefilter.check(self.statement) == 'no_question'
+        assert prefilter.check(self.quoting_reply) is None
+        assert prefilter.check(self.retweet.encode('utf-8')) == 'retweet'
+
+    def test_check_default_separators(self):
+        # Recorded files and the corpus generator write json.dumps() output, with a space after each colon
+        prefilter = RawPreFilter()
+        for raw in self.raw_list:
+            assert prefilter.check(json.dumps(json.loads(raw))) == prefilter.check(raw)
+
+    def test_default_separators_match_full_path(self):
+        prefilter = RawPreFilter(verify=True, matcher=self.matcher)
+        survivors = prefilter.filter([json.dumps(json.loads(raw)) for raw in self.raw_list])
+        assert len(survivors) == 2
+        assert prefilter.counts['false_reject'] == 0
+
+    def test_filter_counts(self):
+        prefilter = RawPreFilter()
+        survivors = prefilter.filter(self.raw_list)
+        assert survivors == [self.question, self.quoting_reply]
+        assert prefilter.counts['received'] == 5
+        assert prefilter.counts['passed'] == 2
+        assert prefilter.rejection_rates()['reply'] == 0.2
+
+    def test_matches_full_path(self):
+        prefilter = RawPreFilter(verify=True, matcher=self.matcher)
+        prefilter.filter(self.raw_list)
+        assert prefilter.counts['false_reject'] == 0
+
+        # Anything the full path keeps has to survive the pre-filter
+        for raw in self.raw_list:
+            if processing.classify(json.loads(raw), self.matcher):
+                assert prefilter.check(raw) is None
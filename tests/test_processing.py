@@ -1,5 +1,7 @@
+import json
 import os
 
+from benchmarks.corpus import CorpusGenerator
 from question_seeker import (
     q_starts,
     processing,
@@ -35,7 +37,8 @@ class TestProcessing:
             'capacity_tweets.json',
             'personal_tweets.json',
         ]:
-            os.remove(filename)
+            if os.path.exists(filename):
+                os.remove(filename)
 
     def test_tweet_handler_map(self):
         tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, self.batch_size, write_to_file=False)
@@ -52,3 +55,74 @@ class TestProcessing:
         assert len(tweet_handler_map['why am'].bucket) == 4
         assert len(tweet_handler_map['why can'].bucket) == 1
 
+    def test_question_matcher(self):
+        tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, self.batch_size, write_to_file=False)
+        matcher = processing.QuestionMatcher(tweet_handler_map)
+        assert matcher.match(self.pass1['text']) == ('why am', tweet_handler_map['why am'])
+        assert matcher.match(self.pass3['text']) == ('y am', tweet_handler_map['y am'])
+        assert matcher.match(self.pass4['text']) == ("why can't", tweet_handler_map["why can't"])
+        assert matcher.match(self.fail1['text']) is None
+        assert matcher.match(self.fail3['text']) is None
+
+    def test_question_matcher_all_starts(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['all'], self.batch_size, write_to_file=False)
+        matcher = processing.QuestionMatcher(tweet_handler_map)
+        for start in q_starts.all_starts:
+            assert matcher.match(f'So {start.upper()} we even bother?')[0] == start
+            assert matcher.match(f'So{start} we even bother?') is None
+
+    def test_classifier_pool(self):
+        raw_list = [json.dumps(tweet) for tweet in self.tweet_list] * 3
+        tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, 100, write_to_file=False)
+        pool = processing.ClassifierPool(tweet_handler_map, processes=2)
+        try:
+            pool.process_tweets(raw_list)
+        finally:
+            pool.close()
+
+        personal = [json.dumps(x) for x in [self.pass1, self.pass2, self.pass3, self.pass5]] * 3
+        assert tweet_handler_map['why am'].bucket == personal
+        assert tweet_handler_map['why can'].bucket == [json.dumps(self.pass4)] * 3
+
+    def test_classifier_pool_malformed(self):
+        # A bad payload is skipped instead of failing the whole batch
+        raw_list = [json.dumps(self.pass1), '{"text": "Why am I cut off', json.dumps(self.pass2)]
+        tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, 100, write_to_file=False)
+        pool = processing.ClassifierPool(tweet_handler_map, processes=2)
+        try:
+            pool.process_tweets(raw_list)
+        finally:
+            pool.close()
+
+        assert tweet_handler_map['why am'].bucket == [raw_list[0], raw_list[2]]
+        assert processing._classify_lines(raw_list[1:2]) == ([], {('rejected', 'malformed'): 1})
+
+    def test_write_tweets_empties_bucket(self):
+        tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, self.batch_size, write_to_file=False)
+        processing.process_tweets(self.tweet_list, tweet_handler_map, force_write=True)
+        assert tweet_handler_map['why am'].bucket == []
+
+        # Nothing is written when not writing to file
+        assert os.path.getsize('personal_tweets.json') == 0
+
+    def test_synthetic_corpus(self):
+        tweet_handler_map = processing.get_tweet_handler_map(self.track_list_ids, self.batch_size, write_to_file=False)
+        matcher = processing.QuestionMatcher(tweet_handler_map)
+
+        # Every synthetic question with a tracked start is matched, through the full tweet layout
+        generator = CorpusGenerator(
+            retweet_ratio=0, reply_ratio=0, link_ratio=0, extended_ratio=0.5, emoji_density=2,
+            match_rates={'personal': 1.0}, seed=1,
+        )
+        tweets = [json.loads(raw) for raw in generator.generate(200)]
+        assert all('entities' in tweet for tweet in tweets)
+        assert any('extended_tweet' in tweet for tweet in tweets)
+        assert all(processing.classify(tweet, matcher)[0] in q_starts.personal_starts for tweet in tweets)
+
+        # And each feature ratio turns into the matching rejection reason
+        generator = CorpusGenerator(retweet_ratio=1, match_rates={'personal': 1.0})
+        assert {processing.get_rejection_reason(json.loads(raw)) for raw in generator.generate(50)} == {'retweet'}
+        generator = CorpusGenerator(retweet_ratio=0, reply_ratio=0, link_ratio=1, match_rates={'personal': 1.0})
+        assert {processing.get_rejection_reason(json.loads(raw)) for raw in generator.generate(50)} == {'links'}
+        generator = CorpusGenerator(retweet_ratio=0, reply_ratio=0, link_ratio=0, match_rates={})
+        assert not any(processing.classify(json.loads(raw), matcher) for raw in generator.generate(200))
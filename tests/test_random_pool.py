@@ -0,0 +1,95 @@
+import json
+import random
+import time
+
+from flask import Flask
+
+from backend.api import api as backend_api
+from backend.api import random_pool
+from backend.api.models import (
+    db,
+    Tweet,
+)
+
+
+class TestRandomPool:
+    @classmethod
+    def setup_class(cls):
+        cls.tweets = [{'tweet_id': str(i), 'tweet_text': f'Why am I {i}?'} for i in range(50)]
+        cls.latest = 50
+
+    def load(self, count):
+        return random.sample(self.tweets, min(count, len(self.tweets)))
+
+    def test_take(self):
+        pool = random_pool.RandomPool(self.load, lambda: self.latest, size=30, rng=random.Random(0))
+        misses = random_pool.POOL_MISSES.get()
+        assert pool.take(10) is None
+        assert random_pool.POOL_MISSES.get() == misses + 1
+
+        pool.refresh()
+        hits = random_pool.POOL_HITS.get()
+        for _ in range(20):
+            tweets = json.loads(pool.take(10))
+            assert len(tweets) == 10
+            assert len({tweet['tweet_id'] for tweet in tweets}) == 10
+        assert random_pool.POOL_HITS.get() == hits + 20
+
+        # Asking for more than the pool holds gives the whole pool
+        assert len(json.loads(pool.take(100))) == 30
+
+    def test_background_refresh(self):
+        latest = [50]
+        pool = random_pool.RandomPool(
+            self.load, lambda: latest[0], size=30, refresh_interval=3600, check_interval=0.01,
+        ).start()
+        try:
+            deadline = time.time() + 5
+            while not pool.items and time.time() < deadline:
+                time.sleep(0.01)
+            assert len(pool.items) == 30
+
+            new_rows = random_pool.POOL_REFRESHES.get(reason='new_rows')
+            latest[0] = 51
+            while random_pool.POOL_REFRESHES.get(reason='new_rows') == new_rows and time.time() < deadline:
+                time.sleep(0.01)
+            assert random_pool.POOL_REFRESHES.get(reason='new_rows') == new_rows + 1
+            assert pool.seen_id == 51
+        finally:
+            pool.stop()
+
+    def test_random_endpoint(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        backend_api.api.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Tweet(tweet_text=f'Why am I {i}?', tweet_id=str(i), tweet_timestamp='', permalink_slug=f'S{i:06d}')
+                for i in range(1000)
+            ])
+            db.session.commit()
+
+            pool = random_pool.RandomPool(
+                lambda count: [{'tweet_id': tweet.tweet_id} for tweet in backend_api.sample_tweets(count)],
+                backend_api.latest_tweet_id,
+                size=500,
+            )
+            pool.refresh()
+            random_pool.POOL = pool
+            try:
+                client = app.test_client()
+                hits = random_pool.POOL_HITS.get()
+                tweets = client.get('/random').get_json()
+                assert random_pool.POOL_HITS.get() == hits + 1
+                metrics = client.get('/metrics').get_data(as_text=True)
+            finally:
+                random_pool.POOL = None
+
+        assert len(tweets) == backend_api.RANDOM_SAMPLE_SIZE
+        assert len({tweet['tweet_id'] for tweet in tweets}) == backend_api.RANDOM_SAMPLE_SIZE
+        assert 'qs_random_pool_hits_total' in metrics
+        assert 'qs_random_pool_size 500' in metrics
@@ -0,0 +1,66 @@
+import json
+import os
+import shutil
+import tempfile
+import time
+
+from question_seeker import processing
+from question_seeker import stream as streamer
+from question_seeker.replay import ReplayStream
+
+
+class TestReplay:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.filename = os.path.join(cls.dirname, 'recorded_tweets.json')
+        cls.tweets = [
+            {'text': f'Why am I tweet number {i}?', 'timestamp_ms': str(1584198000000 + 10 * i)} for i in range(20)
+        ]
+        with open(cls.filename, 'w', encoding='utf-8') as file:
+            for tweet in cls.tweets:
+                file.write(json.dumps(tweet) + '\r\n')
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+        for filename in [
+            'personal_tweets.json',
+            'tweet_counter.txt',
+        ]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def replay(self, rate, **listener_kwargs):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=5, write_to_file=False, **listener_kwargs)
+        replay_stream = ReplayStream(self.filename, listener, rate)
+        return replay_stream.filter(), listener
+
+    def test_replay_max(self):
+        stats, listener = self.replay('max', num_workers=2)
+        assert stats['tweets'] == 20
+        assert stats['tweets_per_second'] > 0
+        assert listener.total_tweet_counter == 20
+
+    def test_replay_fixed_rate(self):
+        start = time.time()
+        stats, _ = self.replay(200)
+        assert stats['tweets'] == 20
+        assert time.time() - start >= 19 / 200
+
+    def test_replay_realtime(self):
+        start = time.time()
+        stats, _ = self.replay('realtime')
+        assert stats['tweets'] == 20
+        assert time.time() - start >= 19 * 10 / 1000
+
+    def test_stream_source(self):
+        result = streamer.stream(
+            'personal', logger_filename=os.path.join(self.dirname, 'qs.log'), write_to_file=False,
+            source=f'replay:{self.filename}',
+        )
+        assert result is True
@@ -0,0 +1,102 @@
+from collections import Counter
+import random
+
+from flask import Flask
+
+from backend.api import api as backend_api
+from backend.api import sampling
+from backend.api.models import (
+    db,
+    Tweet,
+)
+
+
+class Row:
+    def __init__(self, id):
+        self.id = id
+
+
+class TestSampling:
+    @classmethod
+    def setup_class(cls):
+        # Ids with a large gap and scattered deleted rows
+        rng = random.Random(0)
+        cls.ids = [i for i in range(1, 2001) if rng.random() < 0.7] + list(range(10001, 10501))
+        cls.rows = {i: Row(i) for i in cls.ids}
+        cls.lookups = []
+
+    def fetch(self, ids):
+        self.lookups.append(len(ids))
+        return [self.rows[i] for i in ids if i in self.rows]
+
+    def test_sample(self):
+        sample = sampling.sample_by_id(self.fetch, min(self.ids), max(self.ids), 200, rng=random.Random(1))
+        assert len(sample) == 200
+        assert len({row.id for row in sample}) == 200
+
+    def test_uniform(self):
+        # Rows right after the big gap are no more likely than any others
+        counts = Counter()
+        rng = random.Random(2)
+        for _ in range(300):
+            sample = sampling.sample_by_id(self.fetch, min(self.ids), max(self.ids), 20, rng=rng)
+            counts.update('after_gap' if row.id > 10000 else 'before_gap' for row in sample)
+        share = counts['after_gap'] / sum(counts.values())
+        expected = 500 / len(self.ids)
+        assert abs(share - expected) < 0.03
+
+    def test_small_table(self):
+        self.lookups.clear()
+        sample = sampling.sample_by_id(self.fetch, 1, 100, 200)
+        assert sorted(row.id for row in sample) == [i for i in self.ids if i <= 100]
+        assert len(self.lookups) == 1
+
+    def test_small_table_by_range(self):
+        ranges = []
+
+        def fetch_range(low, high):
+            ranges.append((low, high))
+            return [self.rows[i] for i in range(low, high + 1) if i in self.rows]
+
+        self.lookups.clear()
+        sample = sampling.sample_by_id(self.fetch, 1, 2000, 1000, fetch_range=fetch_range)
+        assert len(sample) == 1000
+        assert ranges == [(1, 2000)]
+        assert not self.lookups
+
+    def test_lookups_chunked(self):
+        # Every lookup stays within SQLite's limit on bound parameters
+        self.lookups.clear()
+        sampling.sample_by_id(self.fetch, 1, 2000, 1000)
+        sampling.sample_by_id(self.fetch, min(self.ids), max(self.ids), 2000, rng=random.Random(3))
+        assert len(self.lookups) > 2
+        assert max(self.lookups) <= sampling.MAX_IDS_PER_FETCH
+
+    def test_too_sparse(self):
+        sample = sampling.sample_by_id(lambda ids: [], 1, 10 ** 9, 200, max_rounds=3)
+        assert sample is None
+        assert sampling.sample_by_id(self.fetch, None, None, 200) == []
+
+
+class TestRandomTweets:
+    def test_random_endpoint(self):
+        app = Flask(__name__)
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(app)
+        backend_api.api.init_app(app)
+
+        with app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Tweet(tweet_text=f'Why am I {i}?', tweet_id=str(i), tweet_timestamp='', permalink_slug=f'S{i:06d}')
+                for i in range(1000)
+            ])
+            db.session.commit()
+
+            tweets = app.test_client().get('/random').get_json()
+            # A sample as big as the random pool's goes over SQLite's limit of 999 bound parameters if unchunked
+            pool_sample = backend_api.sample_tweets(5000)
+        assert len(tweets) == backend_api.RANDOM_SAMPLE_SIZE
+        assert len({tweet['tweet_id'] for tweet in tweets}) == backend_api.RANDOM_SAMPLE_SIZE
+        assert len(pool_sample) == 1000
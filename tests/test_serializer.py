@@ -0,0 +1,52 @@
+import json
+
+from flask import Flask
+
+from backend.api import api as backend_api
+from backend.api.models import (
+    db,
+    to_dict,
+    Tweet,
+    TWEET_SERIALIZER,
+)
+
+
+class TestSerializer:
+    @classmethod
+    def setup_class(cls):
+        cls.app = Flask(__name__)
+        cls.app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+        cls.app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+        db.init_app(cls.app)
+        backend_api.api.init_app(cls.app)
+
+        with cls.app.app_context():
+            db.create_all()
+            db.session.add_all([
+                Tweet(
+                    tweet_text=f'Why am I 🍕 {i}?',
+                    tweet_id=str(i),
+                    tweet_timestamp='Tue Apr 14 12:00:00 +0000 2020',
+                    loc_name='Boston, MA' if i % 2 else None,
+                    country='US' if i % 2 else None,
+                    permalink_slug=f'S{i:06d}',
+                )
+                for i in range(20)
+            ])
+            db.session.commit()
+
+    def test_same_as_to_dict(self):
+        with self.app.app_context():
+            expected = [to_dict(tweet) for tweet in Tweet.query.order_by(Tweet.id).all()]
+            rows = TWEET_SERIALIZER.query().order_by(Tweet.id).all()
+            assert [TWEET_SERIALIZER.to_dict(row) for row in rows] == expected
+            assert json.loads(TWEET_SERIALIZER.dumps(rows)) == expected
+            # Keys come out in the same order too
+            assert [list(TWEET_SERIALIZER.to_dict(row)) for row in rows] == [list(tweet) for tweet in expected]
+
+    def test_permalink(self):
+        with self.app.app_context():
+            expected = to_dict(Tweet.query.filter_by(permalink_slug='S000003').one())
+            response = self.app.test_client().get('/tweet/S000003')
+        assert response.mimetype == 'application/json'
+        assert response.get_json() == [expected]
@@ -1,3 +1,8 @@
+import json
+import os
+import tempfile
+
+from question_seeker import metrics, processing
 from question_seeker import stream as streamer
 
 
@@ -5,3 +10,148 @@ class TestStreamer:
     def test_stream(self):
         stream_result = streamer.stream('all', time_limit=1, write_to_file=False)
         assert stream_result is True
+
+
+class TestListener:
+    @classmethod
+    def setup_class(cls):
+        cls.matching = [json.dumps({'text': f'Why am I awake at {i} am?'}) for i in range(25)]
+        cls.non_matching = [json.dumps({'text': 'Nothing to see here'}) for _ in range(5)]
+        cls.raw_tweets = cls.matching + cls.non_matching
+        cls.batch_size = 10
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        for filename in [
+            'personal_tweets.json',
+            'tweet_counter.txt',
+        ]:
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_inline(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=self.batch_size, write_to_file=False)
+        for data in self.raw_tweets:
+            listener.on_data(data)
+
+        assert listener.total_tweet_counter == 30
+        assert len(tweet_handler_map['why am'].bucket) == 25
+        assert listener.queue_depth == 0
+
+    def test_queued(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(
+            tweet_handler_map, batch_size=self.batch_size, write_to_file=False, num_workers=2,
+        )
+        for data in self.raw_tweets:
+            listener.on_data(data)
+        listener.stop_workers()
+
+        assert listener.total_tweet_counter == 30
+        assert listener.dropped_count == 0
+        assert listener.queue_depth == 0
+        assert sorted(tweet_handler_map['why am'].bucket) == sorted(self.matching)
+        listener.stop()
+
+    def test_bad_payloads_dont_stop_workers(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=5, write_to_file=False, num_workers=1)
+        errors = metrics.BATCH_ERRORS.get(step='process')
+        malformed = metrics.TWEETS_REJECTED.get(stage='decode', rule='malformed')
+
+        # Malformed JSON is skipped on its own. Valid JSON that isn't a tweet fails its batch, and the worker
+        # carries on with the next one.
+        for data in self.matching[:3] + ['{"text": "Why am I cut off'] + ['[]'] + self.matching[3:]:
+            listener.on_data(data)
+        listener.stop_workers()
+
+        assert listener.workers == []
+        assert metrics.TWEETS_REJECTED.get(stage='decode', rule='malformed') == malformed + 1
+        assert metrics.BATCH_ERRORS.get(step='process') == errors + 1
+        # Everything queued after the bad payloads still gets written
+        assert tweet_handler_map['why am'].bucket[-len(self.matching[3:]):] == self.matching[3:]
+        listener.stop()
+
+    def test_queue_full_drops(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(
+            tweet_handler_map, batch_size=1, write_to_file=False, num_workers=1, queue_size=2,
+        )
+
+        # Stall the worker so the queue backs up
+        with listener.process_lock:
+            for data in self.raw_tweets:
+                listener.on_data(data)
+            assert listener.queue_depth <= 2
+        listener.stop()
+
+        assert listener.dropped_count >= len(self.raw_tweets) - 3
+        assert listener.total_tweet_counter + listener.dropped_count == len(self.raw_tweets)
+
+    def test_spill_over_budget(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            spill_file = os.path.join(tmpdir, 'overflow.spill')
+            listener = streamer.Listener(
+                tweet_handler_map, batch_size=100, write_to_file=False, num_workers=1,
+                memory_budget=3 * len(self.raw_tweets[0]), spill_file=spill_file,
+            )
+            written = []
+            tweet_handler_map['why am'].write_tweets = lambda: written.extend(tweet_handler_map['why am'].bucket)
+
+            # Stall the worker so the backlog goes over budget
+            with listener.process_lock:
+                for data in self.raw_tweets:
+                    listener.on_data(data)
+                assert listener.queue_depth <= 3
+                assert listener.spill.pending >= len(self.raw_tweets) - 4
+            listener.stop()
+
+            # Nothing was dropped, everything came back out in order, and the drained file was cleaned up
+            assert listener.dropped_count == 0
+            assert listener.total_tweet_counter == len(self.raw_tweets)
+            assert listener.spill.drained_count == listener.spill.spilled_count > 0
+            assert written == self.matching
+            assert not os.path.exists(spill_file)
+
+    def test_process_pool(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(
+            tweet_handler_map, batch_size=self.batch_size, write_to_file=False, num_workers=1, processes=2,
+        )
+        for data in self.raw_tweets:
+            listener.on_data(data)
+        listener.stop_workers()
+
+        assert listener.total_tweet_counter == 30
+        assert tweet_handler_map['why am'].bucket == self.matching
+        listener.stop()
+
+    def test_prefilter(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(
+            tweet_handler_map, batch_size=self.batch_size, write_to_file=False, verify_prefilter=True,
+        )
+        for data in self.raw_tweets:
+            listener.on_data(data)
+
+        assert listener.total_tweet_counter == 30
+        assert listener.prefilter.counts['no_question'] == 5
+        assert listener.prefilter.counts['false_reject'] == 0
+        assert len(tweet_handler_map['why am'].bucket) == 25
+
+    def test_raw_passthrough(self):
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        listener = streamer.Listener(tweet_handler_map, batch_size=2, write_to_file=False)
+        payloads = [
+            '{"text":"Why am I craving \\ud83c\\udf55 again?","id_str":"1"}',
+            '{"text": "why am I awake at 3 ☕?", "id_str": "2"}',
+        ]
+        for payload in payloads:
+            listener.on_data(payload + '\r\n')
+
+        assert tweet_handler_map['why am'].bucket == payloads
@@ -0,0 +1,96 @@
+import os
+import random
+import shutil
+import tempfile
+
+from benchmarks.corpus import CorpusGenerator
+from question_seeker import codec, utils
+from scripts import text_extractor
+
+
+class TestTextExtractor:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.input_fn = os.path.join(cls.dirname, 'why_tweets.json')
+        lines = CorpusGenerator(match_rates={'personal': 0.5}, seed=3).generate(500)
+        # A tweet seen twice, in different chunks
+        lines.append(lines[0])
+        with open(cls.input_fn, 'w', encoding='utf-8') as file:
+            file.write('\n'.join(lines) + '\n')
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def extract(self, name: str, **kwargs) -> dict:
+        output_fn = os.path.join(self.dirname, name, 'why_texts.json')
+        os.makedirs(os.path.dirname(output_fn))
+        random.seed(0)
+        text_extractor.extract_tweet_info(self.input_fn, output_fn, **kwargs)
+        return {
+            'all': codec.load(os.path.join(self.dirname, name, 'all_tweets', 'why_texts_all.json')),
+            'curation': codec.load(os.path.join(self.dirname, name, 'pending_curation', 'why_texts.json')),
+        }
+
+    def test_streaming_matches_whole_file(self):
+        whole = self.extract('whole')
+        # A chunk size larger than the file finds the same near duplicates as reading it whole
+        assert self.extract('one_chunk', chunk_size=1000) == whole
+
+        streamed = self.extract('streamed', chunk_size=64)
+        assert streamed['all'] == whole['all']
+        assert len(whole['all']) == 500
+        assert {t['tweet_id'] for t in whole['curation']} <= {t['tweet_id'] for t in streamed['curation']}
+
+    def test_streaming_append(self):
+        output_fn = os.path.join(self.dirname, 'append', 'why_texts.json')
+        os.makedirs(os.path.dirname(output_fn))
+        text_extractor.extract_tweet_info(self.input_fn, output_fn, make_copies=False, chunk_size=100)
+        text_extractor.extract_tweet_info(self.input_fn, output_fn, append=True, make_copies=False, chunk_size=100)
+
+        tweets = codec.load(output_fn)
+        assert len(tweets) == 500
+        assert len({t['tweet_id'] for t in tweets}) == 500
+
+    def test_streaming_jsonl(self):
+        output_fn = os.path.join(self.dirname, 'jsonl', 'why_texts.jsonl')
+        os.makedirs(os.path.dirname(output_fn))
+        for append in [False, True]:
+            text_extractor.extract_tweet_info(self.input_fn, output_fn, append=append, chunk_size=100)
+
+        all_tweets = utils.encoded_read(os.path.join(self.dirname, 'jsonl', 'all_tweets', 'why_texts_all.jsonl'))
+        assert len(all_tweets) == 500
+        assert all_tweets.tweet_id.is_unique
+
+    def test_failed_run_leaves_outputs(self):
+        bad_input_fn = os.path.join(self.dirname, 'bad_tweets.json')
+        with open(self.input_fn, encoding='utf-8') as file, open(bad_input_fn, 'w', encoding='utf-8') as bad_file:
+            bad_file.write(file.read() + '{"not json\n')
+
+        for output_name in ['failed/why_texts.json', 'failed/why_texts.jsonl']:
+            output_fn = os.path.join(self.dirname, output_name)
+            os.makedirs(os.path.dirname(output_fn), exist_ok=True)
+            text_extractor.extract_tweet_info(self.input_fn, output_fn, make_copies=False, chunk_size=100)
+            with open(output_fn, 'rb') as file:
+                before = file.read()
+
+            # Neither appending nor overwriting touches the existing output when the input turns out to be bad
+            for append in [True, False]:
+                try:
+                    text_extractor.extract_tweet_info(
+                        bad_input_fn, output_fn, append=append, make_copies=False, chunk_size=100,
+                    )
+                except Exception:
+                    pass
+                else:
+                    raise AssertionError('Extracting a bad file should fail')
+
+                with open(output_fn, 'rb') as file:
+                    assert file.read() == before
+            assert len(utils.encoded_read(output_fn)) == 500
+            # No temporary files or id stores are left behind
+            assert not [name for name in os.listdir(os.path.dirname(output_fn)) if '.tmp' in name or '.ids' in name]
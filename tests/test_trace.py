@@ -0,0 +1,57 @@
+import json
+import os
+import tempfile
+
+from question_seeker import processing, trace
+
+
+class TestTrace:
+    @classmethod
+    def setup_class(cls):
+        cls.tweets = (
+            [{'id_str': str(i), 'text': f'Why am I awake at {i} am?'} for i in range(10)]
+            + [{'id_str': 'rt', 'text': 'Why am I awake?', 'retweeted_status': {}}]
+            + [{'id_str': 'none', 'text': 'Nothing to see here'}]
+        )
+        cls.tmpdir = tempfile.TemporaryDirectory()
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        trace.disable()
+        cls.tmpdir.cleanup()
+        if os.path.exists('personal_tweets.json'):
+            os.remove('personal_tweets.json')
+
+    def run_traced(self, filename: str, **kwargs) -> list:
+        tweet_handler_map = processing.get_tweet_handler_map(['personal'], 100, write_to_file=False)
+        trace.enable(filename, **kwargs)
+        try:
+            processing.process_tweets(self.tweets, tweet_handler_map)
+        finally:
+            trace.disable()
+
+        with open(filename, encoding='utf-8') as file:
+            return [json.loads(line) for line in file]
+
+    def test_off_by_default(self):
+        assert trace.TRACER is None
+
+    def test_trace_all(self):
+        records = self.run_traced(os.path.join(self.tmpdir.name, 'all.jsonl'))
+        assert len(records) == 12
+        assert records[0] == {
+            'time': records[0]['time'], 'id': '0', 'outcome': 'matched', 'start': 'why am',
+            'text': 'Why am I awake at 0 am?',
+        }
+        assert records[10]['outcome'] == 'retweet'
+        assert records[11]['outcome'] == 'no_match'
+
+    def test_sampling(self):
+        records = self.run_traced(os.path.join(self.tmpdir.name, 'sampled.jsonl'), sample_every=5)
+        assert [record['id'] for record in records] == ['0', '5', 'rt']
+
+        records = self.run_traced(os.path.join(self.tmpdir.name, 'matched.jsonl'), sample_every=3, matched_only=True)
+        assert [record['id'] for record in records] == ['0', '3', '6', '9']
@@ -0,0 +1,70 @@
+import os
+import shutil
+import tempfile
+
+import pandas as pd
+
+from question_seeker import codec, utils
+from question_seeker.tweet_store import TweetStore
+from scripts import text_extractor
+
+
+class TestTweetStore:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.tweets = [{'tweet_id': str(1250000000000000000 + i), 'tweet_text': f'Why am I {i}?'} for i in range(100)]
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def test_append(self):
+        filename = os.path.join(self.dirname, 'append_texts.jsonl')
+        store = TweetStore(filename)
+        assert store.append(self.tweets[:60]) == 60
+        # Overlapping batch, with a repeat inside the batch
+        assert store.append(self.tweets[50:70] + self.tweets[65:66]) == 10
+        assert store.append(pd.DataFrame(self.tweets[70:])) == 30
+        assert store.append(self.tweets) == 0
+
+        assert len(store) == 100
+        assert store.read().to_dict(orient='records') == self.tweets
+        assert store.contains(['1', self.tweets[99]['tweet_id']]).tolist() == [False, True]
+
+        # Reopening picks the ids up from the sidecars
+        store = TweetStore(filename)
+        assert len(store) == 100
+        assert store.append(self.tweets[:10]) == 0
+
+    def test_rebuild(self):
+        filename = os.path.join(self.dirname, 'rebuild_texts.jsonl')
+        TweetStore(filename).append(self.tweets[:10])
+
+        # Tweets written without their ids, as after a crash
+        with open(filename, 'a', encoding='utf-8') as file:
+            file.write(codec.dumps(self.tweets[10]) + '\n')
+
+        store = TweetStore(filename)
+        assert len(store) == 11
+        assert store.append(self.tweets[:20]) == 9
+
+        store = TweetStore(filename, overwrite=True)
+        assert len(store) == 0
+        assert store.append(self.tweets[:5]) == 5
+
+    def test_write_tweets(self):
+        filename = os.path.join(self.dirname, 'extracted_texts.jsonl')
+        text_extractor.write_tweets(pd.DataFrame(self.tweets[:50]), filename)
+        text_extractor.write_tweets(pd.DataFrame(self.tweets[40:]), filename, append=True)
+        assert utils.encoded_read(filename).to_dict(orient='records') == self.tweets
+
+        # Overwriting replaces the store and its ids, leaving no temporary files behind
+        text_extractor.write_tweets(pd.DataFrame(self.tweets[:10]), filename)
+        store = TweetStore(filename)
+        assert len(store) == 10
+        assert store.append(self.tweets[:20]) == 10
+        assert not [name for name in os.listdir(self.dirname) if name.endswith('.tmp')]
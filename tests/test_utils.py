@@ -1,5 +1,10 @@
+import os
+import shutil
+import tempfile
+import threading
+
 import tweepy
-from question_seeker import utils
+from question_seeker import codec, utils
 
 
 class TestUtils:
@@ -14,3 +19,210 @@ class TestUtils:
     def test_send_email(self):
         status = utils.send_email('Keep up the good work! :)')
         assert status == 200
+
+
+class TestRotatingFileWrapper:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def test_rotate_on_size(self):
+        filename = os.path.join(self.dirname, 'size_tweets.json')
+        wrapper = utils.RotatingFileWrapper(filename, max_bytes=20, compression='gzip')
+        lines = [f'{{"text": "Why am I line {i}?"}}' for i in range(5)]
+        for line in lines:
+            wrapper.write(line)
+        wrapper.close()
+
+        manifest = codec.load(filename + '.manifest')
+        assert len(manifest) == 4
+        assert all(entry['segment'].endswith('.json.gz') for entry in manifest)
+
+        # Segments can be read straight from their compressed form, and nothing is lost or reordered
+        read_lines = []
+        for entry in manifest:
+            assert utils.is_json_file(entry['segment'])
+            with utils.open_text(os.path.join(self.dirname, entry['segment'])) as file:
+                read_lines.extend(file.read().splitlines())
+        with utils.open_text(filename) as file:
+            read_lines.extend(file.read().splitlines())
+        assert read_lines == lines
+
+    def test_archive_in_background(self):
+        filename = os.path.join(self.dirname, 'background_tweets.json')
+        wrapper = utils.RotatingFileWrapper(filename, max_bytes=10, compression='lzma')
+
+        # Hold up the archiver thread, as a long compression would
+        release = threading.Event()
+        wrapper.archiver.submit(release.wait)
+        wrapper.write('{"text": "Why am I first?"}')
+        segment = wrapper.rotate()
+
+        # Writing carries on while the segment waits to be compressed
+        wrapper.write('{"text": "Why am I second?"}')
+        assert segment.endswith('.json.xz')
+        assert not os.path.exists(filename + '.manifest')
+
+        release.set()
+        wrapper.close()
+        manifest = codec.load(filename + '.manifest')
+        assert [os.path.join(self.dirname, entry['segment']) for entry in manifest] == [segment]
+        assert not [name for name in os.listdir(self.dirname) if name.endswith('.tmp')]
+
+    def test_count_bytes(self):
+        # Emoji are 4 bytes each in UTF-8, so counting characters would let segments grow past max_bytes
+        filename = os.path.join(self.dirname, 'emoji_tweets.json')
+        wrapper = utils.RotatingFileWrapper(filename, max_bytes=1000)
+        wrapper.write_lines(['{"text": "Why am I ' + '🍕' * 50 + '?"}'] * 2)
+        wrapper.write('{"text": "Why am I \ud83c?"}')
+        wrapper.close()
+        assert wrapper.bytes_written == os.path.getsize(filename)
+
+    def test_rotate_on_interval(self):
+        filename = os.path.join(self.dirname, 'interval_tweets.json')
+        wrapper = utils.RotatingFileWrapper(filename, rotate_interval=3600, compression='lzma')
+        wrapper.write('{"text": "Why am I first?"}')
+        assert not wrapper.should_rotate()
+
+        # Pretend the segment was started an hour ago
+        wrapper.segment_start -= 3600
+        wrapper.write('{"text": "Why am I second?"}')
+        wrapper.close()
+
+        manifest = codec.load(filename + '.manifest')
+        assert [entry['compression'] for entry in manifest] == ['lzma']
+        with utils.open_text(os.path.join(self.dirname, manifest[0]['segment'])) as file:
+            assert file.read() == '{"text": "Why am I first?"}\n'
+
+    def test_strip_json_suffix(self):
+        assert utils.strip_json_suffix('all_tweets.20200314T150000.json.gz') == 'all_tweets.20200314T150000'
+        assert utils.strip_json_suffix('all_tweets.json') == 'all_tweets'
+        assert not utils.is_json_file('all_tweets.json.manifest')
+
+
+class TestFileWrapper:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.lines = ['{"text": "Why am I first?"}', '{"text": "Why am I second?"}']
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def read(self, filename: str) -> str:
+        with open(filename, encoding='utf-8') as file:
+            return file.read()
+
+    def test_flush_every_batch(self):
+        filename = os.path.join(self.dirname, 'batch_tweets.json')
+        wrapper = utils.FileWrapper(filename, flush_policy='batch', fsync=True)
+        wrapper.write_lines(self.lines)
+
+        # Visible to readers before the file is closed
+        assert self.read(filename) == '\n'.join(self.lines) + '\n'
+        assert len(wrapper.flush_latencies) == 1
+        wrapper.close()
+
+    def test_flush_on_interval(self):
+        filename = os.path.join(self.dirname, 'interval_tweets.json')
+        wrapper = utils.FileWrapper(filename, flush_policy='interval', flush_interval=60)
+        wrapper.write_lines(self.lines)
+        assert len(wrapper.flush_latencies) == 0
+
+        wrapper.last_flush -= 60
+        wrapper.write_lines(self.lines)
+        assert len(wrapper.flush_latencies) == 1
+        wrapper.close()
+
+    def test_write_after_close(self):
+        filename = os.path.join(self.dirname, 'reopen_tweets.json')
+        wrapper = utils.FileWrapper(filename)
+        wrapper.write_lines(self.lines[:1])
+        wrapper.close()
+        wrapper.write_lines(self.lines[1:])
+        wrapper.close()
+        assert self.read(filename) == '\n'.join(self.lines) + '\n'
+
+    def test_unknown_flush_policy(self):
+        try:
+            utils.FileWrapper(os.path.join(self.dirname, 'bad_tweets.json'), flush_policy='sometimes')
+        except ValueError:
+            pass
+        else:
+            raise AssertionError('Expected a ValueError')
+
+
+class TestJsonArrayWriter:
+    @classmethod
+    def setup_class(cls):
+        cls.dirname = tempfile.mkdtemp()
+        cls.records = [
+            {'tweet_id': '1', 'tweet_text': 'Why should I eat 🍕 for breakfast?'},
+            {'tweet_id': '2', 'tweet_text': 'Why am I awake?', 'loc_name': None},
+        ]
+
+    @classmethod
+    def teardown_class(cls):
+        """
+        Remove all generated files
+        """
+        shutil.rmtree(cls.dirname)
+
+    def test_same_as_encoded_write(self):
+        for indent in [True, False]:
+            expected_fn = os.path.join(self.dirname, 'expected.json')
+            filename = os.path.join(self.dirname, 'streamed.json')
+            utils.encoded_write(self.records, expected_fn, indent)
+            with utils.JsonArrayWriter(filename, indent) as writer:
+                writer.write_records(self.records[:1])
+                writer.write_records([])
+                writer.write_records(self.records[1:])
+
+            with open(filename, 'rb') as file, open(expected_fn, 'rb') as expected:
+                assert file.read() == expected.read()
+
+    def test_append(self):
+        for indent in [True, False]:
+            filename = os.path.join(self.dirname, 'append.json')
+            with utils.JsonArrayWriter(filename, indent):
+                pass
+            assert codec.load(filename) == []
+
+            for record in self.records:
+                with utils.JsonArrayWriter(filename, indent, append=True) as writer:
+                    writer.write_records([record])
+            assert codec.load(filename) == self.records
+
+    def test_discard_append(self):
+        filename = os.path.join(self.dirname, 'discard.json')
+        utils.encoded_write(self.records, filename, indent=True)
+        with open(filename, 'rb') as file:
+            original = file.read()
+
+        writer = utils.JsonArrayWriter(filename, indent=True, append=True)
+        writer.write_records(self.records)
+        writer.close(discard=True)
+        with open(filename, 'rb') as file:
+            assert file.read() == original
+
+    def test_iter_json_array(self):
+        records = [{**self.records[i % 2], 'tweet_id': str(i)} for i in range(50)]
+        for indent in [True, False]:
+            filename = os.path.join(self.dirname, 'iter.json')
+            utils.encoded_write(records, filename, indent)
+            # A block smaller than a record makes every record span blocks
+            assert list(utils.iter_json_array(filename, block_size=16)) == records
+
+        utils.encoded_write([], filename)
+        assert list(utils.iter_json_array(filename)) == []